@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Benchmark for converting price history tables into record dicts.
+
+Compares the old per-row iterrows() conversion with the vectorized
+price_records() path on synthetic 10-year daily series, then compares the
+JSON payload of the records and columnar response formats. No network access
+is needed.
+
+Usage: python benchmark_price_records.py [years] [repeats]
+"""
+
+import json
+import sys
+import os
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+import numpy as np
+import pandas as pd
+
+from baymax.tools.records import price_records, price_columns
+
+def make_history(years: int) -> pd.DataFrame:
+    """Synthetic daily bars shaped like an akshare *_hist table"""
+    dates = pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=years * 250)
+    rng = np.random.default_rng(0)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, len(dates))))
+    # akshare quotes prices to the cent and turnover in whole yuan
+    return pd.DataFrame({
+        "日期": dates.date,
+        "开盘": (close * (1 + rng.normal(0, 0.002, len(dates)))).round(2),
+        "收盘": close.round(2),
+        "最高": (close * 1.01).round(2),
+        "最低": (close * 0.99).round(2),
+        "成交量": rng.integers(1_000, 1_000_000, len(dates)),
+        "成交额": (close * 1_000).round(0),
+        "振幅": rng.random(len(dates)).round(2),
+        "涨跌幅": rng.normal(0, 1, len(dates)).round(2),
+        "涨跌额": rng.normal(0, 1, len(dates)).round(2),
+        "换手率": rng.random(len(dates)).round(2),
+    })
+
+def iterrows_records(hist_data: pd.DataFrame) -> list:
+    """The conversion get_stock_price_history used before"""
+    price_data = []
+    for _, row in hist_data.iterrows():
+        price_record = {
+            "date": row.get('日期', ''),
+            "open": float(row.get('开盘', 0)),
+            "high": float(row.get('最高', 0)),
+            "low": float(row.get('最低', 0)),
+            "close": float(row.get('收盘', 0)),
+            "volume": int(row.get('成交量', 0)),
+            "turnover": float(row.get('成交额', 0)) if '成交额' in row else 0
+        }
+        price_data.append(price_record)
+    return price_data
+
+def best_of(func, frame: pd.DataFrame, repeats: int) -> float:
+    """Fastest wall time in milliseconds over several runs"""
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        func(frame)
+        timings.append((time.perf_counter() - started) * 1000)
+    return min(timings)
+
+def main():
+    years = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    frame = make_history(years)
+
+    assert iterrows_records(frame) == price_records(frame), "conversions disagree"
+
+    baseline = best_of(iterrows_records, frame, repeats)
+    vectorized = best_of(price_records, frame, repeats)
+
+    print(f"📈 {years}-year daily series: {len(frame)} bars, best of {repeats}")
+    print(f"   iterrows:      {baseline:8.2f} ms")
+    print(f"   price_records: {vectorized:8.2f} ms")
+    print(f"   Speedup:       {baseline / vectorized:8.1f}x")
+
+    # Response formats: export plus JSON serialization, and payload size
+    records_json = lambda f: json.dumps(price_records(f), default=str)
+    columnar_json = lambda f: json.dumps(price_columns(f), default=str)
+    records_ms = best_of(records_json, frame, repeats)
+    columnar_ms = best_of(columnar_json, frame, repeats)
+    records_bytes = len(records_json(frame))
+    columnar_bytes = len(columnar_json(frame))
+
+    print(f"\n📦 Response formats (export + json.dumps)")
+    print(f"   records:  {records_ms:8.2f} ms {records_bytes / 1024:8.1f} KiB")
+    print(f"   columnar: {columnar_ms:8.2f} ms {columnar_bytes / 1024:8.1f} KiB")
+    print(f"   Reduction: {records_ms / columnar_ms:.1f}x time, {records_bytes / columnar_bytes:.1f}x size")
+
+if __name__ == "__main__":
+    main()
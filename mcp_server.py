@@ -9,7 +9,7 @@ to access BayMax Agent's financial analysis capabilities.
 import os
 import sys
 import json
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 from datetime import datetime
 
 # Add src to path for imports
@@ -24,12 +24,15 @@ load_dotenv()
 # Import BayMax Agent tools
 from baymax.tools.prices import (
     get_current_stock_price,
+    get_current_stock_prices,
     get_stock_price_history,
-    get_stock_weekly_summary
+    get_stock_weekly_summary,
+    get_intraday_summary
 )
 from baymax.tools.analysis import (
     analyze_stock_with_ai,
-    get_technical_indicators
+    get_technical_indicators,
+    screen_technical_indicators
 )
 from baymax.tools.financials import (
     get_income_statements,
@@ -37,6 +40,8 @@ from baymax.tools.financials import (
     get_cash_flow_statements
 )
 from baymax.tools.api import normalize_ticker
+from baymax.tools.snapshot import start_spot_refresher
+from baymax.tools.upstream import health_table, retry_budget
 
 # Create FastMCP server
 mcp = FastMCP(
@@ -83,26 +88,83 @@ def get_stock_price(ticker: str) -> Dict[str, Any]:
             "timestamp": datetime.now().isoformat()
         }
 
+@mcp.tool()
+def get_stock_prices(tickers: List[str]) -> Dict[str, Any]:
+    """
+    Get current prices for many stocks in one request.
+
+    Args:
+        tickers: Stock ticker symbols, markets may be mixed (e.g., ['AAPL', '600519', '1211.HK'])
+
+    Returns:
+        Quotes keyed by normalized ticker, plus the tickers that could not be found
+    """
+    try:
+        print(f"[MCP] Getting current prices for {len(tickers)} tickers")
+        result = get_current_stock_prices.func(tickers)
+
+        if "error" in result:
+            return {
+                "status": "error",
+                "tickers": tickers,
+                "message": result["error"],
+                "timestamp": datetime.now().isoformat()
+            }
+
+        return {
+            "status": "success",
+            "tickers": tickers,
+            "data": result,
+            "timestamp": datetime.now().isoformat()
+        }
+    except Exception as e:
+        return {
+            "status": "error",
+            "tickers": tickers,
+            "message": f"Failed to get stock prices: {str(e)}",
+            "timestamp": datetime.now().isoformat()
+        }
+
 @mcp.tool()
 def get_price_history(
     ticker: str,
     period: str = "daily",
-    days_back: int = 30
+    days_back: int = 30,
+    format: str = "records",
+    adjust: str = ""
 ) -> Dict[str, Any]:
     """
     Get historical stock price data with technical analysis.
 
     Args:
         ticker: Stock ticker symbol
-        period: Time period ('daily', 'weekly', 'monthly')
+        period: Time period ('daily', 'weekly', 'monthly', 'quarterly')
         days_back: Number of days of historical data (default: 30)
+        format: 'records' (one dict per bar) or 'columnar' (one list per field, much smaller payload)
+        adjust: '' for raw prices, 'qfq' forward-adjusted or 'hfq' backward-adjusted
 
     Returns:
         Historical price data with technical indicators and performance metrics
     """
     try:
-        print(f"[MCP] Getting price history for {ticker} ({period}, {days_back} days)")
-        result = get_stock_price_history.func(ticker, period=period, days_back=days_back)
+        if format not in ("records", "columnar"):
+            return {
+                "status": "error",
+                "ticker": ticker,
+                "message": f"Unknown format '{format}', expected 'records' or 'columnar'",
+                "timestamp": datetime.now().isoformat()
+            }
+
+        if adjust not in ("", "qfq", "hfq"):
+            return {
+                "status": "error",
+                "ticker": ticker,
+                "message": f"Unknown adjust '{adjust}', expected '', 'qfq' or 'hfq'",
+                "timestamp": datetime.now().isoformat()
+            }
+
+        print(f"[MCP] Getting price history for {ticker} ({period}, {days_back} days, {format})")
+        result = get_stock_price_history.func(ticker, period=period, days_back=days_back, adjust=adjust, format=format)
 
         if "error" in result:
             return {
@@ -117,6 +179,7 @@ def get_price_history(
             "ticker": ticker,
             "period": period,
             "days_back": days_back,
+            "format": format,
             "data": result,
             "timestamp": datetime.now().isoformat()
         }
@@ -128,6 +191,45 @@ def get_price_history(
             "timestamp": datetime.now().isoformat()
         }
 
+@mcp.tool()
+def get_intraday(ticker: str, minutes: int = 30, include_bars: bool = False) -> Dict[str, Any]:
+    """
+    Get today's minute-bar summary for a stock: session VWAP and last-N-minute stats.
+
+    Args:
+        ticker: Stock ticker symbol
+        minutes: Trailing window in minutes (default: 30)
+        include_bars: Also return the window's 1-minute bars
+
+    Returns:
+        Session VWAP, window open/high/low/close, volume, turnover and VWAP
+    """
+    try:
+        print(f"[MCP] Getting intraday summary for {ticker} ({minutes} minutes)")
+        result = get_intraday_summary.func(ticker, minutes=minutes, include_bars=include_bars)
+
+        if "error" in result:
+            return {
+                "status": "error",
+                "ticker": ticker,
+                "message": result["error"],
+                "timestamp": datetime.now().isoformat()
+            }
+
+        return {
+            "status": "success",
+            "ticker": ticker,
+            "data": result,
+            "timestamp": datetime.now().isoformat()
+        }
+    except Exception as e:
+        return {
+            "status": "error",
+            "ticker": ticker,
+            "message": f"Failed to get intraday summary: {str(e)}",
+            "timestamp": datetime.now().isoformat()
+        }
+
 @mcp.tool()
 def analyze_stock(
     ticker: str,
@@ -180,7 +282,8 @@ def analyze_stock(
 def get_technical_analysis(
     ticker: str,
     period: str = "daily",
-    days_back: int = 30
+    days_back: int = 30,
+    indicators: Optional[List[str]] = None
 ) -> Dict[str, Any]:
     """
     Get technical indicators and analysis for a stock.
@@ -189,6 +292,7 @@ def get_technical_analysis(
         ticker: Stock ticker symbol
         period: Time period ('daily', 'weekly', 'monthly')
         days_back: Number of days of historical data (default: 30)
+        indicators: Indicators to return as full series, e.g. ['ema_50', 'rsi_6', 'macd', 'bollinger']
 
     Returns:
         Technical indicators including RSI, moving averages, support/resistance levels
@@ -198,7 +302,8 @@ def get_technical_analysis(
         result = get_technical_indicators.func(
             ticker,
             period=period,
-            days_back=days_back
+            days_back=days_back,
+            indicators=indicators
         )
 
         if "error" in result:
@@ -225,6 +330,60 @@ def get_technical_analysis(
             "timestamp": datetime.now().isoformat()
         }
 
+@mcp.tool()
+def screen_stocks(
+    tickers: Optional[List[str]] = None,
+    market: str = "CN",
+    days_back: int = 120,
+    indicators: Optional[List[str]] = None,
+    sort_by: str = "rsi_14",
+    top: int = 20
+) -> Dict[str, Any]:
+    """
+    Screen many stocks of one market by technical indicators in one call.
+
+    Args:
+        tickers: Tickers of one market; omit to screen every ticker in the market's spot table
+            (only those already in the local history cache get values; no history is fetched)
+        market: 'CN', 'HK' or 'US' (used when no tickers are given)
+        days_back: Trading sessions of daily history (default: 120)
+        indicators: Indicators to compute, e.g. ['rsi_14', 'sma_20', 'macd']
+        sort_by: Indicator output to rank by (default: 'rsi_14')
+        top: Number of tickers to return (default: 20)
+
+    Returns:
+        Top tickers by sort_by with their latest indicator values and percentiles
+    """
+    try:
+        print(f"[MCP] Screening {len(tickers) if tickers else market + ' universe'} by {sort_by}")
+        result = screen_technical_indicators.func(
+            tickers,
+            market=market,
+            days_back=days_back,
+            indicators=indicators,
+            sort_by=sort_by,
+            top=top
+        )
+
+        if "error" in result:
+            return {
+                "status": "error",
+                "message": result["error"],
+                "timestamp": datetime.now().isoformat()
+            }
+
+        return {
+            "status": "success",
+            "data": result,
+            "timestamp": datetime.now().isoformat()
+        }
+    except Exception as e:
+        return {
+            "status": "error",
+            "message": f"Failed to screen stocks: {str(e)}",
+            "timestamp": datetime.now().isoformat()
+        }
+
 @mcp.tool()
 def get_weekly_summary(ticker: str) -> Dict[str, Any]:
     """
@@ -337,13 +496,27 @@ def get_server_info() -> Dict[str, Any]:
         "supported_markets": ["A-shares", "US Stocks", "Hong Kong Stocks"],
         "features": [
             "Real-time stock prices",
+            "Batch quotes for many tickers",
             "Historical price analysis",
+            "Intraday minute bars and VWAP",
             "AI-powered recommendations",
             "Technical indicators",
+            "Indicator screens across many stocks",
             "Financial statements",
             "Risk assessment"
         ],
-        "tools_count": 6,
+        "tools_count": 9,
+        "timestamp": datetime.now().isoformat()
+    }
+
+@mcp.resource("health://upstream")
+def get_upstream_health() -> Dict[str, Any]:
+    """Get circuit breaker state, retry counts and rolling error/latency stats for each data source endpoint."""
+    endpoints = health_table()
+    return {
+        "endpoints": endpoints,
+        "open_circuits": [e["endpoint"] for e in endpoints if e["state"] != "closed"],
+        "retry_budget": retry_budget.snapshot(),
         "timestamp": datetime.now().isoformat()
     }
 
@@ -359,23 +532,38 @@ def get_usage_help() -> str:
    - Args: ticker (str)
    - Example: get_stock_price("AAPL")
 
-2. **get_price_history** - Get historical price data
-   - Args: ticker (str), period (str), days_back (int)
+2. **get_stock_prices** - Get current prices for many stocks at once
+   - Args: tickers (list[str])
+   - Example: get_stock_prices(["AAPL", "600519", "1211.HK"])
+
+3. **get_price_history** - Get historical price data
+   - Args: ticker (str), period (str), days_back (int), format (str: "records" or "columnar"), adjust (str: "", "qfq" or "hfq")
    - Example: get_price_history("600519", "daily", 30)
+   - Example: get_price_history("600519", "daily", 250, "columnar")
 
-3. **analyze_stock** - AI-powered stock analysis
+4. **get_intraday** - Minute-bar summary with VWAP
+   - Args: ticker (str), minutes (int), include_bars (bool)
+   - Example: get_intraday("600519", 30)
+
+5. **analyze_stock** - AI-powered stock analysis
    - Args: ticker (str), analysis_type (str), include_recommendation (bool)
    - Example: analyze_stock("AAPL", "comprehensive", True)
 
-4. **get_technical_analysis** - Technical indicators
-   - Args: ticker (str), period (str), days_back (int)
+6. **get_technical_analysis** - Technical indicators
+   - Args: ticker (str), period (str), days_back (int), indicators (list[str], optional)
    - Example: get_technical_analysis("MSFT", "daily", 30)
+   - Example: get_technical_analysis("600519", "daily", 250, ["ema_50", "rsi_14", "macd", "bollinger"])
+
+7. **screen_stocks** - Rank many stocks of one market by technical indicators
+   - Args: tickers (list[str], optional), market (str), days_back (int), indicators (list[str]), sort_by (str), top (int)
+   - Example: screen_stocks(["600519", "000858", "300750"], sort_by="rsi_14", top=10)
+   - Example: screen_stocks(market="CN", sort_by="macd_histogram")
 
-5. **get_weekly_summary** - Weekly performance summary
+8. **get_weekly_summary** - Weekly performance summary
    - Args: ticker (str)
    - Example: get_weekly_summary("GOOGL")
 
-6. **get_financial_statements** - Financial statements
+9. **get_financial_statements** - Financial statements
    - Args: ticker (str), statement_type (str), period (str), limit (int)
    - Example: get_financial_statements("AAPL", "income", "quarterly", 4)
 
@@ -430,7 +618,12 @@ def main():
     print("📊 Available tools: stock price, historical data, AI analysis, technical indicators")
     print("🌐 HTTP endpoint: http://0.0.0.0:8000")
     print("🔧 Use any HTTP client or MCP-compatible application to connect")
-    print("📖 See help resources: config://info, help://usage")
+    print("📖 See help resources: config://info, help://usage, health://upstream")
+
+    # Keep spot snapshots warm so price requests never wait on a full-market download
+    refresher = start_spot_refresher()
+    if refresher:
+        print(f"🔄 Spot snapshot refresher running every {refresher.interval:g}s for {', '.join(refresher.markets)}")
 
     # Run the server in HTTP mode
     mcp.run(transport="streamable-http", host="0.0.0.0", port=8000)
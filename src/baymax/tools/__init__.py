@@ -7,10 +7,13 @@ from baymax.tools.filings import get_10K_filing_items
 from baymax.tools.filings import get_10Q_filing_items
 from baymax.tools.filings import get_8K_filing_items
 from baymax.tools.prices import get_current_stock_price
+from baymax.tools.prices import get_current_stock_prices
 from baymax.tools.prices import get_stock_price_history
 from baymax.tools.prices import get_stock_weekly_summary
+from baymax.tools.prices import get_intraday_summary
 from baymax.tools.analysis import analyze_stock_with_ai
 from baymax.tools.analysis import get_technical_indicators
+from baymax.tools.analysis import screen_technical_indicators
 
 TOOLS: list[Callable[..., any]] = [
     get_income_statements,
@@ -21,8 +24,11 @@ TOOLS: list[Callable[..., any]] = [
     get_8K_filing_items,
     get_filings,
     get_current_stock_price,
+    get_current_stock_prices,
     get_stock_price_history,
     get_stock_weekly_summary,
+    get_intraday_summary,
     analyze_stock_with_ai,
     get_technical_indicators,
+    screen_technical_indicators,
 ]
\ No newline at end of file
@@ -0,0 +1,190 @@
+"""
+Locally applied price adjustment (复权) for A-share history.
+
+Adjusted bars used to mean another full download per adjustment mode. Here
+the raw (unadjusted) bars come from the local history store and only the
+backward-adjustment (hfq) factor table is fetched, once per ticker, and
+cached on disk. Both modes are then derived with a vectorized multiply:
+
+    hfq price = raw price * hfq_factor(date)
+    qfq price = raw price * hfq_factor(date) / hfq_factor(latest)
+
+Each bar takes the factor in force on its date (the last factor change on or
+before it). This is the proportional method used by Sina's factor tables, so
+values can differ by a few cents from eastmoney's own qfq series, which
+subtracts cash dividends instead.
+
+Only A-shares have factor tables; other markets keep using the upstream
+`adjust` parameter, and so does an A-share whose factor table cannot be
+fetched (see HistoryStore.get_bars).
+"""
+
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from baymax.tools.constants import CACHE_DIR
+from baymax.tools.upstream import call_akshare
+
+####################################
+# Configuration
+####################################
+
+# Seconds a cached factor table is used before it is fetched again (new ex-dividend dates)
+ADJUST_FACTOR_TTL = float(os.getenv("BAYMAX_ADJUST_FACTOR_TTL", "86400"))
+
+# Directory holding one factor table per A-share
+FACTOR_CACHE_DIR = os.path.join(CACHE_DIR, "factors")
+
+ADJUST_MODES = ("", "qfq", "hfq")
+
+# History fields scaled by the adjustment factor; volume is left as it is and the
+# change fields are recomputed from the adjusted closes
+PRICE_FIELDS = ("open", "high", "low", "close")
+
+
+def sina_symbol(ticker: str) -> str:
+    """A-share code with the exchange prefix Sina expects, e.g. 600519 -> sh600519."""
+    if ticker.startswith(("sh", "sz", "bj")):
+        return ticker
+    # BSE codes (43/83/87/88 and the 92 range it moved to) before Shanghai's 6/900
+    if ticker.startswith(("4", "8", "92")):
+        return f"bj{ticker}"
+    if ticker.startswith(("6", "9")):
+        return f"sh{ticker}"
+    return f"sz{ticker}"
+
+
+####################################
+# Factor store
+####################################
+
+class AdjustmentFactors:
+    """Backward-adjustment factor changes of one ticker, sorted by date."""
+
+    def __init__(self, dates: np.ndarray, factors: np.ndarray, fetched_at: float):
+        self.dates = dates
+        self.factors = factors
+        self.fetched_at = fetched_at
+
+    def at(self, dates: np.ndarray) -> np.ndarray:
+        """hfq factor in force on each date; dates before the first change get the first factor."""
+        if len(self.factors) == 0:
+            return np.ones(len(dates))
+        positions = np.searchsorted(self.dates, dates, side="right") - 1
+        return self.factors[np.clip(positions, 0, len(self.factors) - 1)]
+
+    @property
+    def latest(self) -> float:
+        return float(self.factors[-1]) if len(self.factors) else 1.0
+
+
+class FactorStore:
+    """Fetches each ticker's hfq factor table once and keeps it in memory and on disk."""
+
+    def __init__(self, root: str = FACTOR_CACHE_DIR, ttl: float = ADJUST_FACTOR_TTL):
+        self.root = root
+        self.ttl = ttl
+        self._tables: Dict[str, AdjustmentFactors] = {}
+        self._lock = threading.Lock()
+
+    def get(self, ticker: str) -> AdjustmentFactors:
+        """Factor table for an A-share, fetched only when the cached one is older than the TTL."""
+        table = self._tables.get(ticker)
+        if table is None:
+            table = self._load(ticker)
+        if table is None or time.time() - table.fetched_at >= self.ttl:
+            try:
+                table = self._fetch(ticker)
+                self._save(ticker, table)
+            except Exception as e:
+                if table is None:
+                    raise
+                print(f"⚠ Could not refresh adjustment factors for {ticker}, using cached table: {e}")
+        with self._lock:
+            self._tables[ticker] = table
+        return table
+
+    def _fetch(self, ticker: str) -> AdjustmentFactors:
+        frame = call_akshare("stock_zh_a_daily", symbol=sina_symbol(ticker), adjust="hfq-factor")
+        dates = pd.to_datetime(frame["date"], errors="coerce").to_numpy(dtype="datetime64[D]")
+        factors = pd.to_numeric(frame["hfq_factor"], errors="coerce").to_numpy(dtype=np.float64)
+        valid = ~np.isnat(dates) & ~np.isnan(factors)
+        order = np.argsort(dates[valid], kind="stable")
+        return AdjustmentFactors(dates[valid][order], factors[valid][order], time.time())
+
+    def _path(self, ticker: str) -> str:
+        return os.path.join(self.root, f"{ticker}.npz")
+
+    def _load(self, ticker: str) -> Optional[AdjustmentFactors]:
+        try:
+            with np.load(self._path(ticker)) as stored:
+                return AdjustmentFactors(stored["dates"], stored["factors"], float(stored["fetched_at"]))
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _save(self, ticker: str, table: AdjustmentFactors):
+        try:
+            os.makedirs(self.root, exist_ok=True)
+            tmp = os.path.join(self.root, f".{ticker}.{os.getpid()}.tmp.npz")
+            np.savez(tmp, dates=table.dates, factors=table.factors, fetched_at=table.fetched_at)
+            os.replace(tmp, self._path(ticker))
+        except OSError as e:
+            print(f"⚠ Could not persist adjustment factors for {ticker}: {e}")
+
+    def invalidate(self, ticker: Optional[str] = None):
+        """Drop cached factor tables so the next request fetches them again."""
+        with self._lock:
+            if ticker is None:
+                self._tables.clear()
+            else:
+                self._tables.pop(ticker, None)
+
+
+####################################
+# Applying factors
+####################################
+
+def adjustment_multipliers(table: AdjustmentFactors, dates: np.ndarray, adjust: str) -> np.ndarray:
+    """Per-bar price multiplier for an adjustment mode ('qfq' or 'hfq')."""
+    factors = table.at(dates)
+    if adjust == "qfq":
+        return factors / table.latest
+    return factors
+
+
+def adjust_columns(columns: Dict[str, np.ndarray], table: AdjustmentFactors, adjust: str) -> Dict[str, np.ndarray]:
+    """
+    Adjusted copy of raw bar columns; fields other than prices are shared unchanged.
+
+    Change, change percent and amplitude are recomputed against the previous
+    adjusted close, so a bar on an ex-date does not show the dividend as a drop.
+    """
+    if not adjust:
+        return columns
+    multipliers = adjustment_multipliers(table, columns["date"], adjust)
+    adjusted = dict(columns)
+    for field in PRICE_FIELDS:
+        if field in columns:
+            adjusted[field] = np.round(columns[field] * multipliers, 4)
+
+    if "close" in columns and len(columns["close"]):
+        close = adjusted["close"]
+        # The first bar's previous close comes from its raw change, at the first bar's multiplier
+        first_prev = (columns["close"][0] - columns["change"][0]) * multipliers[0] if "change" in columns else np.nan
+        prev_close = np.r_[first_prev, close[:-1]]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            if "change" in columns:
+                adjusted["change"] = np.round(close - prev_close, 4)
+            if "change_percent" in columns:
+                adjusted["change_percent"] = np.round((close - prev_close) / prev_close * 100, 4)
+            if "amplitude" in columns and "high" in adjusted and "low" in adjusted:
+                adjusted["amplitude"] = np.round((adjusted["high"] - adjusted["low"]) / prev_close * 100, 4)
+    return adjusted
+
+
+factor_store = FactorStore()
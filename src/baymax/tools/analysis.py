@@ -1,12 +1,27 @@
 from langchain.tools import tool
 from typing import Literal, Optional, Dict, Any
 from pydantic import BaseModel, Field
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 import pandas as pd
 import numpy as np
-
-from baymax.tools.prices import get_current_stock_price, get_stock_price_history, get_stock_weekly_summary
-from baymax.tools.api import normalize_ticker, get_stock_financial_data
+import contextvars
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from baymax.tools.prices import (
+    calculate_weekly_performance, fetch_first_valid_price, get_price_from_alternative_source, get_spot_quotes,
+    get_stock_price_history, price_from_records
+)
+from baymax.tools.api import normalize_ticker, get_stock_financial_data, get_market_type
+from baymax.tools.indicators import (
+    DEFAULT_INDICATORS, MIN_INDICATOR_BARS, compute_indicators, latest_values, parse_indicator,
+    pivot_levels, price_arrays, rsi, series_to_lists, sma, trend_label
+)
+from baymax.tools.indicator_cache import cache_window, indicator_cache
+from baymax.tools.panel import build_panel, universe_tickers
+from baymax.tools.trading_calendar import get_calendar
+from baymax.tools.upstream import deadline
 
 class StockAnalysisInput(BaseModel):
     ticker: str = Field(description="The stock ticker symbol to analyze. For example, 'AAPL' for Apple, '600519' for 贵州茅台")
@@ -17,6 +32,15 @@ class TechnicalIndicatorsInput(BaseModel):
     ticker: str = Field(description="The stock ticker symbol to analyze")
     period: Literal["daily", "weekly", "monthly"] = Field(default="daily", description="Time period for technical analysis")
     days_back: int = Field(default=30, description="Number of days of historical data to analyze")
+    indicators: Optional[list[str]] = Field(default=None, description="Indicators to return as full series, e.g. ['sma_10', 'ema_50', 'rsi_14', 'macd', 'bollinger', 'atr_14', 'obv', 'stoch']. A trailing _N sets the window")
+
+class IndicatorScreenInput(BaseModel):
+    tickers: Optional[list[str]] = Field(default=None, description="Tickers of one market to screen, e.g. ['600519', '000001', '300750']; missing history is fetched. Omit to screen every ticker in `market`'s spot table without fetching: only those already in the local history cache get values")
+    market: Literal["CN", "HK", "US"] = Field(default="CN", description="Market whose spot-table universe is screened when no tickers are given")
+    days_back: int = Field(default=120, description="Trading sessions of daily history to compute indicators over")
+    indicators: Optional[list[str]] = Field(default=None, description="Indicators to compute, e.g. ['rsi_14', 'sma_20', 'macd']; defaults to the standard set")
+    sort_by: str = Field(default="rsi_14", description="Indicator output to rank by, e.g. 'rsi_14', 'macd_histogram', 'bollinger_percent_b'")
+    top: int = Field(default=20, description="Number of tickers to return, highest sort_by value first")
 
 @tool(args_schema=StockAnalysisInput)
 def analyze_stock_with_ai(ticker: str, analysis_type: str = "comprehensive", include_recommendation: bool = True) -> dict:
@@ -50,6 +74,7 @@ def analyze_stock_with_ai(ticker: str, analysis_type: str = "comprehensive", inc
             "data_summary": analysis_data.get("data_summary", {}),
             "technical_analysis": analysis_data.get("technical_analysis", {}),
             "risk_assessment": analysis_data.get("risk_assessment", {}),
+            "missing_data": analysis_data.get("missing_data", {}),
             "ai_insights": ai_analysis.get("ai_insights", {}),
             "recommendation": ai_analysis.get("recommendation", {}),
             "price_targets": ai_analysis.get("price_targets", {}),
@@ -65,53 +90,101 @@ def analyze_stock_with_ai(ticker: str, analysis_type: str = "comprehensive", inc
             "analysis_date": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         }
 
-def gather_analysis_data(ticker: str, analysis_type: str) -> dict:
-    """Gather all necessary data for analysis"""
+# Sessions of daily history read by the weekly summary and by the technical/risk analysis
+WEEKLY_SESSIONS = 7
+TECHNICAL_SESSIONS = 60
+
+# Seconds an analysis waits for its sources in total; sources still running then are left out
+ANALYSIS_DEADLINE = float(os.getenv("BAYMAX_ANALYSIS_DEADLINE", "20"))
+
+# Shared workers for the concurrent sub-fetches of an analysis
+_analysis_pool = ThreadPoolExecutor(max_workers=12, thread_name_prefix="analysis-source")
+
+def plan_analysis_data(analysis_type: str) -> dict:
+    """
+    Data gathered for an analysis: one quote, one daily history window wide
+    enough for every part that reads it, and the financials if needed
+    """
+    return {
+        "quote": True,
+        "history_sessions": max(WEEKLY_SESSIONS, TECHNICAL_SESSIONS),
+        "financials": analysis_type == "comprehensive",
+    }
+
+def gather_analysis_data(ticker: str, analysis_type: str, timeout: Optional[float] = None) -> dict:
+    """
+    Gather all necessary data for analysis. The quote, the history and the
+    financials are fetched concurrently under one shared deadline; sources
+    still running when it expires are cancelled and listed in "missing_data"
+    """
     try:
+        plan = plan_analysis_data(analysis_type)
         data_summary = {}
-        technical_analysis = {}
-        risk_assessment = {}
+        missing_data = {}
+        started_at = time.monotonic()
+
+        with deadline(ANALYSIS_DEADLINE if timeout is None else timeout) as scope:
+            def submit(fetch, *args):
+                return _analysis_pool.submit(contextvars.copy_context().run, fetch, *args)
+
+            print("Getting price history, current price and financial data...")
+            futures = {
+                "price_history": submit(load_analysis_history, ticker, plan["history_sessions"]),
+                "current_price": submit(get_spot_quote, ticker),
+            }
+            if plan["financials"]:
+                futures["financial_data"] = submit(get_stock_financial_data, ticker, "quarterly", 4)
+
+            # The quote falls back to the shared history, so wait for both before the financials
+            wait([futures["price_history"], futures["current_price"]], timeout=scope.remaining())
+            history = source_result(futures["price_history"], missing_data, "price_history") or {
+                "price_history": {}, "technical_analysis": {}, "risk_assessment": {}, "weekly_performance": {}
+            }
+            price_history = history["price_history"]
+            price_data = price_history.get("price_data") or []
+            current_price_data = get_analysis_quote(
+                ticker, price_data, source_result(futures["current_price"], missing_data, "current_price")
+            )
+
+            financial_data = None
+            if "financial_data" in futures:
+                wait([futures["financial_data"]], timeout=scope.remaining())
+                financial_data = source_result(futures["financial_data"], missing_data, "financial_data")
+
+            # Whatever is still running would only finish after the analysis is built
+            scope.cancel()
 
-        # Get current price and recent performance
-        print("Getting current price data...")
-        current_price_data = get_current_stock_price.func(ticker)
         if "error" not in current_price_data:
+            missing_data.pop("current_price", None)
             data_summary["current_price"] = current_price_data.get("current_price")
             data_summary["daily_change"] = current_price_data.get("change_percent", 0)
             data_summary["volume"] = current_price_data.get("volume", 0)
 
-        # Get weekly performance
-        print("Getting weekly performance...")
-        weekly_data = get_stock_weekly_summary.func(ticker)
-        if "error" not in weekly_data:
-            weekly_perf = weekly_data.get("weekly_performance", {})
+        # Weekly performance from the last sessions of the shared history
+        weekly_perf = history["weekly_performance"]
+        if weekly_perf and "error" not in weekly_perf:
             data_summary["weekly_return"] = weekly_perf.get("weekly_change_percent", 0)
             data_summary["volatility"] = weekly_perf.get("volatility", {}).get("volatility_percent", 0)
             data_summary["best_day"] = weekly_perf.get("best_performing_day", {})
             data_summary["worst_day"] = weekly_perf.get("worst_performing_day", {})
 
-        # Get price history for technical analysis
-        print("Getting price history for technical analysis...")
-        price_history = get_stock_price_history.func(ticker, period="daily", days_back=60)
-        if "error" not in price_history and price_history.get("price_data"):
-            technical_analysis = calculate_technical_indicators(price_history["price_data"])
-            risk_assessment = assess_risk(price_history["price_data"])
-
-        # Get financial data if comprehensive analysis
-        if analysis_type == "comprehensive":
-            print("Getting financial data...")
-            financial_data = get_stock_financial_data(ticker, "quarterly", 4)
-            if financial_data.get("income_statements"):
-                data_summary["latest_revenue"] = extract_latest_revenue(financial_data["income_statements"])
-                data_summary["profitability_trend"] = analyze_profitability_trend(financial_data["income_statements"])
+        if financial_data and financial_data.get("income_statements"):
+            data_summary["latest_revenue"] = extract_latest_revenue(financial_data["income_statements"])
+            data_summary["profitability_trend"] = analyze_profitability_trend(financial_data["income_statements"])
 
         return {
             "data_summary": data_summary,
-            "technical_analysis": technical_analysis,
-            "risk_assessment": risk_assessment,
+            "technical_analysis": history["technical_analysis"],
+            "risk_assessment": history["risk_assessment"],
+            "missing_data": missing_data,
+            "gather_elapsed_ms": round((time.monotonic() - started_at) * 1000),
             "raw_data": {
                 "current_price": current_price_data,
-                "weekly_summary": weekly_data,
+                "weekly_summary": {
+                    "ticker": ticker,
+                    "weekly_performance": weekly_perf,
+                    "price_history": price_data[-10:]
+                },
                 "price_history": price_history
             }
         }
@@ -119,131 +192,135 @@ def gather_analysis_data(ticker: str, analysis_type: str) -> dict:
     except Exception as e:
         return {"error": f"Failed to gather analysis data: {str(e)}"}
 
-def calculate_technical_indicators(price_data: list) -> dict:
-    """Calculate technical indicators"""
+def source_result(future, missing_data: dict, name: str):
+    """A finished sub-fetch's result; a late or failed one is recorded in missing_data and gives None"""
+    if not future.done():
+        future.cancel()
+        missing_data[name] = "timed out"
+        print(f"⚠ {name.replace('_', ' ').capitalize()} not ready before the analysis deadline")
+        return None
     try:
-        if len(price_data) < 20:  # Need minimum data for indicators
-            return {"error": "Insufficient data for technical analysis"}
-
-        # Extract prices and volumes
-        closes = [float(data['close']) for data in price_data]
-        highs = [float(data['high']) for data in price_data]
-        lows = [float(data['low']) for data in price_data]
-        volumes = [float(data['volume']) for data in price_data]
-
-        indicators = {}
-
-        # Moving Averages
-        indicators["sma_5"] = np.mean(closes[-5:]) if len(closes) >= 5 else closes[-1]
-        indicators["sma_20"] = np.mean(closes[-20:]) if len(closes) >= 20 else np.mean(closes)
-        indicators["sma_50"] = np.mean(closes[-50:]) if len(closes) >= 50 else np.mean(closes)
-
-        # Price relative to moving averages
-        current_price = closes[-1]
-        indicators["price_vs_sma5"] = ((current_price - indicators["sma_5"]) / indicators["sma_5"]) * 100
-        indicators["price_vs_sma20"] = ((current_price - indicators["sma_20"]) / indicators["sma_20"]) * 100
-
-        # RSI (Relative Strength Index) - simplified calculation
-        indicators["rsi"] = calculate_rsi(closes)
-
-        # Support and Resistance levels
-        support_resistance = calculate_support_resistance(highs, lows, closes)
-        indicators.update(support_resistance)
-
-        # Volume analysis
-        avg_volume = np.mean(volumes[-20:]) if len(volumes) >= 20 else np.mean(volumes)
-        current_volume = volumes[-1]
-        indicators["volume_ratio"] = current_volume / avg_volume if avg_volume > 0 else 1
-
-        # Trend analysis
-        indicators["trend"] = analyze_trend(closes)
-
-        return indicators
-
+        return future.result()
     except Exception as e:
-        return {"error": f"Failed to calculate technical indicators: {str(e)}"}
+        missing_data[name] = f"failed: {str(e)}"
+        print(f"⚠ {name.replace('_', ' ').capitalize()} failed: {e}")
+        return None
 
-def calculate_rsi(prices: list, period: int = 14) -> float:
-    """Calculate RSI (Relative Strength Index)"""
-    try:
-        if len(prices) < period + 1:
-            return 50.0  # Neutral RSI if insufficient data
+def load_analysis_history(ticker: str, sessions: int) -> dict:
+    """
+    Daily history for an analysis and everything derived from it (technicals,
+    risk, weekly performance); unchanged bars reuse the cached history and results
+    """
+    adjust = indicator_adjustment(ticker)
+    calendar = get_calendar(get_market_type(ticker))
+    request = ("analysis", ticker, "daily", sessions, adjust)
+    window = cache_window(calendar)
+    cached = indicator_cache.recent(request, window)
+    if cached is not None:
+        return cached
+
+    price_history = get_stock_price_history.func(ticker, period="daily", days_back=sessions, adjust=adjust)
+    price_data = price_history.get("price_data") if "error" not in price_history else None
+    if not price_data:
+        return {"price_history": price_history, "technical_analysis": {}, "risk_assessment": {}, "weekly_performance": {}}
+
+    def analyze():
+        return {
+            "price_history": price_history,
+            "technical_analysis": calculate_technical_indicators(price_data),
+            "risk_assessment": assess_risk(price_data),
+            "weekly_performance": calculate_weekly_performance(price_data[-WEEKLY_SESSIONS:])
+        }
 
-        deltas = [prices[i] - prices[i-1] for i in range(1, len(prices))]
-        gains = [d if d > 0 else 0 for d in deltas[-period:]]
-        losses = [-d if d < 0 else 0 for d in deltas[-period:]]
+    # Unadjusted fallback bars must not be cached as the adjusted result
+    if price_history.get("adjust", adjust) != adjust:
+        return analyze()
 
-        avg_gain = np.mean(gains) if gains else 0
-        avg_loss = np.mean(losses) if losses else 0
+    last_bar = tuple(price_data[-1].get(f) for f in ("date", "close", "volume"))
+    history = indicator_cache.get(request, last_bar) or analyze()
+    return indicator_cache.put(request, last_bar, history, window, bar_is_settled(last_bar[0], calendar, "daily"))
 
-        if avg_loss == 0:
-            return 100.0  # Overbought if no losses
+def get_spot_quote(ticker: str) -> Optional[dict]:
+    """Real-time quote from the market's spot snapshot"""
+    with deadline(10):
+        return get_spot_quotes(get_market_type(ticker), [ticker]).get(ticker)
 
-        rs = avg_gain / avg_loss
-        rsi = 100 - (100 / (1 + rs))
+def get_analysis_quote(ticker: str, price_data: list, spot_quote: Optional[dict] = None) -> dict:
+    """
+    Current price from the spot quote fetched alongside the history, else from
+    the shared history's last bar, else the alternative sources
+    """
+    sources = [
+        ("real_time", lambda: spot_quote),
+        ("historical", lambda: price_from_records(ticker, price_data)),
+        ("alternative", lambda: get_price_from_alternative_source(ticker)),
+    ]
+    result, timings = fetch_first_valid_price(ticker, sources, mode="sequential")
+    if result is not None:
+        return result
+    return {
+        "error": f"All data sources failed for {ticker}",
+        "ticker": ticker,
+        "current_price": None,
+        "source_timings": timings
+    }
+
+def indicator_adjustment(ticker: str) -> str:
+    """
+    Adjustment used for indicators and drawdowns: forward-adjusted for A-shares,
+    where it is applied locally from cached factors, raw prices elsewhere.
+    Without it, ex-dividend gaps look like price drops.
+    """
+    return market_adjustment(get_market_type(normalize_ticker(ticker)))
 
-        return round(rsi, 2)
+def market_adjustment(market: str) -> str:
+    """indicator_adjustment for every ticker of a market"""
+    return "qfq" if market == 'CN' else ""
 
-    except Exception:
-        return 50.0
+def bar_is_settled(bar_date, calendar, period: str) -> bool:
+    """Whether a bar's period has closed, so results computed from it cannot change"""
+    if isinstance(bar_date, str):
+        bar_date = date.fromisoformat(bar_date[:10])
+    return bar_date <= calendar.settled_through(period)
 
-def calculate_support_resistance(highs: list, lows: list, closes: list) -> dict:
-    """Calculate support and resistance levels"""
+def calculate_technical_indicators(price_data, indicators: Optional[list] = None) -> dict:
+    """Calculate the latest technical indicator values from price records or columnar price data"""
     try:
-        # Simple pivot point calculation
-        recent_high = max(highs[-10:])
-        recent_low = min(lows[-10:])
-        recent_close = closes[-1]
+        bars = price_arrays(price_data)
+        if len(bars["close"]) < MIN_INDICATOR_BARS:  # Need minimum data for indicators
+            return {"error": "Insufficient data for technical analysis"}
 
-        # Classic pivot point
-        pivot = (recent_high + recent_low + recent_close) / 3
+        return summarize_indicators(bars, compute_indicators(bars, indicators or DEFAULT_INDICATORS))
 
-        # Support and resistance levels
-        r1 = 2 * pivot - recent_low
-        s1 = 2 * pivot - recent_high
-        r2 = pivot + (recent_high - recent_low)
-        s2 = pivot - (recent_high - recent_low)
+    except Exception as e:
+        return {"error": f"Failed to calculate technical indicators: {str(e)}"}
 
-        return {
-            "pivot_point": round(pivot, 2),
-            "resistance_1": round(r1, 2),
-            "support_1": round(s1, 2),
-            "resistance_2": round(r2, 2),
-            "support_2": round(s2, 2),
-            "recent_high": recent_high,
-            "recent_low": recent_low
-        }
+def summarize_indicators(bars: dict, series: dict) -> dict:
+    """Latest value of each indicator series plus the signals the recommendation logic reads"""
+    closes, volumes = bars["close"], bars["volume"]
+    indicators = latest_values(series)
 
-    except Exception:
-        return {}
+    # Price relative to moving averages
+    current_price = closes[-1]
+    for window in (5, 20):
+        average = sma(closes, window)[-1]
+        indicators[f"price_vs_sma{window}"] = (current_price - average) / average * 100 if average else 0
 
-def analyze_trend(prices: list) -> str:
-    """Analyze price trend"""
-    try:
-        if len(prices) < 5:
-            return "NEUTRAL"
+    # RSI (Relative Strength Index), Wilder smoothing
+    rsi_value = series["rsi_14"] if "rsi_14" in series else rsi(closes, 14)
+    indicators["rsi"] = 50.0 if np.isnan(rsi_value[-1]) else round(float(rsi_value[-1]), 2)
 
-        # Simple trend analysis based on recent vs older prices
-        recent_avg = np.mean(prices[-5:])
-        older_avg = np.mean(prices[-10:-5]) if len(prices) >= 10 else np.mean(prices[:-5])
+    # Support and Resistance levels
+    indicators.update(pivot_levels(bars["high"], bars["low"], closes))
 
-        trend_strength = abs(recent_avg - older_avg) / older_avg * 100
+    # Volume analysis
+    avg_volume = np.mean(volumes[-20:])
+    indicators["volume_ratio"] = float(volumes[-1] / avg_volume) if avg_volume > 0 else 1
 
-        if recent_avg > older_avg:
-            if trend_strength > 2:
-                return "STRONG_UPTREND"
-            else:
-                return "WEAK_UPTREND"
-        elif recent_avg < older_avg:
-            if trend_strength > 2:
-                return "STRONG_DOWNTREND"
-            else:
-                return "WEAK_DOWNTREND"
-        else:
-            return "NEUTRAL"
+    # Trend analysis
+    indicators["trend"] = trend_label(closes)
 
-    except Exception:
-        return "NEUTRAL"
+    return indicators
 
 def assess_risk(price_data: list) -> dict:
     """Assess investment risk"""
@@ -683,20 +760,34 @@ def calculate_confidence_score(data_summary: dict, technical: dict, risk: dict)
         return 50  # Default confidence if calculation fails
 
 @tool(args_schema=TechnicalIndicatorsInput)
-def get_technical_indicators(ticker: str, period: str = "daily", days_back: int = 30) -> dict:
+def get_technical_indicators(ticker: str, period: str = "daily", days_back: int = 30, indicators: Optional[list[str]] = None) -> dict:
     """
     Calculates technical indicators for a stock including:
-    - Moving averages (5, 20, 50 day)
-    - RSI (Relative Strength Index)
+    - Moving averages (SMA/EMA at any window)
+    - RSI (Wilder), MACD, Bollinger bands, ATR, OBV and stochastics
     - Support and resistance levels
     - Volume analysis
     - Trend identification
+    Pass indicators=[...] (e.g. ['ema_50', 'rsi_6', 'bollinger']) to also get
+    each selected indicator as a full series aligned with the dates.
     """
     try:
         ticker = normalize_ticker(ticker)
 
-        # Get price history
-        price_history = get_stock_price_history.func(ticker, period, days_back)
+        for spec in indicators or []:
+            parse_indicator(spec)
+
+        # Repeat requests are answered from the cache while the bars they used cannot have changed
+        adjust = indicator_adjustment(ticker)
+        calendar = get_calendar(get_market_type(ticker))
+        request = ("technical_indicators", ticker, period, days_back, adjust, tuple(indicators or ()))
+        window = cache_window(calendar)
+        cached = indicator_cache.recent(request, window)
+        if cached is not None:
+            return cached
+
+        # Get price history as parallel lists, which map straight onto the indicator arrays
+        price_history = get_stock_price_history.func(ticker, period, days_back, adjust=adjust, format="columnar")
 
         if "error" in price_history or not price_history.get("price_data"):
             return {
@@ -704,20 +795,106 @@ def get_technical_indicators(ticker: str, period: str = "daily", days_back: int
                 "ticker": ticker
             }
 
-        # Calculate technical indicators
-        indicators = calculate_technical_indicators(price_history["price_data"])
+        price_data = price_history["price_data"]
+        bars = price_arrays(price_data)
+        if len(bars["close"]) < MIN_INDICATOR_BARS:
+            return {
+                "error": f"Insufficient data for technical analysis: {len(bars['close'])} bars, need {MIN_INDICATOR_BARS}",
+                "ticker": ticker
+            }
 
-        return {
+        # Unadjusted fallback bars (no factor table) are flagged and never cached as the adjusted result
+        fallback = price_history.get("adjust", adjust) != adjust
+        last_bar = (price_data["date"][-1], float(bars["close"][-1]), float(bars["volume"][-1]))
+        settled = bar_is_settled(last_bar[0], calendar, period)
+        cached = None if fallback else indicator_cache.get(request, last_bar)
+        if cached is not None:
+            return indicator_cache.put(request, last_bar, cached, window, settled)
+
+        # One pass computes every requested series; the summary reads their last values
+        series = compute_indicators(bars, indicators or DEFAULT_INDICATORS)
+        result = {
             "ticker": ticker,
             "period": period,
             "analysis_date": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            "indicators": indicators,
-            "data_points": len(price_history.get("price_data", [])),
+            "indicators": summarize_indicators(bars, series),
+            "data_points": len(bars["close"]),
             "current_price": price_history.get("latest_price", 0)
         }
+        if indicators:
+            result["series"] = {"date": price_data["date"], **series_to_lists(series)}
+        if fallback:
+            result["warning"] = price_history.get("warning")
+            return result
+
+        return indicator_cache.put(request, last_bar, result, window, settled)
 
     except Exception as e:
         return {
             "error": f"Failed to calculate technical indicators for {ticker}: {str(e)}",
             "ticker": ticker
-        }
\ No newline at end of file
+        }
+
+@tool(args_schema=IndicatorScreenInput)
+def screen_technical_indicators(tickers: Optional[list[str]] = None, market: str = "CN", days_back: int = 120,
+                                indicators: Optional[list[str]] = None, sort_by: str = "rsi_14", top: int = 20) -> dict:
+    """
+    Screens many stocks of one market by technical indicators in a single call.
+    Computes the indicator set for all tickers at once on a dates x tickers
+    panel and returns the top tickers by `sort_by`, each with its latest
+    indicator values and percentiles across the screened tickers.
+    Without tickers, screens every ticker in the market's current spot table
+    without fetching history: only tickers whose daily bars are already in
+    the local history cache get values (warm it with baymax-prefetch).
+    """
+    try:
+        for spec in indicators or []:
+            parse_indicator(spec)
+
+        if tickers:
+            tickers = list(dict.fromkeys(normalize_ticker(t) for t in tickers))
+            markets = {get_market_type(t) for t in tickers}
+            if len(markets) > 1:
+                return {"error": f"Tickers span several markets ({', '.join(sorted(markets))}); screen one market at a time"}
+            market = markets.pop()
+            fetch_missing = True
+        else:
+            tickers = universe_tickers(market)
+            fetch_missing = False
+
+        calendar = get_calendar(market)
+        end_date = calendar.today()
+        start_date = calendar.window_start(days_back)
+        # Adjusted like get_technical_indicators, so a screen agrees with the single-ticker values
+        panel = build_panel(market, tickers, start_date, end_date, fields=("high", "low", "close", "volume"),
+                            fetch_missing=fetch_missing, adjust=market_adjustment(market))
+
+        results = panel.indicators(indicators or DEFAULT_INDICATORS)
+        if sort_by not in results:
+            return {"error": f"Unknown sort_by '{sort_by}', expected one of: {', '.join(results)}"}
+
+        ranked = sorted(
+            (ticker for ticker, rank in results[sort_by]["rank"].items() if rank is not None),
+            key=lambda ticker: results[sort_by]["rank"][ticker]
+        )
+        return {
+            "market": market,
+            "as_of": str(panel.dates[-1]) if len(panel.dates) else None,
+            "screened": len(tickers),
+            "with_data": len(ranked),
+            "adjust": panel.adjust,
+            "unadjusted": panel.unadjusted,
+            "sort_by": sort_by,
+            "results": [
+                {
+                    "ticker": ticker,
+                    "rank": results[sort_by]["rank"][ticker],
+                    "values": {name: output["latest"][ticker] for name, output in results.items()},
+                    "percentiles": {name: output["percentile"][ticker] for name, output in results.items()}
+                }
+                for ticker in ranked[:top]
+            ]
+        }
+
+    except Exception as e:
+        return {"error": f"Failed to screen technical indicators: {str(e)}"}
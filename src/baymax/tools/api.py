@@ -1,9 +1,11 @@
 import os
-import akshare as ak
 import pandas as pd
 from datetime import datetime, timedelta
 import warnings
 import numpy as np
+from baymax.tools.upstream import call_akshare
+from baymax.tools.records import frame_to_records, items_to_dict
+from baymax.tools.snapshot import spot_cache
 
 ####################################
 # AkShare Configuration
@@ -26,7 +28,7 @@ def normalize_ticker(ticker: str) -> str:
     
     # 如果是港股代码 (格式: XXXX.HK)
     if ticker.endswith('.HK'):
-        return ticker
+        return hk_ticker(ticker)
     
     # 如果是美股ADR，保持原样
     if ticker in ['TSLA', 'AAPL', 'MSFT', 'GOOGL', 'AMZN', 'META', 'NFLX', 'NVDA']:
@@ -42,6 +44,34 @@ def normalize_ticker(ticker: str) -> str:
     
     return ticker
 
+def hk_ticker(code: str) -> str:
+    """港股标准代码: 四位以上数字加 .HK, 如 01211 / 01211.HK -> 1211.HK"""
+    return f"{code.upper().replace('.HK', '').lstrip('0').zfill(4)}.HK"
+
+def hk_code(ticker: str) -> str:
+    """东方财富港股接口使用的五位代码, 如 1211.HK -> 01211"""
+    return ticker.upper().replace('.HK', '').lstrip('0').zfill(5)
+
+def us_code(ticker: str) -> str:
+    """东方财富美股接口使用的带交易所前缀代码, 如 AAPL -> 105.AAPL"""
+    if '.' in ticker:
+        return ticker
+    # The exchange id (105 NASDAQ, 106 NYSE, 107 AMEX) comes from the spot table's code column
+    try:
+        code = spot_cache.get_snapshot("US").code_for(ticker)
+    except Exception as e:
+        print(f"⚠ US spot table unavailable to resolve {ticker}'s exchange, assuming NASDAQ: {e}")
+        code = None
+    return code or f"105.{ticker}"
+
+def get_market_type(ticker: str) -> str:
+    """根据标准化后的股票代码判断市场: 'HK' 港股, 'US' 美股, 'CN' A股"""
+    if ticker.endswith('.HK'):
+        return 'HK'
+    if ticker.isalpha() and len(ticker) <= 5:
+        return 'US'
+    return 'CN'
+
 def get_stock_financial_data(ticker: str, period: str, limit: int = 10) -> dict:
     """使用akshare获取股票财务数据，支持港股、美股和A股"""
     try:
@@ -75,7 +105,7 @@ def get_hk_stock_financial_data(ticker: str, period: str, limit: int = 10) -> di
         # 获取港股财务报表
         try:
             # 使用akshare的港股财务报告接口
-            hk_financial_df = ak.stock_financial_hk_report_em(symbol=stock_code)
+            hk_financial_df = call_akshare("stock_financial_hk_report_em", symbol=stock_code)
             
             if not hk_financial_df.empty:
                 # 标准化港股财务数据格式
@@ -94,19 +124,17 @@ def get_hk_stock_financial_data(ticker: str, period: str, limit: int = 10) -> di
                     # 年度数据
                     recent_data = hk_financial_df.head(limit)
                 
-                # 转换为标准格式
-                for _, row in recent_data.iterrows():
-                    statement = {
-                        'report_date': row.get('报告日期', row.get('日期', '')),
-                        'ticker': ticker
-                    }
-                    
-                    # 添加财务数据字段
-                    for col in row.index:
-                        if col not in ['report_date', '日期', 'ticker']:
-                            statement[col] = row[col]
-                    
-                    # 根据报表类型分类 - 港股财务数据通常包含所有报表信息
+                # 转换为标准格式 - 整表一次性转换, 不逐行遍历
+                if '报告日期' in recent_data.columns:
+                    report_dates = recent_data['报告日期']
+                else:
+                    report_dates = recent_data['日期'] if '日期' in recent_data.columns else ''
+                statements = recent_data.drop(columns=['report_date', '日期', 'ticker'], errors='ignore')
+                statements.insert(0, 'ticker', ticker)
+                statements.insert(0, 'report_date', report_dates)
+
+                # 根据报表类型分类 - 港股财务数据通常包含所有报表信息
+                for statement in frame_to_records(statements):
                     income_statements.append(statement.copy())
                     balance_sheets.append(statement.copy())
                     cash_flow_statements.append(statement.copy())
@@ -121,7 +149,7 @@ def get_hk_stock_financial_data(ticker: str, period: str, limit: int = 10) -> di
             
             # 尝试使用港股财务指标接口作为备选
             try:
-                hk_indicator_df = ak.stock_financial_hk_analysis_indicator_em(symbol=stock_code)
+                hk_indicator_df = call_akshare("stock_financial_hk_analysis_indicator_em", symbol=stock_code)
                 if not hk_indicator_df.empty:
                     # 创建标准化的财务数据
                     statement = {
@@ -165,22 +193,23 @@ def get_us_stock_financial_data(ticker: str, period: str, limit: int = 10) -> di
         
         # 获取基本股票信息
         try:
-            # 获取美股实时行情数据
-            stock_info = ak.stock_us_spot_em(symbol=ticker)
+            # 获取美股实时行情数据（全市场快照，stock_us_spot_em 不接受 symbol 参数）
+            snapshot = spot_cache.get_snapshot("US")
+            stock_info = snapshot.lookup(ticker) or {}
             
-            # 获取美股历史数据
-            stock_hist = ak.stock_us_hist(symbol=ticker, period="daily", start_date="20230101", end_date=pd.Timestamp.now().strftime('%Y%m%d'))
+            # 获取美股历史数据（需要带交易所前缀的代码，如 105.AAPL）
+            stock_hist = call_akshare("stock_us_hist", symbol=snapshot.code_for(ticker) or ticker, period="daily", start_date="20230101", end_date=pd.Timestamp.now().strftime('%Y%m%d'))
             
-            if not stock_info.empty or not stock_hist.empty:
+            if stock_info or not stock_hist.empty:
                 # 创建模拟的财务数据，基于市场数据
                 current_data = {
                     'ticker': ticker,
                     'report_date': pd.Timestamp.now().strftime('%Y-%m-%d'),
-                    'current_price': stock_info.get('最新价', [0]).iloc[0] if not stock_info.empty else 0,
-                    'volume': stock_info.get('成交量', [0]).iloc[0] if not stock_info.empty else 0,
-                    'market_cap': stock_info.get('总市值', [0]).iloc[0] if not stock_info.empty else 0,
-                    'pe_ratio': stock_info.get('市盈率', [0]).iloc[0] if not stock_info.empty else 0,
-                    'pb_ratio': stock_info.get('市净率', [0]).iloc[0] if not stock_info.empty else 0,
+                    'current_price': stock_info.get('current_price') or 0,
+                    'volume': stock_info.get('volume') or 0,
+                    'market_cap': stock_info.get('market_cap') or 0,
+                    'pe_ratio': stock_info.get('pe_ratio') or 0,
+                    'pb_ratio': stock_info.get('pb_ratio') or 0,
                     'revenue_estimate': 'N/A',  # 收入估算
                     'earnings_estimate': 'N/A'   # 盈利估算
                 }
@@ -231,16 +260,16 @@ def get_cn_stock_financial_data(ticker: str, period: str, limit: int = 10) -> di
         # 获取财务报表数据 - 使用更稳定的接口
         try:
             # 尝试使用东方财富接口
-            income_df = ak.stock_financial_abstract(symbol=ticker)
-            balance_df = ak.stock_balance_sheet_by_report_em(symbol=ticker)
-            cashflow_df = ak.stock_cash_flow_sheet_by_report_em(symbol=ticker)
-        except:
+            income_df = call_akshare("stock_financial_abstract", symbol=ticker)
+            balance_df = call_akshare("stock_balance_sheet_by_report_em", symbol=ticker)
+            cashflow_df = call_akshare("stock_cash_flow_sheet_by_report_em", symbol=ticker)
+        except Exception:
             # 如果东方财富接口失败，使用新浪财经接口
             try:
-                income_df = ak.stock_financial_report_sina(stock=ticker, symbol="利润表")
-                balance_df = ak.stock_financial_report_sina(stock=ticker, symbol="资产负债表") 
-                cashflow_df = ak.stock_financial_report_sina(stock=ticker, symbol="现金流量表")
-            except:
+                income_df = call_akshare("stock_financial_report_sina", stock=ticker, symbol="利润表")
+                balance_df = call_akshare("stock_financial_report_sina", stock=ticker, symbol="资产负债表") 
+                cashflow_df = call_akshare("stock_financial_report_sina", stock=ticker, symbol="现金流量表")
+            except Exception:
                 income_df = pd.DataFrame()
                 balance_df = pd.DataFrame()
                 cashflow_df = pd.DataFrame()
@@ -305,9 +334,9 @@ def get_cn_stock_financial_data(ticker: str, period: str, limit: int = 10) -> di
         cashflow_df = cashflow_df.head(limit) if len(cashflow_df) > 0 else pd.DataFrame()
 
         return {
-            "income_statements": income_df.to_dict('records') if not income_df.empty else [],
-            "balance_sheets": balance_df.to_dict('records') if not balance_df.empty else [],
-            "cash_flow_statements": cashflow_df.to_dict('records') if not cashflow_df.empty else []
+            "income_statements": frame_to_records(income_df),
+            "balance_sheets": frame_to_records(balance_df),
+            "cash_flow_statements": frame_to_records(cashflow_df)
         }
         
     except Exception as e:
@@ -328,22 +357,18 @@ def get_stock_basic_info(ticker: str) -> dict:
         
         try:
             # 尝试使用东方财富接口
-            stock_info = ak.stock_individual_info_em(symbol=ticker)
-        except:
+            stock_info = call_akshare("stock_individual_info_em", symbol=ticker)
+        except Exception:
             try:
                 # 尝试使用新浪财经接口
-                stock_info = ak.stock_individual_info(symbol=ticker)
-            except:
+                stock_info = call_akshare("stock_individual_info", symbol=ticker)
+            except Exception:
                 # 如果都失败，返回空数据
                 return {}
         
         if stock_info is not None and not stock_info.empty:
             # 转换为更友好的格式
-            info_dict = {}
-            for _, row in stock_info.iterrows():
-                if 'item' in row and 'value' in row:
-                    info_dict[row['item']] = row['value']
-            return info_dict
+            return items_to_dict(stock_info)
         return {}
         
     except Exception as e:
@@ -2,9 +2,12 @@
 Constants for SEC filing items and other tool-related data.
 
 This module contains mappings for SEC filing item numbers to their descriptions,
-used across various filing tools (10-K, 10-Q, 8-K).
+used across various filing tools (10-K, 10-Q, 8-K), and the location of the
+local market data cache.
 """
 
+import os
+
 ####################################
 # SEC Filing Item Mappings
 ####################################
@@ -101,3 +104,10 @@ def format_items_description(items_map: dict[str, str]) -> str:
     """
     return "\n".join([f"  - {item}: {description}" for item, description in items_map.items()])
 
+
+####################################
+# Local Cache
+####################################
+
+# Root directory for on-disk market data caches (spot snapshots, price history)
+CACHE_DIR = os.path.expanduser(os.getenv("BAYMAX_CACHE_DIR", os.path.join("~", ".cache", "baymax")))
@@ -0,0 +1,508 @@
+"""
+Local incremental store of OHLCV history bars.
+
+The akshare *_hist endpoints return a date window of bars, and callers used to
+re-download the whole window on every call even when only today's bar was
+new. This module keeps one bar store per (market, symbol, period) on disk and
+remembers which date ranges it already holds, so a request only fetches the
+ranges that are missing and the rest is read back from local files.
+
+Each store is a directory of append-only segments, one .npy file per column,
+plus a coverage.json listing the covered date ranges. A fetch writes a new
+segment under a temporary name and renames it into place before coverage is
+updated, so other processes never read a half-written segment. When segments
+pile up they are compacted into one.
+
+Weekly, monthly and quarterly bars are built locally from the stored daily
+bars instead of being downloaded separately, so one daily fetch serves every
+timeframe.
+
+Bars are stored unadjusted. A-share qfq/hfq series are derived from them
+with locally cached adjustment factors (see adjustments.py), so an adjusted
+request costs no extra history download.
+
+Only settled bars that actually came back are recorded as covered: the
+trading calendar tells when the last session of a day, week or month has
+closed, and an empty response (akshare's answer to throttling as well as to
+no data) leaves its range open to be fetched again. Bars still in progress
+are stored but re-fetched once HISTORY_TAIL_TTL has passed, and ranges with
+no sessions at all (weekends, holidays, the future) are never fetched.
+"""
+
+import json
+import os
+import shutil
+import threading
+import time
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from baymax.tools.adjustments import adjust_columns, factor_store
+from baymax.tools.api import hk_code, us_code
+from baymax.tools.constants import CACHE_DIR
+from baymax.tools.trading_calendar import get_calendar
+from baymax.tools.upstream import call_akshare
+
+####################################
+# Configuration
+####################################
+
+# Keep history bars on disk and only fetch missing ranges (1/0)
+HISTORY_STORE_ENABLED = os.getenv("BAYMAX_HISTORY_STORE", "1").lower() not in ("0", "false", "no")
+
+# Directory holding one bar store per market/period/symbol
+HISTORY_CACHE_DIR = os.path.join(CACHE_DIR, "history")
+
+# Seconds the bar of the period still in progress is served before it is fetched again
+HISTORY_TAIL_TTL = float(os.getenv("BAYMAX_HISTORY_TAIL_TTL", "60"))
+
+# Build weekly/monthly bars from stored daily bars instead of fetching them (1/0)
+HISTORY_RESAMPLE = os.getenv("BAYMAX_HISTORY_RESAMPLE", "1").lower() not in ("0", "false", "no")
+
+# Periods that are only ever built locally; akshare has no such endpoint period
+LOCAL_ONLY_PERIODS = {"quarterly"}
+
+# Segments per store before they are compacted into one
+HISTORY_MAX_SEGMENTS = 8
+
+# akshare history endpoint used for each market
+HISTORY_FUNCTIONS = {
+    "CN": "stock_zh_a_hist",
+    "HK": "stock_hk_hist",
+    "US": "stock_us_hist",
+}
+
+# History table column behind each stored field
+HISTORY_COLUMNS = {
+    "open": "开盘",
+    "close": "收盘",
+    "high": "最高",
+    "low": "最低",
+    "volume": "成交量",
+    "turnover": "成交额",
+    "amplitude": "振幅",
+    "change_percent": "涨跌幅",
+    "change": "涨跌额",
+    "turnover_rate": "换手率",
+}
+
+DATE_COLUMN = "日期"
+
+
+####################################
+# Date ranges
+####################################
+
+def period_start(day: date, period: str) -> date:
+    """First calendar day of the daily/weekly/monthly/quarterly period containing `day`."""
+    if period == "weekly":
+        return day - timedelta(days=day.weekday())
+    if period == "monthly":
+        return day.replace(day=1)
+    if period == "quarterly":
+        return date(day.year, (day.month - 1) // 3 * 3 + 1, 1)
+    return day
+
+
+def merge_ranges(ranges: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """Merge overlapping or adjacent inclusive (start, end) day-ordinal ranges."""
+    merged: List[Tuple[int, int]] = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def missing_ranges(start: int, end: int, covered: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """Parts of the inclusive range [start, end] not inside any covered range."""
+    gaps = []
+    cursor = start
+    for covered_start, covered_end in covered:
+        if covered_end < cursor:
+            continue
+        if covered_start > end:
+            break
+        if covered_start > cursor:
+            gaps.append((cursor, covered_start - 1))
+        cursor = max(cursor, covered_end + 1)
+    if cursor <= end:
+        gaps.append((cursor, end))
+    return gaps
+
+
+####################################
+# Resampling
+####################################
+
+def period_keys(dates: np.ndarray, period: str) -> np.ndarray:
+    """Bucket key per datetime64[D] date: the first day of its week, month or quarter."""
+    if period == "weekly":
+        # 1970-01-01 was a Thursday; shift so buckets start on Monday
+        days = dates.astype("datetime64[D]").astype(np.int64)
+        return (days - (days + 3) % 7).astype("datetime64[D]")
+    months = dates.astype("datetime64[M]").astype(np.int64)
+    if period == "quarterly":
+        months = months - months % 3
+    return months.astype("datetime64[M]").astype("datetime64[D]")
+
+
+def resample_columns(columns: Dict[str, np.ndarray], period: str) -> Dict[str, np.ndarray]:
+    """
+    Aggregate date-sorted daily bar columns into weekly, monthly or quarterly bars.
+
+    Open is the first open, high the max, low the min and close the last
+    close; volume, turnover and turnover rate are summed. A bar is dated by
+    its last trading day, as akshare dates its own weekly and monthly bars.
+    Change, change percent and amplitude are recomputed against the previous
+    bar's close.
+    """
+    dates = columns["date"]
+    if len(dates) == 0:
+        return {field: values[:0] for field, values in columns.items()}
+
+    keys = period_keys(dates, period)
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    ends = np.r_[starts[1:], len(dates)] - 1
+
+    bars = {"date": dates[ends]}
+    if "open" in columns:
+        bars["open"] = columns["open"][starts]
+    if "close" in columns:
+        bars["close"] = columns["close"][ends]
+    for field, reduce in (("high", np.fmax), ("low", np.fmin)):
+        if field in columns:
+            bars[field] = reduce.reduceat(columns[field], starts)
+    for field in ("volume", "turnover", "turnover_rate"):
+        if field in columns:
+            bars[field] = np.add.reduceat(np.nan_to_num(columns[field]), starts)
+
+    if "close" in bars:
+        # The first bar's previous close comes from the day before it opened, if present
+        first_prev = columns["close"][starts[0]] - columns["change"][starts[0]] if "change" in columns else np.nan
+        prev_close = np.r_[first_prev, bars["close"][:-1]]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            bars["change"] = bars["close"] - prev_close
+            bars["change_percent"] = bars["change"] / prev_close * 100
+            if "high" in bars and "low" in bars:
+                bars["amplitude"] = (bars["high"] - bars["low"]) / prev_close * 100
+    return bars
+
+
+####################################
+# Bar store
+####################################
+
+class BarStore:
+    """The on-disk bars and coverage of one (market, symbol, period)."""
+
+    def __init__(self, root: str, market: str, symbol: str, period: str):
+        self.market = market
+        self.symbol = symbol
+        self.period = period
+        self.path = os.path.join(root, market, period, symbol.replace(os.sep, "_"))
+
+    def load_coverage(self) -> dict:
+        """Covered ranges plus the last fetch of the open tail."""
+        try:
+            with open(os.path.join(self.path, "coverage.json"), encoding="utf-8") as f:
+                coverage = json.load(f)
+            coverage["ranges"] = [tuple(r) for r in coverage.get("ranges", [])]
+            return coverage
+        except (OSError, ValueError):
+            return {"ranges": [], "tail": None}
+
+    def save_coverage(self, coverage: dict):
+        os.makedirs(self.path, exist_ok=True)
+        tmp = os.path.join(self.path, f".coverage.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"ranges": [list(r) for r in coverage["ranges"]], "tail": coverage.get("tail")}, f)
+        os.replace(tmp, os.path.join(self.path, "coverage.json"))
+
+    def segments(self) -> List[str]:
+        """Segment directories in the order they were written."""
+        try:
+            names = [name for name in os.listdir(self.path) if name.startswith("seg-")]
+        except OSError:
+            return []
+        return [os.path.join(self.path, name) for name in sorted(names)]
+
+    def append(self, frame: pd.DataFrame) -> Optional[str]:
+        """Write a fetched history table as a new segment."""
+        if frame is None or frame.empty or DATE_COLUMN not in frame.columns:
+            return None
+        os.makedirs(self.path, exist_ok=True)
+
+        name = f"seg-{time.time_ns():020d}-{os.getpid()}"
+        tmp_dir = os.path.join(self.path, f".{name}.tmp")
+        os.makedirs(tmp_dir, exist_ok=True)
+
+        dates = pd.to_datetime(frame[DATE_COLUMN], errors="coerce").to_numpy(dtype="datetime64[D]")
+        np.save(os.path.join(tmp_dir, "date.npy"), dates)
+        for field, column in HISTORY_COLUMNS.items():
+            if column in frame.columns:
+                values = pd.to_numeric(frame[column], errors="coerce").to_numpy(dtype=np.float64)
+                np.save(os.path.join(tmp_dir, f"{field}.npy"), values)
+
+        segment_dir = os.path.join(self.path, name)
+        os.replace(tmp_dir, segment_dir)
+        return segment_dir
+
+    def read_columns(self) -> Dict[str, np.ndarray]:
+        """All stored bars as columns sorted by date; a later segment wins for a repeated date."""
+        parts = []
+        for segment_dir in self.segments():
+            try:
+                part = {"date": np.load(os.path.join(segment_dir, "date.npy"))}
+                for field in HISTORY_COLUMNS:
+                    field_path = os.path.join(segment_dir, f"{field}.npy")
+                    if os.path.exists(field_path):
+                        part[field] = np.load(field_path)
+                parts.append(part)
+            except (OSError, ValueError):
+                continue  # Compacted away by another process mid-read
+
+        if not parts:
+            return {"date": np.array([], dtype="datetime64[D]")}
+
+        dates = np.concatenate([part["date"] for part in parts])
+        columns = {"date": dates}
+        for field in HISTORY_COLUMNS:
+            if any(field in part for part in parts):
+                columns[field] = np.concatenate([
+                    part.get(field, np.full(len(part["date"]), np.nan)) for part in parts
+                ])
+
+        # Keep the last occurrence of each date; np.unique also orders them by date
+        _, first_in_reversed = np.unique(dates[::-1], return_index=True)
+        order = len(dates) - 1 - first_in_reversed
+        order = order[~np.isnat(dates[order])]
+        return {field: values[order] for field, values in columns.items()}
+
+    def compact(self):
+        """Merge all segments into one and drop the originals."""
+        segments = self.segments()
+        if len(segments) <= 1:
+            return
+        columns = self.read_columns()
+        frame = columns_to_frame(columns)
+        self.append(frame)
+        for segment_dir in segments:
+            shutil.rmtree(segment_dir, ignore_errors=True)
+
+    def clear(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+def columns_to_frame(columns: Dict[str, np.ndarray]) -> pd.DataFrame:
+    """Rebuild a history table with akshare's column names from stored columns."""
+    frame = pd.DataFrame({DATE_COLUMN: pd.to_datetime(columns["date"]).date})
+    for field, column in HISTORY_COLUMNS.items():
+        if field in columns:
+            frame[column] = columns[field]
+    return frame
+
+
+####################################
+# Store
+####################################
+
+class HistoryStore:
+    """
+    Serves history windows from local bar stores, fetching only missing ranges.
+
+    get_bars() returns the same table the akshare *_hist endpoint would for
+    the window, so it is a drop-in replacement for the direct call.
+    """
+
+    def __init__(self, root: str = HISTORY_CACHE_DIR, enabled: bool = HISTORY_STORE_ENABLED,
+                 tail_ttl: float = HISTORY_TAIL_TTL):
+        self.root = root
+        self.enabled = enabled
+        self.tail_ttl = tail_ttl
+        self._locks: Dict[tuple, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+
+    def get_bars(self, market: str, ticker: str, period: str, start: date, end: date, adjust: str = "") -> pd.DataFrame:
+        """History bars for a ticker between start and end (inclusive), optionally 'qfq'/'hfq' adjusted."""
+        if period != "daily" and (period in LOCAL_ONLY_PERIODS or HISTORY_RESAMPLE):
+            return self.get_resampled_bars(market, ticker, period, start, end, adjust)
+
+        symbol = upstream_symbol(ticker, market)
+        if not self.enabled or (adjust and market != "CN"):
+            # No local factors outside A-shares; let upstream adjust
+            return fetch_history(market, symbol, period, start, end, adjust)
+
+        store = BarStore(self.root, market, symbol, period)
+        with self._lock_for(market, symbol, period):
+            coverage = store.load_coverage()
+            for gap_start, gap_end, needs_fetch in self.plan(market, period, start, end, coverage):
+                if needs_fetch:
+                    frame = fetch_history(market, symbol, period, gap_start, gap_end)
+                    store.append(frame)
+                    gap_end = returned_through(market, frame, gap_end)
+                    if gap_end is None:
+                        # Upstream sent nothing (or throttled us); leave the gap open for the next call
+                        continue
+                coverage = self._record_fetch(market, period, coverage, gap_start, gap_end, needs_fetch)
+                store.save_coverage(coverage)
+
+            if len(store.segments()) > HISTORY_MAX_SEGMENTS:
+                store.compact()
+
+            columns = store.read_columns()
+
+        dates = columns["date"]
+        in_window = (dates >= np.datetime64(start, "D")) & (dates <= np.datetime64(end, "D"))
+        columns = {field: values[in_window] for field, values in columns.items()}
+        if adjust:
+            try:
+                columns = adjust_columns(columns, factor_store.get(symbol), adjust)
+            except Exception as e:
+                return self._adjusted_upstream(market, symbol, period, start, end, adjust, columns, e)
+        return columns_to_frame(columns)
+
+    def _adjusted_upstream(self, market: str, symbol: str, period: str, start: date, end: date, adjust: str,
+                           raw_columns: Dict[str, np.ndarray], error: Exception) -> pd.DataFrame:
+        """
+        Adjusted bars when no factor table is available: upstream's own adjusted
+        series, else the raw bars with frame.attrs["adjust"] set to ''.
+        """
+        print(f"⚠ No adjustment factors for {symbol}, asking upstream for {adjust} bars: {error}")
+        try:
+            frame = fetch_history(market, symbol, period, start, end, adjust)
+            if frame is not None and not frame.empty:
+                return frame
+        except Exception as e:
+            error = e
+        print(f"⚠ Upstream {adjust} bars failed for {symbol}, returning unadjusted bars: {error}")
+        frame = columns_to_frame(raw_columns)
+        frame.attrs["adjust"] = ""
+        return frame
+
+    def get_resampled_bars(self, market: str, ticker: str, period: str, start: date, end: date,
+                           adjust: str = "") -> pd.DataFrame:
+        """Weekly/monthly/quarterly bars built from the (adjusted) daily bars of the same window."""
+        # Start at the first period boundary so the first bar is complete
+        daily = self.get_bars(market, ticker, "daily", period_start(start, period), end, adjust)
+        if daily.empty or DATE_COLUMN not in daily.columns:
+            return daily
+
+        columns = {"date": pd.to_datetime(daily[DATE_COLUMN]).to_numpy(dtype="datetime64[D]")}
+        for field, column in HISTORY_COLUMNS.items():
+            if column in daily.columns:
+                columns[field] = daily[column].to_numpy(dtype=np.float64)
+        frame = columns_to_frame(resample_columns(columns, period))
+        frame.attrs.update(daily.attrs)
+        return frame
+
+    def plan(self, market: str, period: str, start: date, end: date, coverage: dict) -> List[Tuple[date, date, bool]]:
+        """
+        Uncovered ranges of the window as (start, end, needs_fetch).
+
+        A range without any trading session up to the newest opened one
+        cannot hold a bar and is only recorded, not fetched; an unsettled tail fetched within the
+        tail TTL is skipped.
+        """
+        calendar = get_calendar(market)
+        # No bar can exist past the newest session that has opened
+        end = min(end, calendar.newest_session())
+        settled = calendar.settled_through(period)
+
+        planned = []
+        for gap_start, gap_end in missing_ranges(start.toordinal(), end.toordinal(), coverage["ranges"]):
+            gap_start, gap_end = date.fromordinal(gap_start), date.fromordinal(gap_end)
+            if not calendar.sessions(gap_start, gap_end):
+                planned.append((gap_start, gap_end, False))
+            elif gap_start > settled and self._tail_is_fresh(coverage, gap_end):
+                continue
+            else:
+                # Weekly/monthly bars are only complete when fetched from the period's first day
+                planned.append((period_start(gap_start, period), gap_end, True))
+        return planned
+
+    def _tail_is_fresh(self, coverage: dict, end: date) -> bool:
+        tail = coverage.get("tail")
+        if not tail:
+            return False
+        return tail["end"] >= end.toordinal() and time.time() - tail["fetched_at"] < self.tail_ttl
+
+    def _record_fetch(self, market: str, period: str, coverage: dict, start: date, end: date, fetched: bool = True) -> dict:
+        """Mark the settled part of a range as covered and note when the unsettled tail was fetched."""
+        settled = get_calendar(market).settled_through(period)
+        ranges = list(coverage["ranges"])
+        settled_end = min(end, settled)
+        if settled_end >= start:
+            ranges.append((start.toordinal(), settled_end.toordinal()))
+
+        tail = coverage.get("tail")
+        if fetched and end > settled:
+            tail = {"end": end.toordinal(), "fetched_at": time.time()}
+        return {"ranges": merge_ranges(ranges), "tail": tail}
+
+    def pending_gaps(self, market: str, ticker: str, period: str, start: date, end: date) -> List[Tuple[date, date]]:
+        """Ranges of the window that the local store still has to fetch from upstream."""
+        store = BarStore(self.root, market, upstream_symbol(ticker, market), period)
+        planned = self.plan(market, period, start, end, store.load_coverage())
+        return [(gap_start, gap_end) for gap_start, gap_end, needs_fetch in planned if needs_fetch]
+
+    def coverage(self, market: str, ticker: str, period: str = "daily") -> List[Tuple[date, date]]:
+        """Closed date ranges held locally for a ticker."""
+        store = BarStore(self.root, market, upstream_symbol(ticker, market), period)
+        return [(date.fromordinal(s), date.fromordinal(e)) for s, e in store.load_coverage()["ranges"]]
+
+    def invalidate(self, market: str, ticker: str, period: Optional[str] = None):
+        """Forget the stored bars for a ticker (all periods by default)."""
+        symbol = upstream_symbol(ticker, market)
+        for p in [period] if period else ("daily", "weekly", "monthly"):
+            with self._lock_for(market, symbol, p):
+                BarStore(self.root, market, symbol, p).clear()
+
+    def _lock_for(self, market: str, symbol: str, period: str) -> threading.Lock:
+        key = (market, symbol, period)
+        with self._locks_guard:
+            return self._locks.setdefault(key, threading.Lock())
+
+
+def returned_through(market: str, frame: Optional[pd.DataFrame], end: date) -> Optional[date]:
+    """
+    Last day of a fetched range that the returned bars account for: through
+    the day before the session after the last bar, capped at `end`. None if
+    no bars came back, so nothing of the range may be marked covered.
+    """
+    if frame is None or frame.empty or DATE_COLUMN not in frame.columns:
+        return None
+    last = pd.to_datetime(frame[DATE_COLUMN], errors="coerce").max()
+    if pd.isna(last):
+        return None
+    next_session = get_calendar(market).next_session(last.date() + timedelta(days=1))
+    return min(end, next_session - timedelta(days=1))
+
+
+def upstream_symbol(ticker: str, market: str) -> str:
+    """Symbol as the market's history endpoint expects it."""
+    if market == 'HK':
+        return hk_code(ticker)
+    if market == 'US':
+        return us_code(ticker)
+    return ticker
+
+
+def fetch_history(market: str, symbol: str, period: str, start: date, end: date, adjust: str = "") -> pd.DataFrame:
+    """Download one window of history bars from akshare."""
+    extra = {"adjust": adjust} if adjust else {}
+    return call_akshare(
+        HISTORY_FUNCTIONS.get(market, HISTORY_FUNCTIONS["CN"]),
+        symbol=symbol,
+        period=period,
+        start_date=start.strftime('%Y%m%d'),
+        end_date=end.strftime('%Y%m%d'),
+        **extra
+    )
+
+
+history_store = HistoryStore()
@@ -0,0 +1,146 @@
+"""
+In-memory cache of computed indicator results.
+
+get_technical_indicators and analyze_stock_with_ai used to fetch bars and
+redo the indicator math on every call, even when nothing had changed since
+the previous request. Results are memoized here, keyed on what they depend
+on: the request (ticker, period, window, adjustment, indicator set) plus the
+last bar they were computed from.
+
+A lookup can skip the fetch as well as the math. Each result is stored with
+its window: the day the request's date window ends on and the newest session
+that had opened when the bars were fetched. While both are unchanged, a
+result computed from settled bars (the last bar's period has closed) cannot
+change, since no newer bar can have appeared upstream; one whose last bar is
+still in progress is reused for HISTORY_TAIL_TTL seconds, the same time the
+history store itself would serve that bar without fetching it again. A
+result stored before the open therefore stops being served once the session
+opens.
+
+Results are stored pickled, so callers that add fields to or trim the dict
+they get back cannot change what later callers see. Entries are evicted least
+recently used first once their pickled size passes INDICATOR_CACHE_MAX_BYTES.
+"""
+
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from baymax.tools.history import HISTORY_TAIL_TTL
+
+####################################
+# Configuration
+####################################
+
+# Memory held by cached indicator results before the least recently used are evicted; 0 disables
+INDICATOR_CACHE_MAX_BYTES = int(float(os.getenv("BAYMAX_INDICATOR_CACHE_MB", "64")) * 1024 * 1024)
+
+
+####################################
+# Cache
+####################################
+
+class IndicatorCache:
+    """LRU map from (request, last bar) to a pickled result, capped by total bytes; lookups return fresh copies."""
+
+    def __init__(self, max_bytes: int = INDICATOR_CACHE_MAX_BYTES, tail_ttl: float = HISTORY_TAIL_TTL):
+        self.max_bytes = max_bytes
+        self.tail_ttl = tail_ttl
+        self._entries: "OrderedDict[Hashable, Tuple[bytes, int]]" = OrderedDict()
+        # request -> (entry key, window, settled, stored_at) of the newest result
+        self._latest: Dict[Hashable, Tuple[Hashable, Hashable, bool, float]] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.fetches_skipped = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def recent(self, request: Hashable, window: Hashable) -> Optional[Any]:
+        """
+        The request's newest result if it is still current without fetching:
+        same window (see cache_window), and either settled or within the tail TTL.
+        """
+        with self._lock:
+            latest = self._latest.get(request)
+            if latest is None:
+                return None
+            key, stored_window, settled, stored_at = latest
+            if stored_window != window or not (settled or time.time() - stored_at < self.tail_ttl):
+                return None
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self.fetches_skipped += 1
+        return pickle.loads(entry[0])
+
+    def get(self, request: Hashable, last_bar: Hashable) -> Optional[Any]:
+        """Result computed from the same bars, looked up after a fetch."""
+        key = (request, last_bar)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return pickle.loads(entry[0])
+
+    def put(self, request: Hashable, last_bar: Hashable, result: Any, window: Hashable, settled: bool) -> Any:
+        """
+        Store a result computed from bars ending in `last_bar`; returns the result.
+        `window` must be taken before the bars were fetched.
+        """
+        if self.max_bytes <= 0:
+            return result
+        key = (request, last_bar)
+        blob = pickle.dumps(result, pickle.HIGHEST_PROTOCOL)
+        size = len(blob)
+        if size > self.max_bytes:
+            return result
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            self._entries[key] = (blob, size)
+            self._bytes += size
+            self._latest[request] = (key, window, settled, time.time())
+            while self._bytes > self.max_bytes:
+                evicted_key, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+                if self._latest.get(evicted_key[0], (None,))[0] == evicted_key:
+                    del self._latest[evicted_key[0]]
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._latest.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "fetches_skipped": self.fetches_skipped,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+def cache_window(calendar) -> Tuple[date, date]:
+    """Window a result is valid for: the exchange's current date and its newest opened session."""
+    return calendar.today(), calendar.newest_session()
+
+
+indicator_cache = IndicatorCache()
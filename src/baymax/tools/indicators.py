@@ -0,0 +1,322 @@
+"""
+Vectorized technical indicators over float64 price arrays.
+
+Every indicator returns full series aligned with the input bars; positions
+without enough history are NaN. Windows are arbitrary (sma_10, ema_50,
+rsi_6, ...), and a whole indicator set is computed from one set of arrays
+by compute_indicators().
+
+Recursive averages follow the usual charting conventions: EMA is seeded with
+the SMA of its first window, and RSI and ATR use Wilder's smoothing
+(alpha = 1/window), seeded the same way. For a single series the recursion
+runs in pandas' compiled ewm; for a 2-D panel it steps through the rows with
+every ticker updated at once.
+
+The functions also accept 2-D dates x tickers arrays and work along the time
+axis, so panel.batch_indicators() computes an indicator set for a whole
+universe in one pass and ranks the tickers on the latest values. NaN bars (tickers
+listed later, suspensions) stay NaN.
+"""
+
+from typing import Dict, Iterable, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+####################################
+# Configuration
+####################################
+
+# Indicator set used when a caller does not choose one
+DEFAULT_INDICATORS = ("sma_5", "sma_20", "sma_50", "ema_12", "ema_26", "rsi_14", "macd", "bollinger",
+                      "atr_14", "obv", "stoch")
+
+# Bars needed before indicators are reported at all
+MIN_INDICATOR_BARS = 20
+
+
+####################################
+# Building blocks
+####################################
+
+def _nan_series(shape) -> np.ndarray:
+    return np.full(shape, np.nan)
+
+
+def sma(values: np.ndarray, window: int) -> np.ndarray:
+    """Simple moving average from one cumulative sum; windows containing a NaN are NaN."""
+    values = np.asarray(values, dtype=np.float64)
+    result = _nan_series(values.shape)
+    if window <= 0 or len(values) < window:
+        return result
+    valid = ~np.isnan(values)
+    zero = np.zeros((1,) + values.shape[1:])
+    sums = np.concatenate([zero, np.cumsum(np.where(valid, values, 0.0), axis=0)])
+    counts = np.concatenate([zero, np.cumsum(valid, axis=0)])
+    full = (counts[window:] - counts[:-window]) == window
+    result[window - 1:] = np.where(full, (sums[window:] - sums[:-window]) / window, np.nan)
+    return result
+
+
+def rolling_std(values: np.ndarray, window: int, ddof: int = 0) -> np.ndarray:
+    """Rolling standard deviation over a sliding window view (no cumulative-sum cancellation)."""
+    values = np.asarray(values, dtype=np.float64)
+    result = _nan_series(values.shape)
+    if window <= ddof or len(values) < window:
+        return result
+    result[window - 1:] = sliding_window_view(values, window, axis=0).std(axis=-1, ddof=ddof)
+    return result
+
+
+def rolling_max(values: np.ndarray, window: int) -> np.ndarray:
+    values = np.asarray(values, dtype=np.float64)
+    result = _nan_series(values.shape)
+    if len(values) >= window > 0:
+        result[window - 1:] = sliding_window_view(values, window, axis=0).max(axis=-1)
+    return result
+
+
+def rolling_min(values: np.ndarray, window: int) -> np.ndarray:
+    values = np.asarray(values, dtype=np.float64)
+    result = _nan_series(values.shape)
+    if len(values) >= window > 0:
+        result[window - 1:] = sliding_window_view(values, window, axis=0).min(axis=-1)
+    return result
+
+
+def smoothed(values: np.ndarray, window: int, alpha: float) -> np.ndarray:
+    """
+    Exponential smoothing seeded with the mean of the first `window` values.
+
+    Works column-wise on 2-D input. Leading NaNs (an earlier indicator's
+    warm-up, a ticker listed later) are skipped per column, so each column is
+    seeded from its own first `window` bars; later NaNs (suspensions) are
+    skipped by the recursion and stay NaN in the output.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    result = _nan_series(values.shape)
+    length = len(values)
+    if window <= 0 or length < window:
+        return result
+    matrix = values.reshape(length, -1)
+    valid = ~np.isnan(matrix)
+
+    first = np.argmax(valid, axis=0)
+    seed_at = first + window - 1
+    columns = np.flatnonzero(valid.any(axis=0) & (seed_at < length))
+    if len(columns) == 0:
+        return result
+
+    zero = np.zeros((1, matrix.shape[1]))
+    sums = np.concatenate([zero, np.cumsum(np.where(valid, matrix, 0.0), axis=0)])
+    counts = np.concatenate([zero, np.cumsum(valid, axis=0)])
+    seed_rows, first_rows = seed_at[columns] + 1, first[columns]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        seeds = (sums[seed_rows, columns] - sums[first_rows, columns]) / (counts[seed_rows, columns] - counts[first_rows, columns])
+
+    seeded = np.full(matrix.shape, np.nan)
+    seeded[:, columns] = matrix[:, columns]
+    seeded[np.arange(length)[:, np.newaxis] < seed_at[np.newaxis, :]] = np.nan
+    seeded[seed_at[columns], columns] = seeds
+    if matrix.shape[1] == 1:
+        smoothed_values = pd.Series(seeded[:, 0]).ewm(alpha=alpha, adjust=False, ignore_na=True).mean().to_numpy(copy=True)
+    else:
+        # Wide panels recurse one row at a time across all tickers, which beats a per-column ewm
+        smoothed_values = np.empty(matrix.shape)
+        previous = np.full(matrix.shape[1], np.nan)
+        for row in range(length):
+            current = seeded[row]
+            previous = np.where(np.isnan(current), previous,
+                                np.where(np.isnan(previous), current, previous + alpha * (current - previous)))
+            smoothed_values[row] = previous
+    smoothed_values[np.isnan(seeded.reshape(smoothed_values.shape))] = np.nan
+    return smoothed_values.reshape(values.shape)
+
+
+def ema(values: np.ndarray, window: int) -> np.ndarray:
+    """Exponential moving average with alpha = 2 / (window + 1)."""
+    return smoothed(values, window, 2.0 / (window + 1))
+
+
+def wilder(values: np.ndarray, window: int) -> np.ndarray:
+    """Wilder's moving average (alpha = 1 / window), as used by RSI and ATR."""
+    return smoothed(values, window, 1.0 / window)
+
+
+####################################
+# Indicators
+####################################
+
+def rsi(close: np.ndarray, window: int = 14) -> np.ndarray:
+    """Relative Strength Index with Wilder smoothing of gains and losses."""
+    close = np.asarray(close, dtype=np.float64)
+    delta = np.diff(close, axis=0)
+    missing = np.isnan(delta)
+    gains = wilder(np.where(missing, np.nan, np.maximum(delta, 0.0)), window)
+    losses = wilder(np.where(missing, np.nan, np.maximum(-delta, 0.0)), window)
+    result = _nan_series(close.shape)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        result[1:] = np.where(losses == 0, np.where(gains == 0, 50.0, 100.0), 100 - 100 / (1 + gains / losses))
+    result[1:][np.isnan(gains)] = np.nan
+    return result
+
+
+def macd(close: np.ndarray, fast: int = 12, slow: int = 26, signal: int = 9) -> Dict[str, np.ndarray]:
+    """MACD line, its signal line and the histogram between them."""
+    line = ema(close, fast) - ema(close, slow)
+    signal_line = ema(line, signal)
+    return {"macd": line, "macd_signal": signal_line, "macd_histogram": line - signal_line}
+
+
+def bollinger(close: np.ndarray, window: int = 20, width: float = 2.0) -> Dict[str, np.ndarray]:
+    """Bollinger bands (population standard deviation), bandwidth and %B."""
+    middle = sma(close, window)
+    spread = width * rolling_std(close, window)
+    upper, lower = middle + spread, middle - spread
+    with np.errstate(divide="ignore", invalid="ignore"):
+        bandwidth = (upper - lower) / middle * 100
+        percent_b = (np.asarray(close, dtype=np.float64) - lower) / (upper - lower)
+    return {
+        "bollinger_middle": middle,
+        "bollinger_upper": upper,
+        "bollinger_lower": lower,
+        "bollinger_bandwidth": bandwidth,
+        "bollinger_percent_b": percent_b,
+    }
+
+
+def true_range(high: np.ndarray, low: np.ndarray, close: np.ndarray) -> np.ndarray:
+    high, low, close = (np.asarray(a, dtype=np.float64) for a in (high, low, close))
+    previous_close = _nan_series(close.shape)
+    previous_close[1:] = close[:-1]
+    true_range = np.fmax(high - low, np.fmax(np.abs(high - previous_close), np.abs(low - previous_close)))
+    true_range[np.isnan(high - low)] = np.nan
+    return true_range
+
+
+def atr(high: np.ndarray, low: np.ndarray, close: np.ndarray, window: int = 14) -> np.ndarray:
+    """Average True Range with Wilder smoothing."""
+    return wilder(true_range(high, low, close), window)
+
+
+def obv(close: np.ndarray, volume: np.ndarray) -> np.ndarray:
+    """On-Balance Volume, starting from zero at the first bar."""
+    close = np.asarray(close, dtype=np.float64)
+    direction = _nan_series(close.shape)
+    direction[1:] = np.sign(np.diff(close, axis=0))
+    return np.cumsum(np.nan_to_num(direction) * np.nan_to_num(np.asarray(volume, dtype=np.float64)), axis=0)
+
+
+def stochastic(high: np.ndarray, low: np.ndarray, close: np.ndarray, window: int = 14,
+               smooth: int = 3) -> Dict[str, np.ndarray]:
+    """Stochastic oscillator: %K over `window` bars and %D as its `smooth`-bar SMA."""
+    highest, lowest = rolling_max(high, window), rolling_min(low, window)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        k = (np.asarray(close, dtype=np.float64) - lowest) / (highest - lowest) * 100
+    k = np.where(highest == lowest, 50.0, k)
+    k[np.isnan(highest) | np.isnan(np.asarray(close, dtype=np.float64))] = np.nan
+    d = sma(k, smooth)
+    return {"stoch_k": k, "stoch_d": d}
+
+
+####################################
+# Engine
+####################################
+
+# name -> (function of the bar arrays and an optional window, default window)
+INDICATORS: Dict[str, tuple] = {
+    "sma": (lambda bars, w: {f"sma_{w}": sma(bars["close"], w)}, 20),
+    "ema": (lambda bars, w: {f"ema_{w}": ema(bars["close"], w)}, 20),
+    "rsi": (lambda bars, w: {f"rsi_{w}": rsi(bars["close"], w)}, 14),
+    "macd": (lambda bars, w: macd(bars["close"]), None),
+    "bollinger": (lambda bars, w: bollinger(bars["close"], w), 20),
+    "atr": (lambda bars, w: {f"atr_{w}": atr(bars["high"], bars["low"], bars["close"], w)}, 14),
+    "obv": (lambda bars, w: {"obv": obv(bars["close"], bars["volume"])}, None),
+    "stoch": (lambda bars, w: stochastic(bars["high"], bars["low"], bars["close"], w), 14),
+}
+
+
+def parse_indicator(spec: str) -> tuple:
+    """'rsi_6' -> ('rsi', 6); 'macd' -> ('macd', None); unknown names raise ValueError."""
+    name, _, window = spec.strip().lower().partition("_")
+    if name not in INDICATORS:
+        raise ValueError(f"Unknown indicator '{spec}', expected one of: {', '.join(INDICATORS)}")
+    default = INDICATORS[name][1]
+    if not window:
+        return name, default
+    if default is None or not window.isdigit() or int(window) < 1:
+        raise ValueError(f"Invalid window in indicator '{spec}'")
+    return name, int(window)
+
+
+def price_arrays(price_data: Union[List[dict], Dict[str, list]]) -> Dict[str, np.ndarray]:
+    """float64 close/high/low/open/volume arrays from price records or columnar price data."""
+    fields = ("open", "high", "low", "close", "volume")
+    if isinstance(price_data, dict):
+        return {f: np.asarray(price_data.get(f, []), dtype=np.float64) for f in fields}
+    return {
+        f: np.fromiter((row.get(f, np.nan) for row in price_data), dtype=np.float64, count=len(price_data))
+        for f in fields
+    }
+
+
+def compute_indicators(bars: Dict[str, np.ndarray], indicators: Iterable[str] = DEFAULT_INDICATORS) -> Dict[str, np.ndarray]:
+    """Full aligned series for every requested indicator, keyed by output name."""
+    series = {}
+    for spec in indicators:
+        name, window = parse_indicator(spec)
+        series.update(INDICATORS[name][0](bars, window))
+    return series
+
+
+def latest_values(series: Dict[str, np.ndarray], digits: int = 4) -> Dict[str, Optional[float]]:
+    """Last value of each series, rounded; None where it is NaN."""
+    latest = {}
+    for name, values in series.items():
+        value = float(values[-1]) if len(values) else np.nan
+        latest[name] = None if np.isnan(value) else round(value, digits)
+    return latest
+
+
+def series_to_lists(series: Dict[str, np.ndarray], digits: int = 4) -> Dict[str, list]:
+    """JSON-ready lists with NaN as None."""
+    out = {}
+    for name, values in series.items():
+        rounded = np.round(values, digits)
+        out[name] = np.where(np.isnan(rounded), None, rounded).tolist()
+    return out
+
+
+####################################
+# Summary signals
+####################################
+
+def pivot_levels(high: np.ndarray, low: np.ndarray, close: np.ndarray, lookback: int = 10) -> Dict[str, float]:
+    """Classic pivot point with two support/resistance levels from the last `lookback` bars."""
+    recent_high = float(np.max(high[-lookback:]))
+    recent_low = float(np.min(low[-lookback:]))
+    pivot = (recent_high + recent_low + float(close[-1])) / 3
+    return {
+        "pivot_point": round(pivot, 2),
+        "resistance_1": round(2 * pivot - recent_low, 2),
+        "support_1": round(2 * pivot - recent_high, 2),
+        "resistance_2": round(pivot + (recent_high - recent_low), 2),
+        "support_2": round(pivot - (recent_high - recent_low), 2),
+        "recent_high": recent_high,
+        "recent_low": recent_low,
+    }
+
+
+def trend_label(close: np.ndarray) -> str:
+    """Compare the latest 5-bar average with the 5 bars before it."""
+    if len(close) < 10:
+        return "NEUTRAL"
+    averages = sma(close, 5)
+    recent, older = averages[-1], averages[-6]
+    strength = abs(recent - older) / older * 100 if older else 0
+    if recent > older:
+        return "STRONG_UPTREND" if strength > 2 else "WEAK_UPTREND"
+    if recent < older:
+        return "STRONG_DOWNTREND" if strength > 2 else "WEAK_DOWNTREND"
+    return "NEUTRAL"
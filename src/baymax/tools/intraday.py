@@ -0,0 +1,289 @@
+"""
+Intraday minute bars kept in fixed-size ring buffers.
+
+Each ticker gets one preallocated set of NumPy arrays (timestamp, OHLC,
+volume, turnover and price x volume) used as a ring: new minutes overwrite
+the oldest ones, so memory stays constant however long the process runs and
+ingesting a refresh never allocates per bar.
+
+Refreshes are incremental. Only minutes at or after the newest buffered one
+are written, and the newest minute is overwritten in place because it keeps
+changing until it closes. Queries such as VWAP or the high/low/volume of the
+last N minutes reduce over at most two contiguous slices of the ring (before
+and after the wrap point) and do not copy the bars.
+"""
+
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from baymax.tools.api import hk_code, us_code
+from baymax.tools.trading_calendar import MARKET_TIMEZONES
+from baymax.tools.upstream import call_akshare
+
+####################################
+# Configuration
+####################################
+
+# Minutes kept per ticker (~5 A-share sessions of 240 minutes)
+INTRADAY_CAPACITY = int(os.getenv("BAYMAX_INTRADAY_CAPACITY", "1200"))
+
+# Minimum seconds between two upstream refreshes of the same ticker
+INTRADAY_REFRESH_SECONDS = float(os.getenv("BAYMAX_INTRADAY_REFRESH", "15"))
+
+# akshare minute endpoint for each market
+INTRADAY_FUNCTIONS = {
+    "CN": "stock_zh_a_hist_min_em",
+    "HK": "stock_hk_hist_min_em",
+    "US": "stock_us_hist_min_em",
+}
+
+# Minute table column behind each buffered field
+MINUTE_COLUMNS = {
+    "open": "开盘",
+    "high": "最高",
+    "low": "最低",
+    "close": "收盘",
+    "volume": "成交量",
+    "turnover": "成交额",
+}
+
+TIME_COLUMN = "时间"
+
+
+####################################
+# Ring buffer
+####################################
+
+class MinuteRingBuffer:
+    """Fixed-capacity ring of minute bars stored as parallel float64/int64 arrays."""
+
+    FIELDS = ("open", "high", "low", "close", "volume", "turnover")
+
+    def __init__(self, capacity: int = INTRADAY_CAPACITY):
+        self.capacity = capacity
+        self.ts = np.zeros(capacity, dtype=np.int64)  # epoch seconds of the minute
+        self.columns = {field: np.zeros(capacity, dtype=np.float64) for field in self.FIELDS}
+        self.pv = np.zeros(capacity, dtype=np.float64)  # typical price x volume, for VWAP
+        self.head = 0  # slot the next new minute goes into
+        self.count = 0
+
+    def __len__(self) -> int:
+        return self.count
+
+    @property
+    def last_ts(self) -> Optional[int]:
+        return int(self.ts[(self.head - 1) % self.capacity]) if self.count else None
+
+    def append(self, ts: np.ndarray, columns: Dict[str, np.ndarray]) -> int:
+        """
+        Write time-sorted minutes; returns how many new minutes were added.
+
+        Minutes older than the newest buffered one are skipped and a repeat of
+        the newest minute overwrites it.
+        """
+        last = self.last_ts
+        start = 0
+        if last is not None:
+            start = int(np.searchsorted(ts, last, side="left"))
+            if start < len(ts) and ts[start] == last:
+                self._write_slot((self.head - 1) % self.capacity, ts, columns, start)
+                start += 1
+        new = len(ts) - start
+        if new <= 0:
+            return 0
+
+        # Only the newest `capacity` minutes can survive the write
+        if new > self.capacity:
+            start += new - self.capacity
+            new = self.capacity
+        first = self.head
+        end = first + new
+        if end <= self.capacity:
+            self._write_range(first, end, ts, columns, start)
+        else:
+            split = self.capacity - first
+            self._write_range(first, self.capacity, ts, columns, start)
+            self._write_range(0, end - self.capacity, ts, columns, start + split)
+        self.head = end % self.capacity
+        self.count = min(self.capacity, self.count + new)
+        return new
+
+    def _write_range(self, begin: int, end: int, ts: np.ndarray, columns: Dict[str, np.ndarray], offset: int):
+        length = end - begin
+        self.ts[begin:end] = ts[offset:offset + length]
+        for field in self.FIELDS:
+            self.columns[field][begin:end] = columns[field][offset:offset + length]
+        c = self.columns
+        np.multiply(
+            (c["high"][begin:end] + c["low"][begin:end] + c["close"][begin:end]) / 3,
+            c["volume"][begin:end],
+            out=self.pv[begin:end],
+        )
+
+    def _write_slot(self, slot: int, ts: np.ndarray, columns: Dict[str, np.ndarray], index: int):
+        self._write_range(slot, slot + 1, ts, columns, index)
+
+    def _segments(self, minutes: Optional[int] = None) -> Tuple[slice, ...]:
+        """Chronological slices covering the bars of the last `minutes` minutes (all if None)."""
+        if not self.count:
+            return ()
+        n = self.count
+        if minutes is not None:
+            cutoff = self.last_ts - (minutes - 1) * 60
+            n = self._count_since(cutoff)
+            if n == 0:
+                return ()
+        begin = (self.head - n) % self.capacity
+        if begin + n <= self.capacity:
+            return (slice(begin, begin + n),)
+        return (slice(begin, self.capacity), slice(0, (begin + n) - self.capacity))
+
+    def _count_since(self, cutoff: int) -> int:
+        """Bars with a timestamp >= cutoff, found by binary search in the two sorted halves."""
+        oldest = (self.head - self.count) % self.capacity
+        if oldest + self.count <= self.capacity:
+            halves = (self.ts[oldest:oldest + self.count],)
+        else:
+            halves = (self.ts[oldest:], self.ts[:self.head])
+        total = 0
+        for half in halves:
+            total += len(half) - int(np.searchsorted(half, cutoff, side="left"))
+        return total
+
+    def _sum(self, values: np.ndarray, segments) -> float:
+        return float(sum(values[s].sum() for s in segments))
+
+    def vwap(self, minutes: Optional[int] = None) -> Optional[float]:
+        """Volume-weighted average (typical) price over the last `minutes` minutes."""
+        segments = self._segments(minutes)
+        volume = self._sum(self.columns["volume"], segments)
+        return self._sum(self.pv, segments) / volume if volume else None
+
+    def stats(self, minutes: Optional[int] = None) -> dict:
+        """Open/high/low/close, volume, turnover and VWAP over the last `minutes` minutes."""
+        segments = self._segments(minutes)
+        if not segments:
+            return {"bars": 0}
+        c = self.columns
+        first, last = segments[0], segments[-1]
+        volume = self._sum(c["volume"], segments)
+        open_price = float(c["open"][first.start])
+        close_price = float(c["close"][last.stop - 1])
+        return {
+            "bars": sum(s.stop - s.start for s in segments),
+            "start_ts": int(self.ts[first.start]),
+            "end_ts": int(self.ts[last.stop - 1]),
+            "open": open_price,
+            "high": float(max(c["high"][s].max() for s in segments)),
+            "low": float(min(c["low"][s].min() for s in segments)),
+            "close": close_price,
+            "change_percent": (close_price / open_price - 1) * 100 if open_price else None,
+            "volume": volume,
+            "turnover": self._sum(c["turnover"], segments),
+            "vwap": self._sum(self.pv, segments) / volume if volume else None,
+        }
+
+    def bars(self, minutes: Optional[int] = None) -> Dict[str, np.ndarray]:
+        """Copy of the last `minutes` minutes in chronological order."""
+        segments = self._segments(minutes)
+        if not segments:
+            return {"ts": self.ts[:0].copy(), **{f: v[:0].copy() for f, v in self.columns.items()}}
+        out = {"ts": np.concatenate([self.ts[s] for s in segments])}
+        for field, values in self.columns.items():
+            out[field] = np.concatenate([values[s] for s in segments])
+        return out
+
+
+####################################
+# Store
+####################################
+
+class IntradayStore:
+    """One minute-bar ring buffer per ticker, refreshed incrementally from akshare."""
+
+    def __init__(self, capacity: int = INTRADAY_CAPACITY, refresh_seconds: float = INTRADAY_REFRESH_SECONDS):
+        self.capacity = capacity
+        self.refresh_seconds = refresh_seconds
+        self._buffers: Dict[Tuple[str, str], MinuteRingBuffer] = {}
+        self._refreshed_at: Dict[Tuple[str, str], float] = {}
+        self._locks: Dict[Tuple[str, str], threading.Lock] = {}
+        self._guard = threading.Lock()
+
+    def get(self, market: str, ticker: str, refresh: bool = True) -> MinuteRingBuffer:
+        """The ticker's buffer, refreshed first if the last refresh is older than the interval."""
+        key = (market, ticker)
+        with self._guard:
+            lock = self._locks.setdefault(key, threading.Lock())
+        with lock:
+            buffer = self._buffers.get(key)
+            if buffer is None:
+                buffer = self._buffers[key] = MinuteRingBuffer(self.capacity)
+            if refresh and time.time() - self._refreshed_at.get(key, 0) >= self.refresh_seconds:
+                self._refresh(market, ticker, buffer)
+                self._refreshed_at[key] = time.time()
+        return buffer
+
+    def _refresh(self, market: str, ticker: str, buffer: MinuteRingBuffer) -> int:
+        timezone = MARKET_TIMEZONES.get(market, MARKET_TIMEZONES["CN"])
+        since = buffer.last_ts
+        # Ask only for minutes from the newest buffered one on, which is re-read as it may have changed
+        start = (datetime.fromtimestamp(since, timezone).strftime('%Y-%m-%d %H:%M:%S')
+                 if since is not None else "1979-09-01 09:32:00")
+
+        kwargs = {"symbol": minute_symbol(ticker, market), "start_date": start}
+        if market != "US":
+            kwargs["period"] = "1"
+        frame = call_akshare(INTRADAY_FUNCTIONS.get(market, INTRADAY_FUNCTIONS["CN"]), **kwargs)
+        if frame is None or frame.empty or TIME_COLUMN not in frame.columns:
+            return 0
+
+        times = pd.to_datetime(frame[TIME_COLUMN], errors="coerce")
+        valid = times.notna().to_numpy()
+        utc = times[valid].dt.tz_localize(timezone).dt.tz_convert("UTC").dt.tz_localize(None)
+        ts = utc.to_numpy(dtype="datetime64[s]").astype(np.int64)
+        columns = {}
+        for field, column in MINUTE_COLUMNS.items():
+            values = frame[column] if column in frame.columns else pd.Series(np.nan, index=frame.index)
+            columns[field] = pd.to_numeric(values, errors="coerce").to_numpy(dtype=np.float64)[valid]
+        order = np.argsort(ts, kind="stable")
+        return buffer.append(ts[order], {field: values[order] for field, values in columns.items()})
+
+    def invalidate(self, market: Optional[str] = None, ticker: Optional[str] = None):
+        """Drop buffered minutes for one ticker, or for everything."""
+        with self._guard:
+            for key in list(self._buffers):
+                if (market is None or key[0] == market) and (ticker is None or key[1] == ticker):
+                    self._buffers.pop(key, None)
+                    self._refreshed_at.pop(key, None)
+
+
+def minute_symbol(ticker: str, market: str) -> str:
+    """Symbol as the market's minute endpoint expects it."""
+    if market == 'HK':
+        return hk_code(ticker)
+    if market == 'US':
+        return us_code(ticker)
+    return ticker
+
+
+intraday_store = IntradayStore()
+
+
+def session_minutes(buffer: MinuteRingBuffer, market: str) -> Optional[int]:
+    """Window in minutes from local midnight of the latest bar's day, i.e. the latest session so far."""
+    last = buffer.last_ts
+    if last is None:
+        return None
+    local = datetime.fromtimestamp(last, MARKET_TIMEZONES.get(market, MARKET_TIMEZONES["CN"]))
+    return local.hour * 60 + local.minute + 1
+
+
+def format_minute(ts: int, market: str) -> str:
+    """Exchange-local 'YYYY-MM-DD HH:MM' for an epoch-second timestamp."""
+    return datetime.fromtimestamp(ts, MARKET_TIMEZONES.get(market, MARKET_TIMEZONES["CN"])).strftime('%Y-%m-%d %H:%M')
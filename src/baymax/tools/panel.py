@@ -0,0 +1,455 @@
+"""
+Memory-mapped multi-ticker price panels.
+
+The analysis tools work one ticker at a time on Python lists, which does not
+scale to universe-wide questions (returns, correlations or rankings across
+the whole A-share market). A PricePanel holds one dates x tickers float64
+array per field (close, volume, ...) on a shared trading-session axis.
+
+Panels are built from the local history store one ticker at a time straight
+into .npy files and are opened with mmap_mode='r', so only the pages a
+computation touches are read into memory and several processes can share one
+panel. Each build goes into its own version directory and a CURRENT pointer
+is swapped to it, so concurrent builds never share files and readers never
+see a missing panel; old versions and the least recently built panels are
+pruned. Building a panel again with the same definition reuses the current
+version unless a bar store or factor table behind it has changed. Missing bars (suspensions, tickers listed later) are NaN and the
+computations below are NaN-aware.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from baymax.tools.adjustments import adjust_columns, factor_store
+from baymax.tools.api import hk_ticker
+from baymax.tools.constants import CACHE_DIR
+from baymax.tools.history import BarStore, HISTORY_COLUMNS, history_store, upstream_symbol
+from baymax.tools.indicators import DEFAULT_INDICATORS, compute_indicators
+from baymax.tools.snapshot import spot_cache
+from baymax.tools.trading_calendar import get_calendar
+
+####################################
+# Configuration
+####################################
+
+# Directory holding one subdirectory per built panel
+PANEL_CACHE_DIR = os.path.join(CACHE_DIR, "panel")
+
+# Fields stored when a build does not name any
+DEFAULT_PANEL_FIELDS = ("open", "high", "low", "close", "volume", "turnover")
+
+# Panels kept on disk; the least recently built ones beyond this are removed
+PANEL_MAX_KEPT = int(os.getenv("BAYMAX_PANEL_MAX_KEPT", "32"))
+
+# Builds kept per panel; older ones are removed once a newer build is current
+PANEL_VERSIONS_KEPT = 2
+
+# Seconds after which an unfinished build directory is treated as abandoned
+PANEL_BUILD_MAX_AGE = 3600
+
+
+####################################
+# Panel
+####################################
+
+class PricePanel:
+    """
+    A dates x tickers panel of bar fields.
+
+    `fields[name]` is a 2-D float64 array (usually a read-only memmap) whose
+    rows follow `dates` and whose columns follow `tickers`. Prices are
+    `adjust`-adjusted ('qfq'/'hfq'), except for the `unadjusted` tickers whose
+    factors could not be fetched.
+    """
+
+    def __init__(self, market: str, dates: np.ndarray, tickers: np.ndarray, fields: Dict[str, np.ndarray],
+                 path: Optional[str] = None, adjust: str = "", unadjusted: Sequence[str] = ()):
+        self.market = market
+        self.adjust = adjust
+        self.unadjusted = list(unadjusted)
+        self.dates = dates
+        self.tickers = tickers
+        self.fields = fields
+        self.path = path
+        self.column = {ticker: position for position, ticker in enumerate(tickers.tolist())}
+
+    @property
+    def shape(self) -> tuple:
+        return (len(self.dates), len(self.tickers))
+
+    def __getitem__(self, field: str) -> np.ndarray:
+        return self.fields[field]
+
+    def select(self, tickers: Optional[Sequence[str]] = None, start: Optional[date] = None,
+               end: Optional[date] = None) -> "PricePanel":
+        """Sub-panel for some tickers and/or a date range (row slices stay memory-mapped)."""
+        rows = slice(
+            np.searchsorted(self.dates, np.datetime64(start, "D")) if start else 0,
+            np.searchsorted(self.dates, np.datetime64(end, "D"), side="right") if end else len(self.dates),
+        )
+        if tickers is None:
+            columns = slice(None)
+            kept = self.tickers
+        else:
+            columns = np.array([self.column[t] for t in tickers if t in self.column], dtype=np.intp)
+            kept = self.tickers[columns]
+        fields = {name: values[rows][:, columns] for name, values in self.fields.items()}
+        unadjusted = [t for t in self.unadjusted if t in set(kept.tolist())]
+        return PricePanel(self.market, self.dates[rows], kept, fields, adjust=self.adjust, unadjusted=unadjusted)
+
+    def returns(self, periods: int = 1, field: str = "close", log: bool = False) -> np.ndarray:
+        """Period-over-period returns; the first `periods` rows are NaN."""
+        values = np.asarray(self.fields[field], dtype=np.float64)
+        result = np.full(values.shape, np.nan)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            if log:
+                result[periods:] = np.log(values[periods:] / values[:-periods])
+            else:
+                result[periods:] = values[periods:] / values[:-periods] - 1
+        return result
+
+    def correlation(self, window: Optional[int] = None, field: str = "close") -> np.ndarray:
+        """Ticker x ticker correlation of daily returns over the last `window` rows."""
+        returns = self.returns(field=field)[1:]
+        if window:
+            returns = returns[-window:]
+        return nan_correlation(returns)
+
+    def rank(self, values: Optional[np.ndarray] = None, field: str = "close", pct: bool = True) -> np.ndarray:
+        """Cross-sectional rank of each ticker on each date (NaN stays NaN)."""
+        return cross_sectional_rank(self.fields[field] if values is None else values, pct=pct)
+
+    def indicators(self, indicators: Iterable[str] = DEFAULT_INDICATORS) -> Dict[str, dict]:
+        """Indicators over the whole panel, with each ticker's latest value ranked across tickers."""
+        bars = {field: np.asarray(values, dtype=np.float64) for field, values in self.fields.items()}
+        return batch_indicators(bars, self.tickers.tolist(), indicators)
+
+    def latest(self, field: str = "close") -> Dict[str, Optional[float]]:
+        """Last non-NaN value of a field per ticker."""
+        values = np.asarray(self.fields[field])
+        valid = ~np.isnan(values)
+        last_row = len(values) - 1 - np.argmax(valid[::-1], axis=0)
+        picked = values[last_row, np.arange(values.shape[1])]
+        return {
+            ticker: (float(v) if has else None)
+            for ticker, v, has in zip(self.tickers.tolist(), picked.tolist(), valid.any(axis=0).tolist())
+        }
+
+
+####################################
+# NumPy helpers
+####################################
+
+def cross_sectional_rank(values: np.ndarray, pct: bool = True) -> np.ndarray:
+    """
+    Rank each row across columns, averaging ties; NaN entries stay NaN.
+
+    With pct=True ranks are scaled to (0, 1] by the number of valid values in
+    the row, like pandas' rank(pct=True).
+    """
+    values = np.asarray(values, dtype=np.float64)
+    single = values.ndim == 1
+    if single:
+        values = values[np.newaxis, :]
+
+    valid = ~np.isnan(values)
+    order = np.argsort(np.where(valid, values, np.inf), axis=1, kind="stable")
+    sorted_values = np.take_along_axis(values, order, axis=1)
+
+    ranks = np.empty(values.shape)
+    positions = np.arange(1, values.shape[1] + 1, dtype=np.float64)
+    for row in range(values.shape[0]):
+        row_sorted = sorted_values[row]
+        # Average the ordinal positions over each run of equal values
+        boundaries = np.flatnonzero(np.r_[True, row_sorted[1:] != row_sorted[:-1], True])
+        sums = np.add.reduceat(positions, boundaries[:-1])
+        counts = np.diff(boundaries)
+        ranks[row, order[row]] = np.repeat(sums / counts, counts)
+
+    ranks[~valid] = np.nan
+    if pct:
+        with np.errstate(invalid="ignore", divide="ignore"):
+            ranks = ranks / valid.sum(axis=1, keepdims=True)
+    return ranks[0] if single else ranks
+
+
+def nan_correlation(values: np.ndarray, min_periods: int = 2) -> np.ndarray:
+    """
+    Pairwise correlation of the columns of a 2-D array, ignoring NaN.
+
+    Each column is centred on its own valid mean; every pair then uses the
+    rows where both are valid, computed with matrix products rather than a
+    Python loop over pairs.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    valid = (~np.isnan(values)).astype(np.float64)
+    centred = np.where(valid > 0, values - np.nanmean(np.where(valid > 0, values, np.nan), axis=0), 0.0)
+
+    counts = valid.T @ valid
+    cross = centred.T @ centred
+    squares = (centred ** 2).T @ valid
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        correlation = cross / np.sqrt(squares * squares.T)
+    correlation[counts < min_periods] = np.nan
+    return correlation
+
+
+def batch_indicators(bars: Dict[str, np.ndarray], tickers: Sequence[str],
+                     indicators: Iterable[str] = DEFAULT_INDICATORS) -> Dict[str, dict]:
+    """
+    Indicators for many tickers at once from dates x tickers matrices.
+
+    Args:
+        bars: 2-D close (and high/low/volume as the indicators need) arrays, one column per ticker
+        tickers: Column labels
+        indicators: Indicator specs as for compute_indicators()
+
+    Returns:
+        For each output name: the latest value per ticker (None where the last
+        row is NaN), its rank (1 = highest) and its percentile (100 = highest)
+        among the tickers with a value
+    """
+    series = compute_indicators(bars, indicators)
+    tickers = list(tickers)
+    results = {}
+    for name, values in series.items():
+        latest = values[-1] if len(values) else np.full(len(tickers), np.nan)
+        valid = ~np.isnan(latest)
+        percentiles = cross_sectional_rank(latest, pct=True) * 100
+        ranks = valid.sum() - cross_sectional_rank(latest, pct=False) + 1
+        results[name] = {
+            "latest": dict(zip(tickers, np.where(valid, np.round(latest, 4), None).tolist())),
+            "rank": dict(zip(tickers, np.where(valid, ranks, None).tolist())),
+            "percentile": dict(zip(tickers, np.where(valid, np.round(percentiles, 2), None).tolist())),
+        }
+    return results
+
+
+####################################
+# Build and open
+####################################
+
+def panel_name(market: str, tickers: Sequence[str], start: date, end: date, period: str = "daily",
+               adjust: str = "") -> str:
+    """Deterministic directory name for a panel definition."""
+    digest = hashlib.sha1(",".join(tickers).encode("utf-8")).hexdigest()[:12]
+    period = f"{period}-{adjust}" if adjust else period
+    return f"{market}-{period}-{start:%Y%m%d}-{end:%Y%m%d}-{len(tickers)}-{digest}"
+
+
+def build_panel(market: str, tickers: Iterable[str], start: date, end: date,
+                fields: Sequence[str] = DEFAULT_PANEL_FIELDS, fetch_missing: bool = False,
+                name: Optional[str] = None, root: str = PANEL_CACHE_DIR, adjust: str = "") -> PricePanel:
+    """
+    Build a panel from the local history store and write it as memory-mappable .npy files.
+
+    Args:
+        market: 'CN', 'HK' or 'US'
+        tickers: Tickers to include, in column order
+        start, end: Date range; rows are the exchange's trading sessions in it
+        fields: Bar fields to store, e.g. ('close', 'volume')
+        fetch_missing: Fill gaps in the local store from upstream first (network)
+        name: Panel directory name; derived from the definition if omitted
+        adjust: 'qfq'/'hfq' to adjust A-share prices with the locally cached
+            factors, as the single-ticker tools do; other markets stay raw
+
+    Returns:
+        The panel, opened read-only from disk
+    """
+    tickers = list(dict.fromkeys(tickers))
+    fields = [f for f in fields if f in HISTORY_COLUMNS]
+    dates = np.array(get_calendar(market).sessions(start, end), dtype="datetime64[D]")
+    adjust = adjust if market == "CN" else ""
+    name = name or panel_name(market, tickers, start, end, adjust=adjust)
+    unadjusted = []
+
+    if fetch_missing:
+        for ticker in tickers:
+            history_store.get_bars(market, ticker, "daily", start, end)
+
+    panel_dir = os.path.join(root, name)
+    if _is_current(panel_dir, market, tickers, start, end, fields, adjust):
+        return open_panel(name, root)
+    os.makedirs(panel_dir, exist_ok=True)
+    # A private directory per build, named so versions sort by build time
+    tmp_dir = tempfile.mkdtemp(prefix=f".{time.time_ns()}-", dir=panel_dir)
+
+    arrays = {
+        field: np.lib.format.open_memmap(
+            os.path.join(tmp_dir, f"{field}.npy"), mode="w+", dtype=np.float64, shape=(len(dates), len(tickers))
+        )
+        for field in fields
+    }
+    for array in arrays.values():
+        array[:] = np.nan
+
+    # One ticker at a time keeps memory bounded by a single history, not the universe
+    for column, ticker in enumerate(tickers):
+        symbol = upstream_symbol(ticker, market)
+        bars = BarStore(history_store.root, market, symbol, "daily").read_columns()
+        if len(bars["date"]) == 0:
+            continue
+        if adjust:
+            try:
+                bars = adjust_columns(bars, factor_store.get(symbol), adjust)
+            except Exception as e:
+                print(f"⚠ No adjustment factors for {ticker}, using unadjusted bars in the panel: {e}")
+                unadjusted.append(ticker)
+        rows = np.searchsorted(dates, bars["date"])
+        on_axis = (rows < len(dates)) & (dates[np.minimum(rows, len(dates) - 1)] == bars["date"])
+        for field, array in arrays.items():
+            if field in bars:
+                array[rows[on_axis], column] = bars[field][on_axis]
+
+    for array in arrays.values():
+        array.flush()
+    del arrays
+    np.save(os.path.join(tmp_dir, "dates.npy"), dates)
+    np.save(os.path.join(tmp_dir, "tickers.npy"), np.array(tickers, dtype=str))
+    with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({"market": market, "fields": fields, "built_at": time.time(),
+                   "start": start.isoformat(), "end": end.isoformat(),
+                   "adjust": adjust, "unadjusted": unadjusted}, f)
+
+    version = os.path.basename(tmp_dir)[1:]
+    os.replace(tmp_dir, os.path.join(panel_dir, version))
+    fd, pointer_tmp = tempfile.mkstemp(prefix=".CURRENT-", dir=panel_dir)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(pointer_tmp, os.path.join(panel_dir, "CURRENT"))
+
+    _prune_versions(panel_dir)
+    prune_panels(root, keep=name)
+    return open_panel(name, root)
+
+
+def _is_current(panel_dir: str, market: str, tickers: List[str], start: date, end: date,
+                fields: List[str], adjust: str) -> bool:
+    """
+    Whether the current version has the same definition and no bar store or
+    factor table it was built from has changed since, so it can be reused.
+    """
+    version = _current_version(panel_dir)
+    if version is None:
+        return False
+    version_dir = os.path.join(panel_dir, version)
+    try:
+        with open(os.path.join(version_dir, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        built_tickers = np.load(os.path.join(version_dir, "tickers.npy")).tolist()
+    except (OSError, ValueError):
+        return False
+    if (built_tickers != tickers or meta.get("fields") != fields or meta.get("adjust", "") != adjust
+            or meta.get("start") != start.isoformat() or meta.get("end") != end.isoformat()
+            or meta.get("unadjusted")):
+        return False
+
+    built_at = meta.get("built_at", 0)
+    for ticker in tickers:
+        symbol = upstream_symbol(ticker, market)
+        # New segments and coverage updates touch the store directory
+        sources = [BarStore(history_store.root, market, symbol, "daily").path]
+        if adjust:
+            sources.append(factor_store._path(symbol))
+        for path in sources:
+            try:
+                if os.path.getmtime(path) >= built_at:
+                    return False
+            except OSError:
+                continue
+    return True
+
+
+def _current_version(panel_dir: str) -> Optional[str]:
+    try:
+        with open(os.path.join(panel_dir, "CURRENT"), encoding="utf-8") as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def _prune_versions(panel_dir: str):
+    """Remove all but the newest PANEL_VERSIONS_KEPT builds (never the current one) and abandoned build directories."""
+    current = _current_version(panel_dir)
+    versions = []
+    for entry in os.scandir(panel_dir):
+        if not entry.is_dir():
+            continue
+        if entry.name.startswith("."):
+            if time.time() - entry.stat().st_mtime > PANEL_BUILD_MAX_AGE:
+                shutil.rmtree(entry.path, ignore_errors=True)
+        else:
+            versions.append(entry.name)
+    versions.sort(key=lambda name: int(name.split("-", 1)[0]) if name.split("-", 1)[0].isdigit() else 0)
+    for name in versions[:-PANEL_VERSIONS_KEPT]:
+        if name != current:
+            shutil.rmtree(os.path.join(panel_dir, name), ignore_errors=True)
+
+
+def prune_panels(root: str = PANEL_CACHE_DIR, keep: Optional[str] = None, max_kept: int = PANEL_MAX_KEPT):
+    """Remove the least recently built panels beyond `max_kept`, never `keep`."""
+    def built_at(name: str) -> float:
+        panel_dir = os.path.join(root, name)
+        try:
+            return os.path.getmtime(os.path.join(panel_dir, "CURRENT"))
+        except OSError:
+            return os.path.getmtime(panel_dir)
+
+    try:
+        names = sorted(list_panels(root), key=built_at)
+    except OSError:
+        return  # Removed by a concurrent prune
+    for name in names[:max(len(names) - max_kept, 0)]:
+        if name != keep:
+            shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+
+
+def open_panel(name: str, root: str = PANEL_CACHE_DIR) -> Optional[PricePanel]:
+    """Memory-map a built panel, or return None if it does not exist."""
+    version = _current_version(os.path.join(root, name))
+    if version is None:
+        return None
+    panel_dir = os.path.join(root, name, version)
+    try:
+        with open(os.path.join(panel_dir, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        fields = {
+            field: np.load(os.path.join(panel_dir, f"{field}.npy"), mmap_mode="r")
+            for field in meta["fields"]
+        }
+        dates = np.load(os.path.join(panel_dir, "dates.npy"))
+        tickers = np.load(os.path.join(panel_dir, "tickers.npy"))
+        return PricePanel(meta["market"], dates, tickers, fields, panel_dir,
+                          adjust=meta.get("adjust", ""), unadjusted=meta.get("unadjusted", []))
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def universe_tickers(market: str = "CN") -> List[str]:
+    """
+    Every ticker listed in the market's current spot table, e.g. the whole
+    A-share market, whether or not its history is stored locally.
+    """
+    codes = spot_cache.get_snapshot(market).codes.tolist()
+    if market == "US":
+        return [code.split(".", 1)[-1] for code in codes]
+    if market == "HK":
+        return [hk_ticker(code) for code in codes]
+    return codes
+
+
+def list_panels(root: str = PANEL_CACHE_DIR) -> List[str]:
+    """Names of the panels built so far."""
+    try:
+        return sorted(name for name in os.listdir(root) if not name.startswith("."))
+    except OSError:
+        return []
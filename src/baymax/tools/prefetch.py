@@ -0,0 +1,272 @@
+"""
+Bulk history prefetch for watchlists.
+
+Warms the local history store for hundreds of tickers ahead of market open:
+history fetches fan out over a bounded worker pool, all inside one per-host
+rate limit so eastmoney is not hammered, and each ticker only downloads the
+ranges the store is missing.
+
+Progress is kept in a job file under the cache directory and saved after
+every ticker, so an interrupted job picks up where it stopped when run again
+with the same job id. Tickers that fail are retried in later rounds, which
+back off and wait for an open circuit breaker to admit calls again.
+
+Usage:
+    baymax-prefetch 600519 000001 AAPL 1211.HK --days 250
+    baymax-prefetch --file watchlist.txt --job morning --workers 8 --rate 5
+"""
+
+import argparse
+import contextvars
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Iterable, List, Optional
+
+from baymax.tools.api import normalize_ticker, get_market_type
+from baymax.tools.constants import CACHE_DIR
+from baymax.tools.history import history_store, HISTORY_FUNCTIONS
+from baymax.tools.trading_calendar import get_calendar
+from baymax.tools.upstream import rate_limit, health_registry
+
+####################################
+# Configuration
+####################################
+
+# Concurrent history downloads
+PREFETCH_WORKERS = int(os.getenv("BAYMAX_PREFETCH_WORKERS", "8"))
+
+# Upstream requests per second per host during a prefetch
+PREFETCH_RATE_LIMIT = float(os.getenv("BAYMAX_PREFETCH_RATE_LIMIT", "5"))
+
+# Rounds a failing ticker is attempted before the job gives up on it
+PREFETCH_MAX_ATTEMPTS = int(os.getenv("BAYMAX_PREFETCH_MAX_ATTEMPTS", "3"))
+
+# Seconds before the first retry round; doubles every round
+PREFETCH_ROUND_DELAY = float(os.getenv("BAYMAX_PREFETCH_ROUND_DELAY", "5"))
+
+# Directory holding one state file per prefetch job
+PREFETCH_JOB_DIR = os.path.join(CACHE_DIR, "prefetch")
+
+PENDING = "pending"
+DONE = "done"
+FAILED = "failed"
+
+
+####################################
+# Job state
+####################################
+
+class PrefetchJob:
+    """Resumable state of one prefetch run, saved as JSON after every ticker."""
+
+    def __init__(self, job_id: str, tickers: List[str], days_back: int, path: str):
+        self.job_id = job_id
+        self.days_back = days_back
+        self.path = path
+        self.tickers = {ticker: {"status": PENDING, "attempts": 0, "error": None} for ticker in tickers}
+        self.created_at = time.time()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load_or_create(cls, job_id: str, tickers: List[str], days_back: int,
+                       job_dir: str = PREFETCH_JOB_DIR) -> "PrefetchJob":
+        """Resume the job's saved state; done tickers are skipped and failed ones get fresh attempts."""
+        path = os.path.join(job_dir, f"{job_id}.json")
+        job = cls(job_id, tickers, days_back, path)
+        try:
+            with open(path, encoding="utf-8") as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return job
+
+        if saved.get("days_back") == days_back:
+            job.created_at = saved.get("created_at", job.created_at)
+            for ticker, state in saved.get("tickers", {}).items():
+                if ticker in job.tickers and state.get("status") == DONE:
+                    job.tickers[ticker] = state
+        return job
+
+    def todo(self, max_attempts: int) -> List[str]:
+        """Tickers not done yet that still have attempts left."""
+        return [
+            ticker for ticker, state in self.tickers.items()
+            if state["status"] != DONE and state["attempts"] < max_attempts
+        ]
+
+    def record(self, ticker: str, error: Optional[str] = None):
+        with self._lock:
+            state = self.tickers[ticker]
+            state["attempts"] += 1
+            state["status"] = FAILED if error else DONE
+            state["error"] = error
+            self.save()
+
+    def counts(self) -> dict:
+        statuses = [state["status"] for state in self.tickers.values()]
+        return {
+            "total": len(statuses),
+            "done": statuses.count(DONE),
+            "failed": statuses.count(FAILED),
+            "pending": statuses.count(PENDING),
+        }
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({
+                "job_id": self.job_id,
+                "days_back": self.days_back,
+                "created_at": self.created_at,
+                "updated_at": time.time(),
+                "tickers": self.tickers,
+            }, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, self.path)
+
+
+####################################
+# Prefetch
+####################################
+
+def prefetch_ticker(ticker: str, days_back: int) -> int:
+    """
+    Bring one ticker's daily history for the last `days_back` sessions into the local store.
+
+    Raises when no bars come back or part of the window is still uncovered,
+    so the job records the ticker as failed and retries it.
+    """
+    market_type = get_market_type(ticker)
+    calendar = get_calendar(market_type)
+    end_date = calendar.today()
+    start_date = calendar.window_start(days_back)
+    bars = history_store.get_bars(market_type, ticker, "daily", start_date, end_date)
+    if bars is None or bars.empty:
+        # Throttled or empty responses must leave the ticker failed so a resume retries it
+        raise ValueError(f"no daily bars returned for {ticker}")
+    if history_store.enabled:
+        gaps = history_store.pending_gaps(market_type, ticker, "daily", start_date, end_date)
+        if gaps:
+            raise ValueError(f"{len(gaps)} range(s) still uncovered for {ticker}, first {gaps[0][0]} to {gaps[0][1]}")
+    return len(bars)
+
+
+def prefetch_history(tickers: Iterable[str], days_back: int = 250, job_id: Optional[str] = None,
+                     workers: int = PREFETCH_WORKERS, rate_per_second: float = PREFETCH_RATE_LIMIT,
+                     max_attempts: int = PREFETCH_MAX_ATTEMPTS,
+                     on_progress: Optional[Callable[[dict, str, Optional[str]], None]] = None) -> dict:
+    """
+    Warm the local history store for many tickers.
+
+    Args:
+        tickers: Tickers in any format normalize_ticker() accepts
+        days_back: Trading sessions of daily history to hold per ticker
+        job_id: Name of a resumable job; tickers already done in it are skipped
+        workers: Concurrent downloads
+        rate_per_second: Upstream requests per second per host (0 = unlimited)
+        max_attempts: Rounds a failing ticker is attempted
+        on_progress: Called as (counts, ticker, error) after every ticker
+
+    Returns:
+        Final counts plus the tickers that still failed and their errors
+    """
+    tickers = list(dict.fromkeys(normalize_ticker(t) for t in tickers if t and t.strip()))
+    job = PrefetchJob.load_or_create(job_id or time.strftime("prefetch-%Y%m%d-%H%M%S"), tickers, days_back)
+    started = time.monotonic()
+
+    with rate_limit(rate_per_second):
+        with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="prefetch") as pool:
+            # Failed tickers go back into the next round until they run out of attempts
+            round_number = 0
+            while True:
+                todo = job.todo(max_attempts)
+                if not todo:
+                    break
+                if round_number > 0:
+                    time.sleep(retry_round_delay(round_number))
+                round_number += 1
+                futures = {
+                    pool.submit(contextvars.copy_context().run, prefetch_ticker, ticker, days_back): ticker
+                    for ticker in todo
+                }
+                for future in as_completed(futures):
+                    ticker = futures[future]
+                    try:
+                        future.result()
+                        error = None
+                    except Exception as e:
+                        error = str(e)
+                    job.record(ticker, error)
+                    if on_progress is not None:
+                        on_progress(job.counts(), ticker, error)
+
+    failed = {t: s["error"] for t, s in job.tickers.items() if s["status"] == FAILED}
+    return {
+        "job_id": job.job_id,
+        "state_file": job.path,
+        **job.counts(),
+        "failed_tickers": failed,
+        "elapsed_seconds": round(time.monotonic() - started, 2),
+    }
+
+
+def retry_round_delay(round_number: int) -> float:
+    """Backoff before a retry round, at least until the history endpoints' circuits admit calls."""
+    backoff = PREFETCH_ROUND_DELAY * 2 ** (round_number - 1)
+    circuits = max(health_registry.get(name).retry_after() for name in set(HISTORY_FUNCTIONS.values()))
+    return max(backoff, circuits)
+
+
+####################################
+# Command line
+####################################
+
+def print_progress(counts: dict, ticker: str, error: Optional[str]):
+    """One progress line per finished ticker."""
+    finished = counts["done"] + counts["failed"]
+    mark = "✗" if error else "✓"
+    detail = f" ({error})" if error else ""
+    print(f"[{finished}/{counts['total']}] {mark} {ticker}{detail}", flush=True)
+
+
+def read_watchlist(path: str) -> List[str]:
+    """Tickers from a file, one per line or comma separated; '#' starts a comment."""
+    tickers = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.split("#", 1)[0]
+            tickers.extend(t.strip() for t in line.replace(",", " ").split() if t.strip())
+    return tickers
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Prefetch daily price history for a watchlist into the local cache.")
+    parser.add_argument("tickers", nargs="*", help="Tickers, e.g. 600519 AAPL 1211.HK")
+    parser.add_argument("--file", "-f", help="Watchlist file with one ticker per line")
+    parser.add_argument("--days", type=int, default=250, help="Trading sessions of history per ticker (default: 250)")
+    parser.add_argument("--job", help="Job id; rerun with the same id to resume")
+    parser.add_argument("--workers", type=int, default=PREFETCH_WORKERS, help=f"Concurrent downloads (default: {PREFETCH_WORKERS})")
+    parser.add_argument("--rate", type=float, default=PREFETCH_RATE_LIMIT, help=f"Requests per second per host (default: {PREFETCH_RATE_LIMIT:g})")
+    parser.add_argument("--attempts", type=int, default=PREFETCH_MAX_ATTEMPTS, help=f"Attempts per ticker (default: {PREFETCH_MAX_ATTEMPTS})")
+    args = parser.parse_args(argv)
+
+    tickers = list(args.tickers)
+    if args.file:
+        tickers.extend(read_watchlist(args.file))
+    if not tickers:
+        parser.error("no tickers given")
+
+    result = prefetch_history(tickers, days_back=args.days, job_id=args.job, workers=args.workers,
+                              rate_per_second=args.rate, max_attempts=args.attempts, on_progress=print_progress)
+
+    print(f"\n📦 Prefetch {result['job_id']}: {result['done']}/{result['total']} done, "
+          f"{result['failed']} failed in {result['elapsed_seconds']}s")
+    print(f"   State: {result['state_file']}")
+    return 0 if not result["failed_tickers"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
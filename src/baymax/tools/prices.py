@@ -1,13 +1,21 @@
 from langchain.tools import tool
 from typing import Literal, Optional
 from pydantic import BaseModel, Field
-from datetime import datetime, timedelta
-import akshare as ak
+from datetime import datetime
 import pandas as pd
 import numpy as np
 import requests
 import time
-from baymax.tools.api import normalize_ticker
+import os
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from baymax.tools.api import normalize_ticker, get_market_type, hk_code
+from baymax.tools.snapshot import spot_cache
+from baymax.tools.history import history_store
+from baymax.tools.intraday import intraday_store, session_minutes, format_minute
+from baymax.tools.records import price_records, price_columns, items_to_dict
+from baymax.tools.trading_calendar import get_calendar
+from baymax.tools.upstream import call_akshare, deadline, DeadlineExceeded
 
 # Configure requests timeout and retry settings
 requests.adapters.DEFAULT_RETRIES = 3
@@ -15,12 +23,40 @@ requests.adapters.DEFAULT_POOL_TIMEOUT = 30
 
 class StockPriceInput(BaseModel):
     ticker: str = Field(description="The stock ticker symbol to fetch price data for. For example, 'AAPL' for Apple, '600519' for 贵州茅台")
-    period: Literal["daily", "weekly", "monthly"] = Field(default="daily", description="The time period for price data")
+    period: Literal["daily", "weekly", "monthly", "quarterly"] = Field(default="daily", description="The time period for price data")
     days_back: int = Field(default=30, description="Number of days of historical data to retrieve")
+    adjust: Literal["", "qfq", "hfq"] = Field(default="", description="Price adjustment: '' for raw prices, 'qfq' forward-adjusted, 'hfq' backward-adjusted for dividends and splits")
+    format: Literal["records", "columnar"] = Field(default="records", description="'records' returns one dict per bar; 'columnar' returns one list per field (date, open, high, low, close, volume, turnover), which is much smaller for long histories")
 
 class StockCurrentPriceInput(BaseModel):
     ticker: str = Field(description="The stock ticker symbol to fetch current price for. For example, 'AAPL' for Apple, '600519' for 贵州茅台")
 
+class IntradayInput(BaseModel):
+    ticker: str = Field(description="The stock ticker symbol to fetch minute bars for. For example, 'AAPL' for Apple, '600519' for 贵州茅台")
+    minutes: int = Field(default=30, description="Size of the trailing window in minutes, ending at the latest minute bar")
+    include_bars: bool = Field(default=False, description="Also return the window's minute bars as parallel lists per field")
+
+class StockBatchPriceInput(BaseModel):
+    tickers: list[str] = Field(description="The stock ticker symbols to fetch current prices for. A-shares, Hong Kong and US tickers can be mixed, e.g. ['600519', '1211.HK', 'AAPL']")
+
+# How get_current_stock_price combines its sources: 'sequential', 'hedged' or 'race'
+PRICE_FETCH_MODE = os.getenv("BAYMAX_PRICE_FETCH_MODE", "hedged").lower()
+
+# Seconds a source may run in hedged mode before the next fallback is started as well
+PRICE_HEDGE_DELAY = float(os.getenv("BAYMAX_PRICE_HEDGE_DELAY", "2"))
+
+# Shared workers for concurrent price sources
+_price_pool = ThreadPoolExecutor(max_workers=16, thread_name_prefix="price-source")
+
+# Quote fields reported for each market's spot data
+SPOT_QUOTE_FIELDS = {
+    "CN": ["current_price", "change", "change_percent", "volume", "turnover", "high", "low", "open",
+           "previous_close", "market_cap", "pe_ratio", "pb_ratio"],
+    "HK": ["current_price", "change", "change_percent", "volume", "high", "low", "open", "previous_close"],
+    "US": ["current_price", "change", "change_percent", "volume", "high", "low", "open", "previous_close",
+           "market_cap"],
+}
+
 @tool(args_schema=StockCurrentPriceInput)
 def get_current_stock_price(ticker: str) -> dict:
     """
@@ -36,42 +72,25 @@ def get_current_stock_price(ticker: str) -> dict:
         ticker = normalize_ticker(ticker)
         print(f"Fetching current price for {ticker}...")
 
-        # Try multiple approaches with fallbacks
-        result = None
-
-        # Approach 1: Try real-time data with timeout
-        try:
-            result = get_current_price_with_timeout(ticker, timeout=10)
-            if result and result.get("current_price") and result["current_price"] > 0:
-                print(f"✓ Got real-time price for {ticker}: {result['current_price']}")
-                return result
-        except Exception as e:
-            print(f"⚠ Real-time data failed for {ticker}: {e}")
-
-        # Approach 2: Try historical data fallback
-        try:
-            result = get_price_from_history_improved(ticker, timeout=15)
-            if result and result.get("current_price") and result["current_price"] > 0:
-                print(f"✓ Got historical price for {ticker}: {result['current_price']}")
-                return result
-        except Exception as e:
-            print(f"⚠ Historical data failed for {ticker}: {e}")
+        market_type = get_market_type(ticker)
 
-        # Approach 3: Try alternative data sources
-        try:
-            result = get_price_from_alternative_source(ticker)
-            if result and result.get("current_price") and result["current_price"] > 0:
-                print(f"✓ Got alternative price for {ticker}: {result['current_price']}")
-                return result
-        except Exception as e:
-            print(f"⚠ Alternative data failed for {ticker}: {e}")
+        # Fallback chain: real-time spot, then recent history, then alternative sources
+        sources = [
+            ("real_time", lambda: get_current_price_with_timeout(ticker, timeout=10)),
+            ("historical", lambda: get_price_from_history_improved(ticker, market_type, timeout=15)),
+            ("alternative", lambda: get_price_from_alternative_source(ticker)),
+        ]
+        result, timings = fetch_first_valid_price(ticker, sources)
+        if result is not None:
+            return result
 
         # If all approaches fail, return error with detailed info
         return {
             "error": f"All data sources failed for {ticker}. This may be due to network issues or the stock being delisted/renamed.",
             "ticker": ticker,
             "current_price": None,
-            "attempted_sources": ["real_time", "historical", "alternative"],
+            "attempted_sources": [name for name, _ in sources],
+            "source_timings": timings,
             "suggestion": "Please check the ticker symbol or try again later."
         }
 
@@ -82,25 +101,111 @@ def get_current_stock_price(ticker: str) -> dict:
             "current_price": None
         }
 
+def is_valid_price(result: Optional[dict]) -> bool:
+    """A price result is usable only if it carries a positive current price"""
+    return bool(result and result.get("current_price") and result["current_price"] > 0)
+
+def fetch_first_valid_price(ticker: str, sources: list, mode: str = None, hedge_delay: float = None) -> tuple:
+    """
+    Run the price sources and return (first valid result, per-source timings).
+
+    - sequential: start the next source only after the previous one failed
+    - hedged: also start the next source once the running ones have had
+      hedge_delay seconds without producing a price
+    - race: start every source at once
+
+    The winner's result is annotated with the winning source and the timings.
+    Sources that have not started are cancelled; running ones have their
+    deadline scope cancelled so they stop at their next upstream call.
+    """
+    mode = mode or PRICE_FETCH_MODE
+    hedge_delay = PRICE_HEDGE_DELAY if hedge_delay is None else hedge_delay
+
+    timings = {name: {"status": "not_started"} for name, _ in sources}
+    launched_at = {}
+    scopes = {}
+    futures = {}
+    started_at = time.monotonic()
+
+    def run_source(name, fetch):
+        with deadline(None) as scope:
+            scopes[name] = scope
+            begin = time.monotonic()
+            try:
+                result = fetch()
+                timings[name] = {"status": "ok" if is_valid_price(result) else "invalid"}
+                return result
+            except Exception as e:
+                timings[name] = {"status": "failed", "error": str(e)}
+                if not scope.cancelled:
+                    print(f"⚠ {name.replace('_', '-').capitalize()} data failed for {ticker}: {e}")
+                return None
+            finally:
+                timings[name]["elapsed_ms"] = round((time.monotonic() - begin) * 1000)
+
+    def start_next():
+        name, fetch = sources[len(futures)]
+        timings[name] = {"status": "running"}
+        launched_at[name] = time.monotonic()
+        future = _price_pool.submit(contextvars.copy_context().run, run_source, name, fetch)
+        futures[future] = name
+        return future
+
+    pending = {start_next()}
+    while mode == "race" and len(futures) < len(sources):
+        pending.add(start_next())
+
+    winner = None
+    while pending:
+        can_hedge = mode == "hedged" and len(futures) < len(sources)
+        done, pending = wait(pending, timeout=hedge_delay if can_hedge else None, return_when=FIRST_COMPLETED)
+
+        for future in done:
+            result = future.result()
+            if is_valid_price(result):
+                winner = (futures[future], result)
+                break
+        if winner:
+            break
+
+        # A source failed, or the hedge delay elapsed without a price
+        if len(futures) < len(sources) and (done or can_hedge):
+            pending.add(start_next())
+
+    for future, name in futures.items():
+        if not future.done():
+            future.cancel()
+            if name in scopes:
+                scopes[name].cancel()
+            timings[name] = {"status": "cancelled", "elapsed_ms": round((time.monotonic() - launched_at[name]) * 1000)}
+
+    # Cancelled workers may still finish in the background; report what we saw
+    timings = {name: dict(timing) for name, timing in timings.items()}
+    if winner is None:
+        return None, timings
+
+    name, result = winner
+    print(f"✓ Got {name.replace('_', '-')} price for {ticker}: {result['current_price']}")
+    result = dict(result)
+    result["winning_source"] = name
+    result["source_timings"] = timings
+    result["fetch_mode"] = mode
+    result["total_elapsed_ms"] = round((time.monotonic() - started_at) * 1000)
+    return result, timings
+
 def get_current_price_with_timeout(ticker: str, timeout: int = 10) -> dict:
     """Get current price with timeout control"""
     try:
-        # Set timeout for akshare operations
-        import socket
-        original_timeout = socket.getdefaulttimeout()
-        socket.setdefaulttimeout(timeout)
-
-        try:
+        # Bound this lookup only; other threads keep their own deadlines
+        with deadline(timeout):
             if ticker.endswith('.HK'):
                 return get_hk_current_price_improved(ticker)
             elif ticker.isalpha() and len(ticker) <= 5:
                 return get_us_current_price_improved(ticker)
             else:
                 return get_cn_current_price_improved(ticker)
-        finally:
-            socket.setdefaulttimeout(original_timeout)
 
-    except socket.timeout:
+    except (DeadlineExceeded, requests.exceptions.Timeout):
         raise Exception(f"Timeout after {timeout} seconds")
     except Exception as e:
         raise Exception(f"Network error: {str(e)}")
@@ -108,34 +213,10 @@ def get_current_price_with_timeout(ticker: str, timeout: int = 10) -> dict:
 def get_hk_current_price_improved(ticker: str) -> dict:
     """Get current price for Hong Kong stocks with improved error handling"""
     try:
-        stock_code = ticker.replace('.HK', '')
-
-        # Try with timeout and retry logic
-        for attempt in range(2):  # 2 attempts
-            try:
-                hk_spot = ak.stock_hk_spot_em()
-                if not hk_spot.empty:
-                    stock_data = hk_spot[hk_spot['代码'] == stock_code]
-                    if not stock_data.empty:
-                        stock_info = stock_data.iloc[0]
-                        return {
-                            "ticker": ticker,
-                            "current_price": float(stock_info.get('最新价', 0)),
-                            "change": float(stock_info.get('涨跌额', 0)),
-                            "change_percent": float(stock_info.get('涨跌幅', 0)),
-                            "volume": int(stock_info.get('成交量', 0)),
-                            "high": float(stock_info.get('最高', 0)),
-                            "low": float(stock_info.get('最低', 0)),
-                            "open": float(stock_info.get('今开', 0)),
-                            "previous_close": float(stock_info.get('昨收', 0)),
-                            "market_time": stock_info.get('时间', datetime.now().strftime('%Y-%m-%d %H:%M:%S')),
-                            "data_source": "real_time_hk"
-                        }
-                break  # Success, exit retry loop
-            except Exception as e:
-                if attempt == 1:  # Last attempt
-                    raise e
-                time.sleep(1)  # Wait before retry
+        # Transient failures are retried inside call_akshare
+        quote = get_spot_quotes('HK', [ticker]).get(ticker)
+        if quote is not None:
+            return quote
 
         # If real-time fails, try historical
         return get_price_from_history_improved(ticker, 'HK')
@@ -146,33 +227,10 @@ def get_hk_current_price_improved(ticker: str) -> dict:
 def get_us_current_price_improved(ticker: str) -> dict:
     """Get current price for US stocks with improved error handling"""
     try:
-        # Try with timeout and retry logic
-        for attempt in range(2):  # 2 attempts
-            try:
-                us_spot = ak.stock_us_spot_em()
-                if not us_spot.empty:
-                    stock_data = us_spot[us_spot['代码'] == ticker]
-                    if not stock_data.empty:
-                        stock_info = stock_data.iloc[0]
-                        return {
-                            "ticker": ticker,
-                            "current_price": float(stock_info.get('最新价', 0)),
-                            "change": float(stock_info.get('涨跌额', 0)),
-                            "change_percent": float(stock_info.get('涨跌幅', 0)),
-                            "volume": int(stock_info.get('成交量', 0)),
-                            "high": float(stock_info.get('最高', 0)),
-                            "low": float(stock_info.get('最低', 0)),
-                            "open": float(stock_info.get('今开', 0)),
-                            "previous_close": float(stock_info.get('昨收', 0)),
-                            "market_cap": float(stock_info.get('总市值', 0)) if '总市值' in stock_info else None,
-                            "market_time": stock_info.get('时间', datetime.now().strftime('%Y-%m-%d %H:%M:%S')),
-                            "data_source": "real_time_us"
-                        }
-                break  # Success, exit retry loop
-            except Exception as e:
-                if attempt == 1:  # Last attempt
-                    raise e
-                time.sleep(1)  # Wait before retry
+        # Transient failures are retried inside call_akshare
+        quote = get_spot_quotes('US', [ticker]).get(ticker)
+        if quote is not None:
+            return quote
 
         # If real-time fails, try historical
         return get_price_from_history_improved(ticker, 'US')
@@ -183,36 +241,10 @@ def get_us_current_price_improved(ticker: str) -> dict:
 def get_cn_current_price_improved(ticker: str) -> dict:
     """Get current price for A-shares with improved error handling"""
     try:
-        # Try with timeout and retry logic
-        for attempt in range(2):  # 2 attempts
-            try:
-                current_price = ak.stock_zh_a_spot_em()
-                if not current_price.empty:
-                    stock_data = current_price[current_price['代码'] == ticker]
-                    if not stock_data.empty:
-                        stock_info = stock_data.iloc[0]
-                        return {
-                            "ticker": ticker,
-                            "current_price": float(stock_info.get('最新价', 0)),
-                            "change": float(stock_info.get('涨跌额', 0)),
-                            "change_percent": float(stock_info.get('涨跌幅', 0)),
-                            "volume": int(stock_info.get('成交量', 0)),
-                            "turnover": float(stock_info.get('成交额', 0)),
-                            "high": float(stock_info.get('最高', 0)),
-                            "low": float(stock_info.get('最低', 0)),
-                            "open": float(stock_info.get('今开', 0)),
-                            "previous_close": float(stock_info.get('昨收', 0)),
-                            "market_cap": float(stock_info.get('总市值', 0)) if '总市值' in stock_info else None,
-                            "pe_ratio": float(stock_info.get('市盈率', 0)) if '市盈率' in stock_info else None,
-                            "pb_ratio": float(stock_info.get('市净率', 0)) if '市净率' in stock_info else None,
-                            "market_time": stock_info.get('时间', datetime.now().strftime('%Y-%m-%d %H:%M:%S')),
-                            "data_source": "real_time_cn"
-                        }
-                break  # Success, exit retry loop
-            except Exception as e:
-                if attempt == 1:  # Last attempt
-                    raise e
-                time.sleep(1)  # Wait before retry
+        # Transient failures are retried inside call_akshare
+        quote = get_spot_quotes('CN', [ticker]).get(ticker)
+        if quote is not None:
+            return quote
 
         # If real-time fails, try historical
         return get_price_from_history_improved(ticker, 'CN')
@@ -223,75 +255,46 @@ def get_cn_current_price_improved(ticker: str) -> dict:
 def get_price_from_history_improved(ticker: str, market_type: str = 'CN', timeout: int = 15) -> dict:
     """Improved fallback method to get current price from historical data"""
     try:
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=14)  # Extended range for more data
+        # The last two sessions give the latest close and the previous close
+        calendar = get_calendar(market_type)
+        end_date = calendar.today()
+        start_date = calendar.window_start(2)
 
-        # Set socket timeout for historical data
-        import socket
-        original_timeout = socket.getdefaulttimeout()
-        socket.setdefaulttimeout(timeout)
-
-        try:
-            if market_type == 'HK':
-                hist_data = ak.stock_hk_hist(
-                    symbol=ticker.replace('.HK', ''),
-                    period="daily",
-                    start_date=start_date.strftime('%Y%m%d'),
-                    end_date=end_date.strftime('%Y%m%d')
-                )
-            elif market_type == 'US':
-                hist_data = ak.stock_us_hist(
-                    symbol=ticker,
-                    period="daily",
-                    start_date=start_date.strftime('%Y%m%d'),
-                    end_date=end_date.strftime('%Y%m%d')
-                )
-            else:  # CN
-                hist_data = ak.stock_zh_a_hist(
-                    symbol=ticker,
-                    period="daily",
-                    start_date=start_date.strftime('%Y%m%d'),
-                    end_date=end_date.strftime('%Y%m%d')
-                )
-
-            if not hist_data.empty:
-                # Get the most recent data
-                latest_data = hist_data.iloc[-1]
-
-                # Get previous day for change calculation
-                if len(hist_data) > 1:
-                    previous_data = hist_data.iloc[-2]
-                    prev_close = float(previous_data.get('收盘', 0))
-                else:
-                    prev_close = float(latest_data.get('收盘', 1))
-
-                current_close = float(latest_data.get('收盘', 0))
-                change = current_close - prev_close
-                change_percent = (change / prev_close) * 100 if prev_close != 0 else 0
-
-                return {
-                    "ticker": ticker,
-                    "current_price": current_close,
-                    "change": change,
-                    "change_percent": change_percent,
-                    "volume": int(latest_data.get('成交量', 0)),
-                    "high": float(latest_data.get('最高', 0)),
-                    "low": float(latest_data.get('最低', 0)),
-                    "open": float(latest_data.get('开盘', 0)),
-                    "previous_close": prev_close,
-                    "market_time": latest_data.get('日期', datetime.now().strftime('%Y-%m-%d')),
-                    "data_source": "historical",
-                    "data_points": len(hist_data)
-                }
-            else:
-                raise Exception("No historical data available")
-
-        finally:
-            socket.setdefaulttimeout(original_timeout)
+        # Bound the historical fetch with a per-call deadline
+        with deadline(timeout):
+            hist_data = history_store.get_bars(market_type, ticker, "daily", start_date, end_date)
+            return price_from_records(ticker, price_records(hist_data.tail(2)))
 
     except Exception as e:
         raise Exception(f"Historical price fetch failed: {str(e)}")
 
+def price_from_records(ticker: str, price_data: list) -> dict:
+    """Latest price and change from the last two daily price records"""
+    if not price_data:
+        raise Exception("No historical data available")
+
+    latest_data = price_data[-1]
+    # Get previous day for change calculation
+    prev_close = price_data[-2]['close'] if len(price_data) > 1 else latest_data['close']
+    current_close = latest_data['close']
+    change = current_close - prev_close
+    change_percent = (change / prev_close) * 100 if prev_close != 0 else 0
+
+    return {
+        "ticker": ticker,
+        "current_price": current_close,
+        "change": change,
+        "change_percent": change_percent,
+        "volume": latest_data['volume'],
+        "high": latest_data['high'],
+        "low": latest_data['low'],
+        "open": latest_data['open'],
+        "previous_close": prev_close,
+        "market_time": latest_data['date'],
+        "data_source": "historical",
+        "data_points": len(price_data)
+    }
+
 def get_price_from_alternative_source(ticker: str) -> dict:
     """Alternative data source using different AkShare functions"""
     try:
@@ -315,7 +318,7 @@ def get_hk_alternative(ticker: str) -> dict:
 
         # Try individual stock info
         try:
-            stock_info = ak.stock_hk_info(symbol=stock_code)
+            stock_info = call_akshare("stock_hk_info", symbol=stock_code)
             if not stock_info.empty:
                 info = stock_info.iloc[0]
                 return {
@@ -326,12 +329,14 @@ def get_hk_alternative(ticker: str) -> dict:
                     "volume": int(info.get('成交量', 0)),
                     "data_source": "alternative_hk"
                 }
-        except:
+        except DeadlineExceeded:
+            raise
+        except Exception:
             pass
 
         # Try using stock_individual_info_em with HK prefix
         try:
-            stock_individual = ak.stock_individual_info_em(symbol=f"HK{stock_code}")
+            stock_individual = call_akshare("stock_individual_info_em", symbol=f"HK{stock_code}")
             if not stock_individual.empty:
                 # Extract price from individual info
                 return {
@@ -340,11 +345,15 @@ def get_hk_alternative(ticker: str) -> dict:
                     "data_source": "individual_info_hk",
                     "note": "Limited data available"
                 }
-        except:
+        except DeadlineExceeded:
+            raise
+        except Exception:
             pass
 
         raise Exception("No alternative HK data sources available")
 
+    except DeadlineExceeded:
+        raise
     except Exception as e:
         raise Exception(f"Alternative HK failed: {str(e)}")
 
@@ -353,7 +362,7 @@ def get_us_alternative(ticker: str) -> dict:
     try:
         # Try stock_info interface
         try:
-            stock_info = ak.stock_info(symbol=ticker)
+            stock_info = call_akshare("stock_info", symbol=ticker)
             if not stock_info.empty:
                 info = stock_info.iloc[0]
                 return {
@@ -362,12 +371,14 @@ def get_us_alternative(ticker: str) -> dict:
                     "data_source": "alternative_us",
                     "note": "Limited data from stock_info"
                 }
-        except:
+        except DeadlineExceeded:
+            raise
+        except Exception:
             pass
 
         # Try using individual info
         try:
-            individual_info = ak.stock_individual_info_em(symbol=ticker)
+            individual_info = call_akshare("stock_individual_info_em", symbol=ticker)
             if not individual_info.empty:
                 return {
                     "ticker": ticker,
@@ -375,11 +386,15 @@ def get_us_alternative(ticker: str) -> dict:
                     "data_source": "individual_info_us",
                     "note": "Individual info available"
                 }
-        except:
+        except DeadlineExceeded:
+            raise
+        except Exception:
             pass
 
         raise Exception("No alternative US data sources available")
 
+    except DeadlineExceeded:
+        raise
     except Exception as e:
         raise Exception(f"Alternative US failed: {str(e)}")
 
@@ -388,12 +403,9 @@ def get_cn_alternative(ticker: str) -> dict:
     try:
         # Try individual stock info
         try:
-            individual_info = ak.stock_individual_info_em(symbol=ticker)
+            individual_info = call_akshare("stock_individual_info_em", symbol=ticker)
             if not individual_info.empty:
-                info_dict = {}
-                for _, row in individual_info.iterrows():
-                    if 'item' in row and 'value' in row:
-                        info_dict[row['item']] = row['value']
+                info_dict = items_to_dict(individual_info)
 
                 # Try to extract price from individual info
                 price = 0
@@ -409,12 +421,14 @@ def get_cn_alternative(ticker: str) -> dict:
                     "additional_info": info_dict,
                     "note": "Limited data from individual info"
                 }
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             print(f"Individual info failed: {e}")
 
         # Try using stock_info interface
         try:
-            stock_info = ak.stock_info(symbol=ticker)
+            stock_info = call_akshare("stock_info", symbol=ticker)
             if not stock_info.empty:
                 return {
                     "ticker": ticker,
@@ -422,58 +436,119 @@ def get_cn_alternative(ticker: str) -> dict:
                     "data_source": "stock_info_cn",
                     "note": "Limited stock info available"
                 }
-        except:
+        except DeadlineExceeded:
+            raise
+        except Exception:
             pass
 
         raise Exception("No alternative CN data sources available")
 
+    except DeadlineExceeded:
+        raise
     except Exception as e:
         raise Exception(f"Alternative CN failed: {str(e)}")
 
+@tool(args_schema=StockBatchPriceInput)
+def get_current_stock_prices(tickers: list[str]) -> dict:
+    """
+    Fetches current prices for many stocks in one call, e.g. a watchlist or a
+    peer group. Accepts a mix of A-share, Hong Kong and US tickers and returns
+    the same fields as get_current_stock_price for each one.
+
+    Much faster than calling get_current_stock_price repeatedly: each market's
+    spot table is fetched once and all quotes are selected from it together.
+    """
+    try:
+        # Group by market so every spot table is touched once
+        by_market = {}
+        for raw_ticker in tickers:
+            ticker = normalize_ticker(raw_ticker)
+            by_market.setdefault(get_market_type(ticker), []).append(ticker)
+
+        quotes = {}
+        missing = []
+        errors = {}
+        for market, market_tickers in by_market.items():
+            try:
+                market_quotes = get_spot_quotes(market, market_tickers)
+            except Exception as e:
+                errors[market] = f"Spot data unavailable: {str(e)}"
+                missing.extend(market_tickers)
+                continue
+            quotes.update(market_quotes)
+            missing.extend(t for t in market_tickers if t not in market_quotes)
+
+        return {
+            "quotes": quotes,
+            "missing": missing,
+            "errors": errors,
+            "requested": len(tickers),
+            "found": len(quotes)
+        }
+
+    except Exception as e:
+        return {
+            "error": f"Failed to get current prices: {str(e)}",
+            "quotes": {},
+            "missing": list(tickers)
+        }
+
+def get_spot_quotes(market: str, tickers: list[str]) -> dict:
+    """Select quotes for several tickers of one market from its columnar spot snapshot"""
+    snapshot = spot_cache.get_snapshot(market)
+
+    found = []
+    positions = []
+    for ticker in tickers:
+        position = snapshot.index.get(hk_code(ticker) if market == 'HK' else ticker)
+        if position is not None:
+            found.append(ticker)
+            positions.append(position)
+
+    if not positions:
+        return {}
+
+    market_time = datetime.fromtimestamp(snapshot.fetched_at).strftime('%Y-%m-%d %H:%M:%S')
+    snapshot_age = round(snapshot.age(), 1)
+    stale = spot_cache.is_stale(snapshot)
+    quotes = {}
+    for ticker, values in zip(found, snapshot.select(positions)):
+        quote = {"ticker": ticker}
+        quote.update({field: values.get(field) for field in SPOT_QUOTE_FIELDS[market]})
+        quote.update({
+            "market_time": market_time,
+            "data_source": f"real_time_{market.lower()}",
+            "snapshot_age_seconds": snapshot_age,
+            "stale": stale
+        })
+        quotes[ticker] = quote
+    return quotes
+
 @tool(args_schema=StockPriceInput)
-def get_stock_price_history(ticker: str, period: Literal["daily", "weekly", "monthly"] = "daily", days_back: int = 30) -> dict:
+def get_stock_price_history(ticker: str, period: Literal["daily", "weekly", "monthly", "quarterly"] = "daily", days_back: int = 30,
+                            adjust: Literal["", "qfq", "hfq"] = "", format: Literal["records", "columnar"] = "records") -> dict:
     """
     Fetches historical stock price data including:
-    - Daily/weekly/monthly price history
+    - Daily/weekly/monthly/quarterly price history
     - Volume data
     - High/low prices
     - Price change calculations
+    Use adjust='qfq'/'hfq' for dividend/split-adjusted prices and format='columnar'
+    to get parallel lists per field instead of one dict per bar.
     """
     try:
         ticker = normalize_ticker(ticker)
 
-        # Calculate date range with buffer
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=days_back * 2)  # Buffer for weekends/holidays
-
-        # Set timeout for operations
-        import socket
-        original_timeout = socket.getdefaulttimeout()
-        socket.setdefaulttimeout(30)
+        # Window of exactly days_back trading sessions
+        market_type = get_market_type(ticker)
+        calendar = get_calendar(market_type)
+        end_date = calendar.today()
+        start_date = calendar.window_start(days_back)
 
-        try:
-            # Get historical data based on market type
-            if ticker.endswith('.HK'):
-                hist_data = ak.stock_hk_hist(
-                    symbol=ticker.replace('.HK', ''),
-                    period=period,
-                    start_date=start_date.strftime('%Y%m%d'),
-                    end_date=end_date.strftime('%Y%m%d')
-                )
-            elif ticker.isalpha() and len(ticker) <= 5:
-                hist_data = ak.stock_us_hist(
-                    symbol=ticker,
-                    period=period,
-                    start_date=start_date.strftime('%Y%m%d'),
-                    end_date=end_date.strftime('%Y%m%d')
-                )
-            else:
-                hist_data = ak.stock_zh_a_hist(
-                    symbol=ticker,
-                    period=period,
-                    start_date=start_date.strftime('%Y%m%d'),
-                    end_date=end_date.strftime('%Y%m%d')
-                )
+        # Bound the fetch with a per-call deadline
+        with deadline(30):
+            # Served from the local bar store; only missing ranges are fetched
+            hist_data = history_store.get_bars(market_type, ticker, period, start_date, end_date, adjust)
 
             if hist_data.empty:
                 return {
@@ -482,25 +557,14 @@ def get_stock_price_history(ticker: str, period: Literal["daily", "weekly", "mon
                     "price_data": []
                 }
 
-            # Process and clean data
-            price_data = []
-            for _, row in hist_data.iterrows():
-                price_record = {
-                    "date": row.get('日期', ''),
-                    "open": float(row.get('开盘', 0)),
-                    "high": float(row.get('最高', 0)),
-                    "low": float(row.get('最低', 0)),
-                    "close": float(row.get('收盘', 0)),
-                    "volume": int(row.get('成交量', 0)),
-                    "turnover": float(row.get('成交额', 0)) if '成交额' in row else 0
-                }
-                price_data.append(price_record)
+            # Metrics only need the last week of bars; the full series is exported once below
+            recent_data = price_records(hist_data.tail(7))
 
             # Calculate additional metrics
-            if len(price_data) > 0:
-                latest_price = price_data[-1]['close']
-                if len(price_data) > 1:
-                    previous_price = price_data[-2]['close']
+            if len(recent_data) > 0:
+                latest_price = recent_data[-1]['close']
+                if len(recent_data) > 1:
+                    previous_price = recent_data[-2]['close']
                     recent_change = latest_price - previous_price
                     recent_change_percent = (recent_change / previous_price) * 100 if previous_price != 0 else 0
                 else:
@@ -508,22 +572,34 @@ def get_stock_price_history(ticker: str, period: Literal["daily", "weekly", "mon
                     recent_change_percent = 0
 
                 # Calculate weekly performance if enough data
-                weekly_performance = calculate_weekly_performance(price_data)
+                weekly_performance = calculate_weekly_performance(recent_data)
 
-                return {
+                if format == "columnar":
+                    price_data = price_columns(hist_data)
+                    start_date, end_date = price_data["date"][0], price_data["date"][-1]
+                else:
+                    price_data = price_records(hist_data)
+                    start_date, end_date = price_data[0]['date'], price_data[-1]['date']
+
+                result = {
                     "ticker": ticker,
                     "period": period,
+                    "adjust": hist_data.attrs.get("adjust", adjust),
+                    "format": format,
                     "price_data": price_data,
                     "latest_price": latest_price,
                     "recent_change": recent_change,
                     "recent_change_percent": recent_change_percent,
                     "weekly_performance": weekly_performance,
-                    "data_points": len(price_data),
+                    "data_points": len(hist_data),
                     "date_range": {
-                        "start": price_data[0]['date'] if price_data else None,
-                        "end": price_data[-1]['date'] if price_data else None
+                        "start": start_date,
+                        "end": end_date
                     }
                 }
+                if result["adjust"] != adjust:
+                    result["warning"] = f"Adjusted ({adjust}) prices unavailable; returning unadjusted prices"
+                return result
 
             return {
                 "error": "No valid price data found",
@@ -531,9 +607,6 @@ def get_stock_price_history(ticker: str, period: Literal["daily", "weekly", "mon
                 "price_data": []
             }
 
-        finally:
-            socket.setdefaulttimeout(original_timeout)
-
     except Exception as e:
         return {
             "error": f"Failed to get price history for {ticker}: {str(e)}",
@@ -686,4 +759,58 @@ def get_stock_weekly_summary(ticker: str) -> dict:
         return {
             "error": f"Failed to get weekly summary for {ticker}: {str(e)}",
             "ticker": ticker
-        }
\ No newline at end of file
+        }
+
+
+@tool(args_schema=IntradayInput)
+def get_intraday_summary(ticker: str, minutes: int = 30, include_bars: bool = False) -> dict:
+    """
+    Summarizes today's 1-minute bars for a stock:
+    - VWAP of the latest session and of the last N minutes
+    - Open/high/low/close, volume and turnover of the last N minutes
+    - Optionally the minute bars themselves
+    Minute bars are buffered in memory and refreshed incrementally, so repeated
+    calls during the session are cheap.
+    """
+    try:
+        ticker = normalize_ticker(ticker)
+        market_type = get_market_type(ticker)
+
+        with deadline(15):
+            buffer = intraday_store.get(market_type, ticker)
+
+        if not len(buffer):
+            return {
+                "error": f"No intraday data found for {ticker}",
+                "ticker": ticker
+            }
+
+        window = buffer.stats(minutes)
+        for key in ("start_ts", "end_ts"):
+            if key in window:
+                window[key.replace("_ts", "")] = format_minute(window.pop(key), market_type)
+
+        result = {
+            "ticker": ticker,
+            "latest_minute": format_minute(buffer.last_ts, market_type),
+            "latest_price": window.get("close"),
+            "session_vwap": buffer.vwap(session_minutes(buffer, market_type)),
+            "window_minutes": minutes,
+            "window": window,
+            "buffered_bars": len(buffer)
+        }
+
+        if include_bars:
+            bars = buffer.bars(minutes)
+            result["bars"] = {
+                "time": [format_minute(ts, market_type) for ts in bars.pop("ts").tolist()],
+                **{field: values.tolist() for field, values in bars.items()}
+            }
+
+        return result
+
+    except Exception as e:
+        return {
+            "error": f"Failed to get intraday data for {ticker}: {str(e)}",
+            "ticker": ticker
+        }
@@ -8,6 +8,7 @@ import numpy as np
 import requests
 import time
 from baymax.tools.api import normalize_ticker
+from baymax.tools.records import price_records, items_to_dict
 
 # Configure requests timeout and retry settings
 requests.adapters.DEFAULT_RETRIES = 3
@@ -390,10 +391,7 @@ def get_cn_alternative(ticker: str) -> dict:
         try:
             individual_info = ak.stock_individual_info_em(symbol=ticker)
             if not individual_info.empty:
-                info_dict = {}
-                for _, row in individual_info.iterrows():
-                    if 'item' in row and 'value' in row:
-                        info_dict[row['item']] = row['value']
+                info_dict = items_to_dict(individual_info)
 
                 # Try to extract price from individual info
                 price = 0
@@ -507,18 +505,7 @@ def get_stock_price_history_improved(ticker: str, period: str, days_back: int) -
 
 def process_price_data(hist_data: pd.DataFrame, ticker: str, period: str, days_back: int) -> dict:
     """Process historical price data (same as original)"""
-    price_data = []
-    for _, row in hist_data.iterrows():
-        price_record = {
-            "date": row.get('日期', ''),
-            "open": float(row.get('开盘', 0)),
-            "high": float(row.get('最高', 0)),
-            "low": float(row.get('最低', 0)),
-            "close": float(row.get('收盘', 0)),
-            "volume": int(row.get('成交量', 0)),
-            "turnover": float(row.get('成交额', 0)) if '成交额' in row else 0
-        }
-        price_data.append(price_record)
+    price_data = price_records(hist_data)
 
     # Calculate additional metrics (same as original)
     if len(price_data) > 0:
@@ -0,0 +1,122 @@
+"""
+Vectorized conversion of akshare tables into the tools' record dicts.
+
+Building records with DataFrame.iterrows() boxes every row into a Series and
+every cell through float()/int(), which dominates CPU time for long
+histories. Here a table is converted column by column: select and rename the
+columns once, cast each to its dtype once, then export everything with a
+single to_dict('records').
+
+The columnar variants export parallel lists per field instead, which avoids
+repeating every key on every row in tool responses.
+"""
+
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# Price history record field -> akshare history column
+PRICE_RECORD_COLUMNS = {
+    "date": "日期",
+    "open": "开盘",
+    "high": "最高",
+    "low": "最低",
+    "close": "收盘",
+    "volume": "成交量",
+    "turnover": "成交额",
+}
+
+# dtype of each price history record field; fields not listed keep their values
+PRICE_RECORD_DTYPES = {
+    "open": "float",
+    "high": "float",
+    "low": "float",
+    "close": "float",
+    "volume": "int",
+    "turnover": "float",
+}
+
+
+def select_columns(frame: pd.DataFrame, columns: Dict[str, str], dtypes: Optional[Dict[str, str]] = None,
+                   default: Any = 0) -> pd.DataFrame:
+    """
+    Rename and cast the columns of a table in one pass.
+
+    Args:
+        frame: Source table
+        columns: Output field -> source column; a missing column becomes `default`
+        dtypes: Output field -> 'float' or 'int'; ints treat NaN as 0
+
+    Returns:
+        A new table holding only the output fields, in the order given
+    """
+    dtypes = dtypes or {}
+    selected = {}
+    for field, column in columns.items():
+        if column not in frame.columns:
+            selected[field] = np.full(len(frame), default)
+            continue
+        values = frame[column]
+        kind = dtypes.get(field)
+        if kind == "float":
+            values = pd.to_numeric(values, errors="coerce").astype(np.float64)
+        elif kind == "int":
+            values = pd.to_numeric(values, errors="coerce").fillna(0).astype(np.int64)
+        selected[field] = values.to_numpy()
+    return pd.DataFrame(selected, index=frame.index)
+
+
+def frame_to_records(frame: pd.DataFrame, columns: Optional[Dict[str, str]] = None,
+                     dtypes: Optional[Dict[str, str]] = None, default: Any = 0) -> List[dict]:
+    """Convert a table into a list of dicts, renaming and casting columns first if given."""
+    if frame is None or frame.empty:
+        return []
+    if columns is not None:
+        frame = select_columns(frame, columns, dtypes, default)
+    return frame.to_dict("records")
+
+
+def price_records(hist_data: pd.DataFrame) -> List[dict]:
+    """Price history bars as date/open/high/low/close/volume/turnover records."""
+    return frame_to_records(hist_data, PRICE_RECORD_COLUMNS, PRICE_RECORD_DTYPES)
+
+
+def frame_to_columns(frame: pd.DataFrame, columns: Optional[Dict[str, str]] = None,
+                     dtypes: Optional[Dict[str, str]] = None, default: Any = 0) -> Dict[str, list]:
+    """Convert a table into parallel lists, one per field, renaming and casting columns first if given."""
+    if frame is None or frame.empty:
+        return {field: [] for field in (columns or {})}
+    if columns is not None:
+        frame = select_columns(frame, columns, dtypes, default)
+    return {field: frame[field].to_numpy().tolist() for field in frame.columns}
+
+
+def price_columns(hist_data: pd.DataFrame) -> Dict[str, list]:
+    """Price history bars as parallel date/open/high/low/close/volume/turnover lists, dates as 'YYYY-MM-DD'."""
+    columns = frame_to_columns(hist_data, PRICE_RECORD_COLUMNS, PRICE_RECORD_DTYPES)
+    if columns.get("date"):
+        dates = pd.to_datetime(pd.Series(columns["date"]), errors="coerce")
+        columns["date"] = dates.dt.strftime('%Y-%m-%d').where(dates.notna(), None).tolist()
+    return columns
+
+
+def arrays_to_records(columns: Dict[str, np.ndarray]) -> List[dict]:
+    """Zip equal-length arrays into records, mapping float NaN to None."""
+    exported = {}
+    for field, values in columns.items():
+        values = np.asarray(values)
+        if values.dtype.kind == 'f':
+            exported[field] = np.where(np.isnan(values), None, values).tolist()
+        else:
+            exported[field] = values.tolist()
+    if not exported:
+        return []
+    return [dict(zip(exported, row)) for row in zip(*exported.values())]
+
+
+def items_to_dict(frame: pd.DataFrame, key: str = "item", value: str = "value") -> dict:
+    """Turn a two-column item/value table (e.g. stock_individual_info_em) into a dict."""
+    if frame is None or frame.empty or key not in frame.columns or value not in frame.columns:
+        return {}
+    return dict(zip(frame[key].tolist(), frame[value].tolist()))
@@ -0,0 +1,419 @@
+"""
+Process-wide cache of full-market spot tables.
+
+The akshare spot endpoints only return the whole market at once (~5,000 rows
+for A-shares), so every quote lookup used to pay a full download plus a
+column scan. This module keeps one columnar snapshot per market, reuses it
+until its TTL expires and resolves tickers through a prebuilt code -> row
+index.
+
+Long-running processes (the MCP server) can also start a background
+refresher. It re-downloads each market on a schedule, builds the new snapshot
+off to the side and swaps it in with a single reference assignment, so
+readers always see a complete snapshot and never wait on the network.
+
+Every downloaded snapshot is also written to the local cache directory as one
+.npy file per column. A new process memory-maps the latest copy on its first
+lookup, serves it (marked stale if it is past the TTL) and refreshes in the
+background; processes on the same host therefore share one on-disk copy.
+
+Outside trading sessions a snapshot taken after the last close cannot go
+out of date, so it is served past its TTL and the refresher skips it.
+"""
+
+import json
+import os
+import shutil
+import threading
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from baymax.tools.constants import CACHE_DIR
+from baymax.tools.records import arrays_to_records
+from baymax.tools.trading_calendar import get_calendar
+from baymax.tools.upstream import call_akshare
+
+####################################
+# Configuration
+####################################
+
+# Seconds a downloaded spot table is served before it is fetched again
+SPOT_TTL_SECONDS = float(os.getenv("BAYMAX_SPOT_TTL", "30"))
+
+# Seconds between background refreshes; 0 disables the refresher
+SPOT_REFRESH_INTERVAL = float(os.getenv("BAYMAX_SPOT_REFRESH_INTERVAL", "0"))
+
+# Markets kept warm by the background refresher
+SPOT_REFRESH_MARKETS = [m.strip().upper() for m in os.getenv("BAYMAX_SPOT_REFRESH_MARKETS", "CN,HK,US").split(",") if m.strip()]
+
+# Oldest snapshot served while the refresher runs before readers fetch it themselves
+SPOT_MAX_STALENESS = float(os.getenv("BAYMAX_SPOT_MAX_STALENESS", "300"))
+
+# Spot table column(s) behind each quote field; the first one present is used
+SPOT_COLUMNS = {
+    "current_price": ("最新价",),
+    "change": ("涨跌额",),
+    "change_percent": ("涨跌幅",),
+    "volume": ("成交量",),
+    "turnover": ("成交额",),
+    "high": ("最高",),
+    "low": ("最低",),
+    "open": ("今开",),
+    "previous_close": ("昨收",),
+    "market_cap": ("总市值",),
+    "pe_ratio": ("市盈率", "市盈率-动态"),
+    "pb_ratio": ("市净率",),
+}
+
+INTEGER_FIELDS = {"volume"}
+
+# Persist snapshots to disk so new processes start warm
+SPOT_PERSIST = os.getenv("BAYMAX_SPOT_PERSIST", "1").lower() not in ("0", "false", "no")
+
+# Directory holding one subdirectory of snapshot versions per market
+SPOT_CACHE_DIR = os.path.join(CACHE_DIR, "spot")
+
+# On-disk versions kept per market; older ones may still be mapped by other processes
+SPOT_VERSIONS_KEPT = 2
+
+# akshare spot endpoint used for each market
+SPOT_FUNCTIONS = {
+    "CN": "stock_zh_a_spot_em",
+    "HK": "stock_hk_spot_em",
+    "US": "stock_us_spot_em",
+}
+
+
+####################################
+# Snapshot
+####################################
+
+class SpotSnapshot:
+    """
+    An immutable full-market spot table stored as typed NumPy columns.
+
+    Only the quote fields are kept: one float64 array per field (volume as
+    int64) plus the code array and a code -> position dict. Looking up one or
+    many tickers is plain array indexing, with no DataFrame rows involved.
+    """
+
+    def __init__(self, market: str, codes: np.ndarray, columns: Dict[str, np.ndarray], fetched_at: Optional[float] = None):
+        self.market = market
+        self.codes = codes
+        self.columns = columns
+        self.fetched_at = fetched_at if fetched_at is not None else time.time()
+        self.index = build_code_index(codes, market)
+
+    @classmethod
+    def from_frame(cls, market: str, frame: pd.DataFrame, fetched_at: Optional[float] = None) -> "SpotSnapshot":
+        """Convert a raw akshare spot table into columns, dropping everything else."""
+        if '代码' not in frame.columns:
+            return cls(market, np.array([], dtype=str), {}, fetched_at)
+
+        codes = frame['代码'].astype(str).to_numpy(dtype=str)
+        columns = {}
+        for field, candidates in SPOT_COLUMNS.items():
+            column = next((c for c in candidates if c in frame.columns), None)
+            if column is None:
+                continue
+            values = pd.to_numeric(frame[column], errors='coerce').to_numpy(dtype=np.float64)
+            if field in INTEGER_FIELDS:
+                values = np.nan_to_num(values).astype(np.int64)
+            columns[field] = values
+        return cls(market, codes, columns, fetched_at)
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes held by the column arrays."""
+        return self.codes.nbytes + sum(values.nbytes for values in self.columns.values())
+
+    def age(self) -> float:
+        """Seconds since the table was downloaded."""
+        return time.time() - self.fetched_at
+
+    def lookup(self, code: str) -> Optional[dict]:
+        """Return the quote fields for a code, or None if it is not listed."""
+        position = self.index.get(code)
+        if position is None:
+            return None
+        return self.select([position])[0]
+
+    def code_for(self, ticker: str) -> Optional[str]:
+        """Full code as listed in the table (e.g. '106.TTE' for 'TTE'), or None if it is not listed."""
+        position = self.index.get(ticker)
+        return None if position is None else str(self.codes[position])
+
+    def select(self, positions: List[int]) -> List[dict]:
+        """Return the quote fields for several row positions with one gather per column."""
+        positions = np.asarray(positions, dtype=np.intp)
+        gathered = {field: values[positions] for field, values in self.columns.items()}
+
+        # NaN marks a missing value (e.g. a suspended stock has no price)
+        return arrays_to_records(gathered) if gathered else [{} for _ in positions]
+
+
+def build_code_index(codes: np.ndarray, market: str = 'CN') -> Dict[str, int]:
+    """
+    Map every security code in a spot table to its row position.
+
+    US codes come back prefixed with the exchange id (e.g. '105.AAPL') and HK
+    codes zero-padded to five digits (e.g. '01211'), so the bare symbol is
+    indexed as well.
+    """
+    index = {}
+    for position, code in enumerate(codes.tolist()):
+        index.setdefault(code, position)
+        if '.' in code:
+            index.setdefault(code.split('.', 1)[1], position)
+        elif market == 'HK' and code.startswith('0'):
+            index.setdefault(code.lstrip('0'), position)
+    return index
+
+
+####################################
+# On-disk persistence
+####################################
+
+def save_snapshot(snapshot: SpotSnapshot, root: str = SPOT_CACHE_DIR) -> str:
+    """
+    Write a snapshot as one .npy file per column and make it the current version.
+
+    The version directory is fully written under a temporary name before it is
+    renamed into place and the CURRENT pointer is replaced, so readers in other
+    processes never see a partial snapshot.
+    """
+    market_dir = os.path.join(root, snapshot.market)
+    os.makedirs(market_dir, exist_ok=True)
+
+    version = f"{int(snapshot.fetched_at * 1000)}-{os.getpid()}"
+    version_dir = os.path.join(market_dir, version)
+    if os.path.isdir(version_dir):
+        return version_dir
+
+    tmp_dir = os.path.join(market_dir, f".{version}.tmp")
+    os.makedirs(tmp_dir, exist_ok=True)
+
+    np.save(os.path.join(tmp_dir, "codes.npy"), snapshot.codes)
+    for field, values in snapshot.columns.items():
+        np.save(os.path.join(tmp_dir, f"{field}.npy"), values)
+    with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({"market": snapshot.market, "fetched_at": snapshot.fetched_at, "fields": list(snapshot.columns)}, f)
+
+    os.replace(tmp_dir, version_dir)
+    pointer_tmp = os.path.join(market_dir, f".CURRENT.{os.getpid()}.tmp")
+    with open(pointer_tmp, "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(pointer_tmp, os.path.join(market_dir, "CURRENT"))
+
+    _prune_versions(market_dir, keep=version)
+    return version_dir
+
+
+def load_snapshot(market: str, root: str = SPOT_CACHE_DIR) -> Optional[SpotSnapshot]:
+    """Memory-map the current on-disk snapshot for a market, or return None if there is none."""
+    market_dir = os.path.join(root, market)
+    try:
+        with open(os.path.join(market_dir, "CURRENT"), encoding="utf-8") as f:
+            version_dir = os.path.join(market_dir, f.read().strip())
+        with open(os.path.join(version_dir, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+
+        codes = np.load(os.path.join(version_dir, "codes.npy"), mmap_mode="r")
+        columns = {
+            field: np.load(os.path.join(version_dir, f"{field}.npy"), mmap_mode="r")
+            for field in meta["fields"]
+        }
+        return SpotSnapshot(market, codes, columns, meta["fetched_at"])
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _prune_versions(market_dir: str, keep: str):
+    """Remove all but the newest SPOT_VERSIONS_KEPT version directories."""
+    versions = sorted(
+        (name for name in os.listdir(market_dir) if not name.startswith(".") and name != "CURRENT"),
+        key=lambda name: int(name.split("-", 1)[0]) if name.split("-", 1)[0].isdigit() else 0,
+    )
+    for name in versions[:-SPOT_VERSIONS_KEPT]:
+        if name != keep:
+            shutil.rmtree(os.path.join(market_dir, name), ignore_errors=True)
+
+
+####################################
+# Cache
+####################################
+
+class SpotSnapshotCache:
+    """Holds the latest snapshot per market and refreshes it once the TTL expires."""
+
+    def __init__(self, ttl: float = SPOT_TTL_SECONDS, max_staleness: float = SPOT_MAX_STALENESS,
+                 persist: bool = SPOT_PERSIST, cache_dir: str = SPOT_CACHE_DIR):
+        self.ttl = ttl
+        self.max_staleness = max_staleness
+        self.persist = persist
+        self.cache_dir = cache_dir
+        self.refresher: Optional["SpotRefresher"] = None
+        self._snapshots: Dict[str, SpotSnapshot] = {}
+        self._locks = {market: threading.Lock() for market in SPOT_FUNCTIONS}
+        self._background: set = set()
+        self._background_lock = threading.Lock()
+
+    def get_snapshot(self, market: str) -> SpotSnapshot:
+        """Return a snapshot younger than the TTL, downloading one if needed."""
+        snapshot = self._snapshots.get(market)
+        if snapshot is not None and self.is_fresh(snapshot):
+            return snapshot
+
+        # The refresher owns downloads for the markets it keeps warm
+        if snapshot is not None and self._is_refreshed(market) and snapshot.age() < self.max_staleness:
+            return snapshot
+
+        # Only one thread per market downloads; the others wait and reuse it
+        with self._locks[market]:
+            snapshot = self._snapshots.get(market)
+            if snapshot is not None and self.is_fresh(snapshot):
+                return snapshot
+
+            # Another process on this host may already hold a newer copy
+            stored = self._load_newer(market, snapshot)
+            if stored is not None:
+                self.swap(stored)
+                if self.is_fresh(stored):
+                    return stored
+                if snapshot is None and stored.age() < self.max_staleness:
+                    # Cold start: serve the stored copy now and refresh behind it
+                    self.refresh_in_background(market)
+                    return stored
+
+            snapshot = self.fetch(market)
+            self.swap(snapshot)
+            return snapshot
+
+    def fetch(self, market: str) -> SpotSnapshot:
+        """Download the full spot table for a market, index it and persist it."""
+        frame = call_akshare(SPOT_FUNCTIONS[market])
+        snapshot = SpotSnapshot.from_frame(market, frame)
+        if self.persist:
+            try:
+                save_snapshot(snapshot, self.cache_dir)
+            except OSError as e:
+                print(f"⚠ Could not persist {market} spot snapshot: {e}")
+        return snapshot
+
+    def refresh_in_background(self, market: str):
+        """Download a market on a daemon thread unless one is already running."""
+        with self._background_lock:
+            if market in self._background:
+                return
+            self._background.add(market)
+
+        def run():
+            try:
+                self.swap(self.fetch(market))
+            except Exception as e:
+                print(f"⚠ Background spot refresh failed for {market}: {e}")
+            finally:
+                self._background.discard(market)
+
+        threading.Thread(target=run, name=f"spot-refresh-{market}", daemon=True).start()
+
+    def is_fresh(self, snapshot: SpotSnapshot) -> bool:
+        """True if the snapshot is within the TTL or no session has traded since it was taken."""
+        if snapshot.age() < self.ttl:
+            return True
+        calendar = get_calendar(snapshot.market)
+        return not calendar.is_open() and snapshot.fetched_at >= calendar.last_close().timestamp()
+
+    def is_stale(self, snapshot: SpotSnapshot) -> bool:
+        """True if the snapshot may be outdated, e.g. an old copy loaded from disk."""
+        return not self.is_fresh(snapshot)
+
+    def _load_newer(self, market: str, current: Optional[SpotSnapshot]) -> Optional[SpotSnapshot]:
+        if not self.persist:
+            return None
+        stored = load_snapshot(market, self.cache_dir)
+        if stored is None or (current is not None and stored.fetched_at <= current.fetched_at):
+            return None
+        return stored
+
+    def swap(self, snapshot: SpotSnapshot):
+        """Publish a fully built snapshot; readers see either the old or the new one."""
+        self._snapshots[snapshot.market] = snapshot
+
+    def _is_refreshed(self, market: str) -> bool:
+        return self.refresher is not None and self.refresher.is_alive() and market in self.refresher.markets
+
+    def invalidate(self, market: Optional[str] = None):
+        """Drop the cached snapshot for one market, or for all markets."""
+        if market is None:
+            self._snapshots.clear()
+        else:
+            self._snapshots.pop(market, None)
+
+
+####################################
+# Background refresher
+####################################
+
+class SpotRefresher(threading.Thread):
+    """Daemon thread that re-downloads spot tables and swaps them into a cache."""
+
+    def __init__(self, cache: SpotSnapshotCache, interval: float, markets: Optional[List[str]] = None):
+        super().__init__(name="spot-refresher", daemon=True)
+        self.cache = cache
+        self.interval = interval
+        self.markets = [m for m in (markets or list(SPOT_FUNCTIONS)) if m in SPOT_FUNCTIONS]
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            for market in self.markets:
+                if self._stop_event.is_set():
+                    break
+                self.refresh(market)
+            self._stop_event.wait(self.interval)
+
+    def refresh(self, market: str):
+        """Build a new snapshot off to the side, then swap it in."""
+        current = self.cache._snapshots.get(market)
+        if current is not None and self.cache.is_fresh(current):
+            return  # Market closed since the last download; nothing has changed
+        try:
+            self.cache.swap(self.cache.fetch(market))
+        except Exception as e:
+            # Keep serving the previous snapshot; readers see its growing age
+            print(f"⚠ Spot refresh failed for {market}: {e}")
+
+    def stop(self):
+        self._stop_event.set()
+
+
+def start_spot_refresher(interval: float = SPOT_REFRESH_INTERVAL, markets: Optional[List[str]] = None) -> Optional[SpotRefresher]:
+    """Start the background refresher for the shared cache; no-op if the interval is 0."""
+    if interval <= 0:
+        return None
+    if spot_cache.refresher is not None and spot_cache.refresher.is_alive():
+        return spot_cache.refresher
+
+    refresher = SpotRefresher(spot_cache, interval, markets or SPOT_REFRESH_MARKETS)
+    spot_cache.refresher = refresher
+    refresher.start()
+    return refresher
+
+
+def stop_spot_refresher():
+    """Stop the background refresher; lookups fall back to TTL-driven fetches."""
+    refresher = spot_cache.refresher
+    spot_cache.refresher = None
+    if refresher is not None:
+        refresher.stop()
+
+
+# Shared by every quote lookup in the process
+spot_cache = SpotSnapshotCache()
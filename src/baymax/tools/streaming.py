@@ -0,0 +1,375 @@
+"""
+Incremental indicators for live bars.
+
+The functions in indicators.py recompute whole series, which is wasteful in a
+monitoring loop where only the newest bar changed. The classes here keep
+O(window) state and update in O(1) per bar:
+
+    update(...)  a new bar was appended
+    revise(...)  the newest bar changed (e.g. the minute or day still forming)
+
+A revision rolls back to the state saved before the newest bar and applies
+the new values, so it never replays history. Values match the batch
+functions in indicators.py: EMA and Wilder averages are seeded with the mean
+of their first window, and NaN is reported until a window is full.
+
+LiveIndicators bundles several of them for one ticker and tells new bars
+from revisions by their timestamp.
+"""
+
+import math
+from abc import ABC, abstractmethod
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+
+####################################
+# Base
+####################################
+
+class StreamingIndicator(ABC):
+    """Checkpointing shared by the indicators: save state before a new bar, restore it to revise."""
+
+    value: float = math.nan
+
+    def __init__(self):
+        self._saved = None
+
+    def update(self, *bar) -> float:
+        self._saved = self._save()
+        self._apply(*bar)
+        return self.value
+
+    def revise(self, *bar) -> float:
+        if self._saved is None:
+            return self.update(*bar)
+        self._restore(self._saved)
+        self._apply(*bar)
+        return self.value
+
+    def _apply_value(self, x: float) -> float:
+        """Apply without a checkpoint, for indicators nested in another one that saves their state."""
+        self._apply(x)
+        return self.value
+
+    @abstractmethod
+    def _save(self):
+        """Snapshot of the state needed to undo the next bar."""
+
+    @abstractmethod
+    def _restore(self, state):
+        """Return to a state saved by _save()."""
+
+    @abstractmethod
+    def _apply(self, *bar):
+        """Fold one bar into the state and set `value`."""
+
+
+####################################
+# Rolling windows
+####################################
+
+class RollingSMA(StreamingIndicator):
+    """Simple moving average over a ring of the last `window` values."""
+
+    def __init__(self, window: int):
+        super().__init__()
+        self.window = window
+        self.values = np.zeros(window)
+        self.head = 0
+        self.count = 0
+        self.total = 0.0
+
+    def _save(self):
+        return (self.head, self.count, self.total, self.values[self.head], self.value)
+
+    def _restore(self, state):
+        self.head, self.count, self.total, evicted, self.value = state
+        self.values[self.head] = evicted
+
+    def _apply(self, x: float):
+        x = float(x)
+        old = self.values[self.head] if self.count == self.window else None
+        self.values[self.head] = x
+        self._accumulate(x, old)
+        self.head = (self.head + 1) % self.window
+        self.count = min(self.count + 1, self.window)
+        if self.head == 0 and self.count == self.window:
+            # Once per window, resum exactly so add/subtract rounding cannot drift
+            self._resum()
+        self.value = self._value()
+
+    def _accumulate(self, x: float, old: Optional[float]):
+        """Add x to the running state, evicting `old` once the window is full."""
+        self.total += x if old is None else x - old
+
+    def _resum(self):
+        self.total = float(self.values.sum())
+
+    def _value(self) -> float:
+        return self.total / self.window if self.count == self.window else math.nan
+
+
+class RollingStd(RollingSMA):
+    """
+    Rolling standard deviation (population by default, like the Bollinger bands).
+
+    Keeps a Welford-style running mean and sum of squared deviations, and
+    recomputes both centred on the ring once per window, so a large price
+    level does not cancel out the variance as sum(x^2) - n * mean^2 would.
+    """
+
+    def __init__(self, window: int, ddof: int = 0):
+        super().__init__(window)
+        self.ddof = ddof
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def _save(self):
+        return super()._save() + (self.mean, self.m2)
+
+    def _restore(self, state):
+        super()._restore(state[:-2])
+        self.mean, self.m2 = state[-2:]
+
+    def _accumulate(self, x: float, old: Optional[float]):
+        if old is None:
+            delta = x - self.mean
+            self.mean += delta / (self.count + 1)
+            self.m2 += delta * (x - self.mean)
+        else:
+            mean = self.mean + (x - old) / self.window
+            self.m2 += (x - old) * (x - mean + old - self.mean)
+            self.mean = mean
+
+    def _resum(self):
+        self.mean = float(self.values.mean())
+        deviations = self.values - self.mean
+        self.m2 = float(np.dot(deviations, deviations))
+
+    def _value(self) -> float:
+        if self.count < self.window or self.window <= self.ddof:
+            return math.nan
+        return math.sqrt(max(self.m2, 0.0) / (self.window - self.ddof))
+
+
+####################################
+# Exponential averages
+####################################
+
+class StreamingEMA(StreamingIndicator):
+    """
+    Exponential average seeded with the mean of the first `window` values.
+
+    Like the batch smoothed(), NaN bars before the first valid one are
+    skipped, NaN bars inside the seed window are left out of its mean, and
+    a later NaN reports NaN for that bar without touching the average.
+    """
+
+    def __init__(self, window: int, alpha: Optional[float] = None):
+        super().__init__()
+        self.window = window
+        self.alpha = 2.0 / (window + 1) if alpha is None else alpha
+        self.count = 0
+        self.seed_total = 0.0
+        self.seed_count = 0
+        self.average = math.nan
+
+    def _save(self):
+        return (self.count, self.seed_total, self.seed_count, self.average, self.value)
+
+    def _restore(self, state):
+        self.count, self.seed_total, self.seed_count, self.average, self.value = state
+
+    def _apply(self, x: float):
+        x = float(x)
+        missing = math.isnan(x)
+        if missing and self.count == 0:
+            return
+        self.count += 1
+        if self.count <= self.window:
+            if not missing:
+                self.seed_total += x
+                self.seed_count += 1
+            if self.count == self.window and self.seed_count:
+                self.average = self.seed_total / self.seed_count
+                self.value = self.average
+            return
+        if missing:
+            self.value = math.nan
+            return
+        self.average = x if math.isnan(self.average) else self.average + self.alpha * (x - self.average)
+        self.value = self.average
+
+
+class StreamingWilder(StreamingEMA):
+    """Wilder's moving average (alpha = 1 / window)."""
+
+    def __init__(self, window: int):
+        super().__init__(window, alpha=1.0 / window)
+
+
+class StreamingRSI(StreamingIndicator):
+    """Relative Strength Index with Wilder smoothing of gains and losses."""
+
+    def __init__(self, window: int = 14):
+        super().__init__()
+        self.gains = StreamingWilder(window)
+        self.losses = StreamingWilder(window)
+        self.previous = None
+
+    def _save(self):
+        return (self.previous, self.gains._save(), self.losses._save(), self.value)
+
+    def _restore(self, state):
+        self.previous, gains, losses, self.value = state
+        self.gains._restore(gains)
+        self.losses._restore(losses)
+
+    def _apply(self, close: float):
+        close = float(close)
+        if self.previous is not None:
+            delta = close - self.previous
+            gain = self.gains._apply_value(max(delta, 0.0))
+            loss = self.losses._apply_value(max(-delta, 0.0))
+            if math.isnan(gain):
+                self.value = math.nan
+            elif loss == 0:
+                self.value = 50.0 if gain == 0 else 100.0
+            else:
+                self.value = 100 - 100 / (1 + gain / loss)
+        self.previous = close
+
+
+class StreamingATR(StreamingIndicator):
+    """Average True Range with Wilder smoothing; the first bar's range is high - low."""
+
+    def __init__(self, window: int = 14):
+        super().__init__()
+        self.average = StreamingWilder(window)
+        self.previous_close = None
+
+    def _save(self):
+        return (self.previous_close, self.average._save(), self.value)
+
+    def _restore(self, state):
+        self.previous_close, average, self.value = state
+        self.average._restore(average)
+
+    def _apply(self, high: float, low: float, close: float):
+        high, low, close = float(high), float(low), float(close)
+        true_range = high - low
+        if self.previous_close is not None:
+            true_range = max(true_range, abs(high - self.previous_close), abs(low - self.previous_close))
+        self.value = self.average._apply_value(true_range)
+        self.previous_close = close
+
+
+####################################
+# Drawdown
+####################################
+
+class RunningDrawdown(StreamingIndicator):
+    """Maximum drawdown (percent below the running peak) seen so far; `drawdown` is the current one."""
+
+    def __init__(self):
+        super().__init__()
+        self.peak = math.nan
+        self.drawdown = 0.0
+        self.value = 0.0
+
+    def _save(self):
+        return (self.peak, self.drawdown, self.value)
+
+    def _restore(self, state):
+        self.peak, self.drawdown, self.value = state
+
+    def _apply(self, close: float):
+        close = float(close)
+        if math.isnan(self.peak) or close > self.peak:
+            self.peak = close
+        self.drawdown = (self.peak - close) / self.peak * 100 if self.peak else 0.0
+        self.value = max(self.value, self.drawdown)
+
+
+####################################
+# Per-ticker bundle
+####################################
+
+# Indicators LiveIndicators can track; a trailing _N sets the window
+STREAMING_INDICATORS = {
+    "sma": (RollingSMA, 20),
+    "ema": (StreamingEMA, 20),
+    "rsi": (StreamingRSI, 14),
+    "std": (RollingStd, 20),
+    "atr": (StreamingATR, 14),
+    "drawdown": (RunningDrawdown, None),
+}
+
+# Bar fields each indicator reads
+STREAMING_INPUTS = {
+    "atr": ("high", "low", "close"),
+}
+
+DEFAULT_STREAMING_INDICATORS = ("sma_20", "ema_12", "ema_26", "rsi_14", "std_20", "atr_14", "drawdown")
+
+
+class LiveIndicators:
+    """
+    Streaming indicators for one ticker.
+
+    push() takes each bar with its timestamp: a timestamp equal to the last
+    one revises that bar, a later one appends a new bar, and an earlier one
+    is ignored.
+    """
+
+    def __init__(self, indicators: Iterable[str] = DEFAULT_STREAMING_INDICATORS):
+        self.indicators: Dict[str, StreamingIndicator] = {}
+        self.inputs: Dict[str, tuple] = {}
+        for spec in indicators:
+            name, _, window = spec.strip().lower().partition("_")
+            if name not in STREAMING_INDICATORS:
+                raise ValueError(f"Unknown streaming indicator '{spec}', expected one of: {', '.join(STREAMING_INDICATORS)}")
+            cls, default = STREAMING_INDICATORS[name]
+            if default is None:
+                if window:
+                    raise ValueError(f"Invalid window in indicator '{spec}'")
+                self.indicators[name] = cls()
+            else:
+                if window and (not window.isdigit() or int(window) < 1):
+                    raise ValueError(f"Invalid window in indicator '{spec}'")
+                size = int(window) if window else default
+                self.indicators[f"{name}_{size}"] = cls(size)
+            self.inputs[list(self.indicators)[-1]] = STREAMING_INPUTS.get(name, ("close",))
+        self.last_ts = None
+        self.bars = 0
+
+    def push(self, ts, bar: Dict[str, float]) -> Dict[str, Optional[float]]:
+        """Apply one bar (a dict with close, and high/low for ATR) and return the current values."""
+        if self.last_ts is not None and ts < self.last_ts:
+            return self.values()
+        revise = ts == self.last_ts
+        for name, indicator in self.indicators.items():
+            args = [bar[field] for field in self.inputs[name]]
+            if revise:
+                indicator.revise(*args)
+            else:
+                indicator.update(*args)
+        if not revise:
+            self.bars += 1
+        self.last_ts = ts
+        return self.values()
+
+    def warm_up(self, ts: Iterable, bars: Dict[str, np.ndarray]) -> Dict[str, Optional[float]]:
+        """Feed a history of bars (parallel arrays) before switching to live pushes."""
+        fields = sorted({field for inputs in self.inputs.values() for field in inputs})
+        for position, stamp in enumerate(ts):
+            self.push(stamp, {field: bars[field][position] for field in fields})
+        return self.values()
+
+    def values(self) -> Dict[str, Optional[float]]:
+        """Current value of every indicator; None until its window is full."""
+        return {
+            name: (None if math.isnan(indicator.value) else indicator.value)
+            for name, indicator in self.indicators.items()
+        }
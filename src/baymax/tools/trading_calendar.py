@@ -0,0 +1,254 @@
+"""
+Exchange trading calendars for SSE/SZSE, HKEX and NYSE/Nasdaq.
+
+History windows used to be padded with calendar days ("days_back * 2 for
+weekends/holidays"), which over-fetches most of the year and still falls
+short around long closures such as Chinese New Year. With a calendar, a
+window is sized as an exact number of trading sessions, and caches can tell
+whether a new bar can exist at all (nothing changes over a weekend).
+
+NYSE holidays follow fixed rules and are computed for any year. SSE/SZSE and
+HKEX holidays follow the lunar calendar and government announcements, so
+they come from the published schedules below; years not listed fall back to
+weekends plus the fixed-date holidays, which can only make a window a few
+sessions longer than needed.
+"""
+
+from datetime import date, datetime, time as dtime, timedelta
+from functools import lru_cache
+from typing import Dict, FrozenSet, List, Optional
+from zoneinfo import ZoneInfo
+
+####################################
+# Exchange data
+####################################
+
+# Exchange time zone per market
+MARKET_TIMEZONES = {
+    "CN": ZoneInfo("Asia/Shanghai"),
+    "HK": ZoneInfo("Asia/Hong_Kong"),
+    "US": ZoneInfo("America/New_York"),
+}
+
+# Regular session open and close (closing auction included) in exchange time
+SESSION_HOURS = {
+    "CN": (dtime(9, 30), dtime(15, 0)),
+    "HK": (dtime(9, 30), dtime(16, 10)),
+    "US": (dtime(9, 30), dtime(16, 0)),
+}
+
+# SSE/SZSE weekday closures as published by the exchanges
+CN_HOLIDAYS = {
+    2024: ["01-01", "02-09", "02-12", "02-13", "02-14", "02-15", "02-16", "04-04", "04-05",
+           "05-01", "05-02", "05-03", "06-10", "09-16", "09-17", "10-01", "10-02", "10-03",
+           "10-04", "10-07"],
+    2025: ["01-01", "01-28", "01-29", "01-30", "01-31", "02-03", "02-04", "04-04", "05-01",
+           "05-02", "05-05", "06-02", "10-01", "10-02", "10-03", "10-06", "10-07", "10-08"],
+    2026: ["01-01", "01-02", "02-16", "02-17", "02-18", "02-19", "02-20", "02-23", "04-06",
+           "05-01", "05-04", "05-05", "06-19", "09-25", "10-01", "10-02", "10-05", "10-06",
+           "10-07"],
+}
+
+# HKEX weekday closures as published by the exchange
+HK_HOLIDAYS = {
+    2024: ["01-01", "02-12", "02-13", "03-29", "04-01", "04-04", "05-01", "05-15", "06-10",
+           "07-01", "09-18", "10-01", "10-11", "12-25", "12-26"],
+    2025: ["01-01", "01-29", "01-30", "01-31", "04-04", "04-18", "04-21", "05-01", "05-05",
+           "07-01", "10-01", "10-07", "10-29", "12-25", "12-26"],
+    2026: ["01-01", "02-17", "02-18", "02-19", "04-03", "04-06", "04-07", "05-01", "05-25",
+           "06-19", "07-01", "10-01", "10-19", "12-25"],
+}
+
+# Fixed-date holidays assumed for years without a published schedule
+FALLBACK_FIXED_HOLIDAYS = {
+    "CN": ["01-01", "05-01", "10-01", "10-02", "10-03"],
+    "HK": ["01-01", "05-01", "07-01", "10-01", "12-25"],
+}
+
+# One-off NYSE closures not covered by the rules
+US_SPECIAL_CLOSURES = ["2025-01-09"]
+
+
+####################################
+# Holiday rules
+####################################
+
+def easter_sunday(year: int) -> date:
+    """Gregorian Easter Sunday (anonymous Gregorian algorithm)."""
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+
+def _nth_weekday(year: int, month: int, weekday: int, n: int) -> date:
+    """n-th given weekday of a month; n = -1 is the last one."""
+    if n > 0:
+        first = date(year, month, 1)
+        return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+    last = date(year + month // 12, month % 12 + 1, 1) - timedelta(days=1)
+    return last - timedelta(days=(last.weekday() - weekday) % 7)
+
+
+def _observed(day: date) -> date:
+    """NYSE observance: Saturday holidays move to Friday, Sunday holidays to Monday."""
+    if day.weekday() == 5:
+        return day - timedelta(days=1)
+    if day.weekday() == 6:
+        return day + timedelta(days=1)
+    return day
+
+
+def us_holidays(year: int) -> List[date]:
+    """NYSE/Nasdaq full-day holidays for a year."""
+    holidays = [
+        _nth_weekday(year, 1, 0, 3),            # Martin Luther King Jr. Day
+        _nth_weekday(year, 2, 0, 3),            # Washington's Birthday
+        easter_sunday(year) - timedelta(days=2),  # Good Friday
+        _nth_weekday(year, 5, 0, -1),           # Memorial Day
+        _observed(date(year, 7, 4)),            # Independence Day
+        _nth_weekday(year, 9, 0, 1),            # Labor Day
+        _nth_weekday(year, 11, 3, 4),           # Thanksgiving
+        _observed(date(year, 12, 25)),          # Christmas
+    ]
+    # New Year's Day on a Saturday is not observed on the Friday before
+    new_year = date(year, 1, 1)
+    if new_year.weekday() != 5:
+        holidays.append(_observed(new_year))
+    if year >= 2022:
+        holidays.append(_observed(date(year, 6, 19)))  # Juneteenth
+    holidays.extend(d for d in map(date.fromisoformat, US_SPECIAL_CLOSURES) if d.year == year)
+    return sorted(holidays)
+
+
+@lru_cache(maxsize=None)
+def holidays_for(market: str, year: int) -> FrozenSet[date]:
+    """Weekday closures of a market in a year."""
+    if market == "US":
+        return frozenset(us_holidays(year))
+    published = (CN_HOLIDAYS if market == "CN" else HK_HOLIDAYS).get(year)
+    days = published if published is not None else FALLBACK_FIXED_HOLIDAYS.get(market, [])
+    return frozenset(date.fromisoformat(f"{year}-{day}") for day in days)
+
+
+####################################
+# Calendar
+####################################
+
+class TradingCalendar:
+    """Trading sessions of one market."""
+
+    def __init__(self, market: str):
+        self.market = market if market in MARKET_TIMEZONES else "CN"
+        self.timezone = MARKET_TIMEZONES[self.market]
+        self.open_time, self.close_time = SESSION_HOURS[self.market]
+
+    def is_session(self, day: date) -> bool:
+        """True if the exchange trades on this day."""
+        return day.weekday() < 5 and day not in holidays_for(self.market, day.year)
+
+    def sessions(self, start: date, end: date) -> List[date]:
+        """Trading days between start and end (inclusive)."""
+        days = []
+        day = start
+        while day <= end:
+            if self.is_session(day):
+                days.append(day)
+            day += timedelta(days=1)
+        return days
+
+    def previous_session(self, day: date) -> date:
+        """Latest trading day on or before `day`."""
+        while not self.is_session(day):
+            day -= timedelta(days=1)
+        return day
+
+    def next_session(self, day: date) -> date:
+        """Earliest trading day on or after `day`."""
+        while not self.is_session(day):
+            day += timedelta(days=1)
+        return day
+
+    def sessions_back(self, end: date, count: int) -> date:
+        """First day of the window holding the last `count` sessions up to `end`."""
+        day = self.previous_session(end)
+        for _ in range(max(count, 1) - 1):
+            day = self.previous_session(day - timedelta(days=1))
+        return day
+
+    def now(self) -> datetime:
+        """Current time at the exchange."""
+        return datetime.now(self.timezone)
+
+    def today(self) -> date:
+        """Current date at the exchange."""
+        return self.now().date()
+
+    def is_open(self, at: Optional[datetime] = None) -> bool:
+        """True during a regular session."""
+        at = (at or self.now()).astimezone(self.timezone)
+        return self.is_session(at.date()) and self.open_time <= at.time() < self.close_time
+
+    def newest_session(self, at: Optional[datetime] = None) -> date:
+        """Latest session that has opened, i.e. the newest one that can have a bar upstream."""
+        at = (at or self.now()).astimezone(self.timezone)
+        day = at.date()
+        if self.is_session(day) and at.time() >= self.open_time:
+            return day
+        return self.previous_session(day - timedelta(days=1))
+
+    def window_start(self, count: int, at: Optional[datetime] = None) -> date:
+        """
+        First day of the window holding the last `count` sessions that have a
+        bar, counting back from newest_session() so the pre-open does not count today.
+        """
+        return self.sessions_back(self.newest_session(at), count)
+
+    def last_close(self, at: Optional[datetime] = None) -> datetime:
+        """Close of the most recent session that has finished."""
+        at = (at or self.now()).astimezone(self.timezone)
+        day = at.date()
+        if not (self.is_session(day) and at.time() >= self.close_time):
+            day = self.previous_session(day - timedelta(days=1))
+        return datetime.combine(day, self.close_time, self.timezone)
+
+    def settled_through(self, period: str = "daily", at: Optional[datetime] = None) -> date:
+        """
+        Latest date up to which no bar of the given period can still change.
+
+        A daily bar settles when its session closes; a weekly or monthly bar
+        once the last session of its week or month has closed.
+        """
+        at = (at or self.now()).astimezone(self.timezone)
+        today = at.date()
+        today_pending = self.is_session(today) and at.time() < self.close_time
+        if period == "daily":
+            return today - timedelta(days=1) if today_pending else today
+
+        if period == "weekly":
+            period_start = today - timedelta(days=today.weekday())
+            period_end = period_start + timedelta(days=6)
+        else:
+            period_start = today.replace(day=1)
+            period_end = date(today.year + today.month // 12, today.month % 12 + 1, 1) - timedelta(days=1)
+        if today_pending or self.sessions(today + timedelta(days=1), period_end):
+            return period_start - timedelta(days=1)
+        return today
+
+
+_calendars: Dict[str, TradingCalendar] = {}
+
+
+def get_calendar(market: str) -> TradingCalendar:
+    """Shared calendar for a market ('CN', 'HK' or 'US')."""
+    calendar = _calendars.get(market)
+    if calendar is None:
+        calendar = _calendars.setdefault(market, TradingCalendar(market))
+    return calendar
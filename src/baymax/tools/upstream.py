@@ -0,0 +1,692 @@
+"""
+Shared entry point for every call the data layer makes to akshare.
+
+Going through call_akshare() instead of calling ak.* directly lets the data
+layer apply cross-cutting policies in one place. Concurrent callers asking
+for the same function with the same arguments are coalesced: the first one
+performs the fetch and the others wait for it and share the result, so a
+burst of identical MCP requests costs a single upstream download.
+
+Timeouts are per call rather than process-wide: `with deadline(seconds):`
+stores a deadline scope in a context variable, and every HTTP request
+akshare makes through `requests` inside that block gets the remaining time
+as its timeout. Unlike socket.setdefaulttimeout, this is isolated per thread
+and per asyncio task, so fetches can run concurrently with their own limits.
+
+Each akshare function also has a circuit breaker fed with rolling error-rate
+and latency stats, one outcome per logical call (retries included). The
+breaker and the retries share one type-based classifier, is_upstream_error():
+only network, HTTP 429/5xx and malformed-response errors count as failures;
+a bad argument or an unexpected response shape is the caller's problem, not
+the endpoint's. Once an endpoint keeps failing its circuit opens and calls
+fail immediately with CircuitOpenError, so the fallback chains move on
+without paying timeouts; after a cool-down a single probe call is let
+through to detect recovery. health_table() exposes the stats.
+
+Transient failures are retried by one RetryPolicy: exponential backoff with
+full jitter, capped per delay and in total, and never past the caller's
+deadline. Retries also draw from a process-wide RetryBudget, so a throttled
+upstream sees a bounded trickle of retries instead of a synchronized storm.
+
+Bulk jobs can cap their request rate per upstream host with
+`with rate_limit(per_second):`; like deadlines, the scope lives in a context
+variable and covers every call (retries included) made inside it.
+"""
+
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+import akshare as ak
+import pandas as pd
+import requests
+
+####################################
+# Configuration
+####################################
+
+# Rolling window the breaker looks at, in seconds
+CIRCUIT_WINDOW_SECONDS = float(os.getenv("BAYMAX_CIRCUIT_WINDOW", "60"))
+
+# Calls needed in the window before the error rate can open the circuit
+CIRCUIT_MIN_CALLS = int(os.getenv("BAYMAX_CIRCUIT_MIN_CALLS", "4"))
+
+# Error rate in the window that opens the circuit
+CIRCUIT_ERROR_RATE = float(os.getenv("BAYMAX_CIRCUIT_ERROR_RATE", "0.5"))
+
+# Seconds an open circuit rejects calls before letting a probe through
+CIRCUIT_OPEN_SECONDS = float(os.getenv("BAYMAX_CIRCUIT_OPEN_SECONDS", "30"))
+
+# Attempts per akshare call, including the first one
+RETRY_MAX_ATTEMPTS = int(os.getenv("BAYMAX_RETRY_MAX_ATTEMPTS", "3"))
+
+# Backoff before retry n is drawn uniformly from [0, min(max_delay, base_delay * 2**n)]
+RETRY_BASE_DELAY = float(os.getenv("BAYMAX_RETRY_BASE_DELAY", "0.5"))
+RETRY_MAX_DELAY = float(os.getenv("BAYMAX_RETRY_MAX_DELAY", "4"))
+
+# Total seconds one call may spend retrying
+RETRY_MAX_ELAPSED = float(os.getenv("BAYMAX_RETRY_MAX_ELAPSED", "10"))
+
+# Error types that mean the endpoint failed or cut off a response; HTTP errors are judged by status
+UPSTREAM_ERROR_TYPES = (
+    requests.exceptions.ConnectionError,
+    requests.exceptions.Timeout,
+    requests.exceptions.ChunkedEncodingError,
+    json.JSONDecodeError,
+    ConnectionError,
+    TimeoutError,
+)
+
+# Retry budget: each call earns this fraction of a retry, plus a steady trickle per second
+RETRY_BUDGET_RATIO = float(os.getenv("BAYMAX_RETRY_BUDGET_RATIO", "0.2"))
+RETRY_BUDGET_PER_SECOND = float(os.getenv("BAYMAX_RETRY_BUDGET_PER_SECOND", "1"))
+RETRY_BUDGET_MAX_TOKENS = float(os.getenv("BAYMAX_RETRY_BUDGET_MAX_TOKENS", "20"))
+
+
+####################################
+# Per-call deadlines
+####################################
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when an akshare call cannot finish before the caller's deadline."""
+
+
+class Deadline:
+    """
+    A cancellable time budget shared by everything running in its context.
+
+    The effective budget is the tighter of this scope and its enclosing one,
+    so cancelling or expiring an outer scope also stops the inner ones.
+    """
+
+    def __init__(self, seconds: Optional[float], parent: Optional["Deadline"] = None):
+        self.expires = None if seconds is None else time.monotonic() + seconds
+        self.parent = parent
+        self.cancelled = False
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left, 0 once cancelled, or None if unbounded."""
+        if self.cancelled:
+            return 0.0
+        remaining = None if self.expires is None else self.expires - time.monotonic()
+        if self.parent is not None:
+            outer = self.parent.remaining()
+            if outer is not None and (remaining is None or outer < remaining):
+                remaining = outer
+        return remaining
+
+    def cancel(self):
+        """Make every further akshare call in this scope fail fast."""
+        self.cancelled = True
+
+    def is_cancelled(self) -> bool:
+        """Whether this scope or an enclosing one was cancelled."""
+        return self.cancelled or (self.parent is not None and self.parent.is_cancelled())
+
+
+# Innermost deadline scope of the current thread / asyncio task, or None
+_deadline: ContextVar[Optional[Deadline]] = ContextVar("akshare_deadline", default=None)
+
+
+@contextmanager
+def deadline(seconds: Optional[float]):
+    """
+    Bound all akshare calls made inside the block to `seconds` in total.
+
+    Yields the Deadline scope, which can be cancelled from another thread.
+    Nested deadlines can only tighten the outer one. Worker threads do not
+    inherit context variables automatically; submit work with
+    contextvars.copy_context().run to carry the deadline along.
+    """
+    scope = Deadline(seconds, _deadline.get())
+    token = _deadline.set(scope)
+    try:
+        yield scope
+    finally:
+        _deadline.reset(token)
+
+
+def remaining_time() -> Optional[float]:
+    """Seconds left before the current deadline, or None if there is none."""
+    scope = _deadline.get()
+    if scope is None:
+        return None
+    return scope.remaining()
+
+
+def check_deadline(what: str = "akshare call"):
+    """Raise DeadlineExceeded if the current deadline has already passed."""
+    remaining = remaining_time()
+    if remaining is not None and remaining <= 0:
+        raise DeadlineExceeded(f"Deadline exceeded before {what}")
+
+
+def caller_gave_up(error: Optional[BaseException] = None) -> bool:
+    """
+    Whether a failure came from the current caller's own deadline or
+    cancellation rather than from upstream.
+    """
+    if isinstance(error, DeadlineExceeded):
+        return True
+    remaining = remaining_time()
+    return remaining is not None and remaining <= 0
+
+
+_original_session_request = requests.Session.request
+
+
+def _request_with_deadline(self, method, url, **kwargs):
+    remaining = remaining_time()
+    if remaining is not None:
+        if remaining <= 0:
+            raise DeadlineExceeded(f"Deadline exceeded before {method} {url}")
+        timeout = kwargs.get("timeout")
+        if timeout is None or (isinstance(timeout, (int, float)) and timeout > remaining):
+            kwargs["timeout"] = remaining
+    return _original_session_request(self, method, url, **kwargs)
+
+
+# akshare fetches through requests without timeouts; give every request the caller's remaining time
+requests.Session.request = _request_with_deadline
+
+####################################
+# Circuit breakers and health
+####################################
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an endpoint whose circuit is open."""
+
+
+class EndpointHealth:
+    """Circuit breaker and rolling stats for one akshare function."""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str):
+        self.name = name
+        self.state = self.CLOSED
+        self.opened_at: Optional[float] = None
+        self.probe_in_flight = False
+        self.outcomes: deque = deque()  # (timestamp, ok, latency_seconds)
+        self.total_calls = 0
+        self.total_failures = 0
+        self.total_rejected = 0
+        self.total_retries = 0
+        self.retry_wait_seconds = 0.0
+        self.retries_denied = 0
+        self.last_error: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Whether a call may go upstream now; an open circuit admits one probe after the cool-down."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.time() - self.opened_at >= CIRCUIT_OPEN_SECONDS:
+                self.state = self.HALF_OPEN
+                self.probe_in_flight = False
+            if self.state == self.HALF_OPEN and not self.probe_in_flight:
+                self.probe_in_flight = True
+                return True
+            self.total_rejected += 1
+            return False
+
+    def retry_after(self) -> float:
+        """Seconds until an open circuit admits a probe; 0 if calls may go through."""
+        with self._lock:
+            if self.state != self.OPEN:
+                return 0.0
+            return max(0.0, CIRCUIT_OPEN_SECONDS - (time.time() - self.opened_at))
+
+    def record(self, ok: bool, latency: float, error: Optional[BaseException] = None):
+        """Add the outcome of one logical call (retries included) and update the circuit state."""
+        now = time.time()
+        with self._lock:
+            self.total_calls += 1
+            if not ok:
+                self.total_failures += 1
+                self.last_error = str(error)[:200] if error is not None else None
+            self.outcomes.append((now, ok, latency))
+            self._prune(now)
+
+            if self.state == self.HALF_OPEN:
+                self.probe_in_flight = False
+                if ok:
+                    # Recovered: judge the endpoint from here on, not by its outage
+                    self.state = self.CLOSED
+                    self.outcomes = deque([self.outcomes[-1]])
+                else:
+                    self._open(now)
+            elif self.state == self.CLOSED and not ok:
+                failures = sum(1 for _, outcome_ok, _ in self.outcomes if not outcome_ok)
+                if len(self.outcomes) >= CIRCUIT_MIN_CALLS and failures / len(self.outcomes) >= CIRCUIT_ERROR_RATE:
+                    self._open(now)
+
+    def record_retry(self, wait_seconds: float):
+        with self._lock:
+            self.total_retries += 1
+            self.retry_wait_seconds += wait_seconds
+
+    def record_retry_denied(self):
+        with self._lock:
+            self.retries_denied += 1
+
+    def abandon(self):
+        """Forget a call whose outcome says nothing about the endpoint, freeing the probe slot."""
+        with self._lock:
+            self.probe_in_flight = False
+
+    def _open(self, now: float):
+        self.state = self.OPEN
+        self.opened_at = now
+        print(f"⚠ Circuit opened for {self.name}: {self.last_error}")
+
+    def _prune(self, now: float):
+        while self.outcomes and now - self.outcomes[0][0] > CIRCUIT_WINDOW_SECONDS:
+            self.outcomes.popleft()
+
+    def snapshot(self) -> dict:
+        """Current state and rolling-window stats as a plain dict."""
+        with self._lock:
+            self._prune(time.time())
+            latencies = sorted(latency for _, _, latency in self.outcomes)
+            failures = sum(1 for _, ok, _ in self.outcomes if not ok)
+            return {
+                "endpoint": self.name,
+                "state": self.state,
+                "window_calls": len(self.outcomes),
+                "window_error_rate": round(failures / len(self.outcomes), 3) if self.outcomes else 0.0,
+                "latency_p50_ms": _percentile_ms(latencies, 0.5),
+                "latency_p95_ms": _percentile_ms(latencies, 0.95),
+                "total_calls": self.total_calls,
+                "total_failures": self.total_failures,
+                "total_rejected": self.total_rejected,
+                "total_retries": self.total_retries,
+                "retry_wait_ms": round(self.retry_wait_seconds * 1000),
+                "retries_denied_by_budget": self.retries_denied,
+                "opened_at": datetime.fromtimestamp(self.opened_at).isoformat() if self.opened_at and self.state != self.CLOSED else None,
+                "last_error": self.last_error,
+            }
+
+
+def is_upstream_error(error: BaseException) -> bool:
+    """
+    Whether an error says something about the endpoint, judged by its type:
+    an HTTP 429 or 5xx, a connection failure or timeout, a response cut off
+    mid-body, or a body that is not the JSON the endpoint promised. Errors
+    raised by our own code or arguments (TypeError, KeyError on a bad
+    symbol, an HTTP 404, ...) do not.
+    """
+    if isinstance(error, (CircuitOpenError, DeadlineExceeded)):
+        return False
+    if isinstance(error, requests.exceptions.HTTPError):
+        status = getattr(error.response, "status_code", None)
+        return status is not None and (status == 429 or status >= 500)
+    return isinstance(error, UPSTREAM_ERROR_TYPES)
+
+
+def _percentile_ms(sorted_values: List[float], fraction: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    position = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return round(sorted_values[position] * 1000, 1)
+
+
+class HealthRegistry:
+    """EndpointHealth per akshare function, created on first use."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints: Dict[str, EndpointHealth] = {}
+
+    def get(self, name: str) -> EndpointHealth:
+        with self._lock:
+            endpoint = self._endpoints.get(name)
+            if endpoint is None:
+                endpoint = self._endpoints[name] = EndpointHealth(name)
+            return endpoint
+
+    def table(self) -> List[dict]:
+        with self._lock:
+            endpoints = list(self._endpoints.values())
+        return [endpoint.snapshot() for endpoint in sorted(endpoints, key=lambda e: e.name)]
+
+
+health_registry = HealthRegistry()
+
+
+def health_table() -> List[dict]:
+    """Health and circuit state of every akshare endpoint used so far."""
+    return health_registry.table()
+
+
+####################################
+# Retries
+####################################
+
+class RetryPolicy:
+    """Exponential backoff with full jitter, bounded per delay, in attempts and in total time."""
+
+    def __init__(self, max_attempts: int = RETRY_MAX_ATTEMPTS, base_delay: float = RETRY_BASE_DELAY,
+                 max_delay: float = RETRY_MAX_DELAY, max_elapsed: float = RETRY_MAX_ELAPSED):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_elapsed = max_elapsed
+
+    def backoff(self, retry_number: int) -> float:
+        """Delay before the given retry (1 = first retry)."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** (retry_number - 1))))
+
+    def is_retryable(self, error: BaseException) -> bool:
+        """
+        Errors is_upstream_error() blames on the endpoint are retried.
+        ValueError/KeyError are almost always a bad symbol or a changed schema,
+        which a retry cannot fix.
+        """
+        return is_upstream_error(error)
+
+
+class RetryBudget:
+    """
+    Process-wide token bucket that limits retries relative to traffic.
+
+    Every call deposits `ratio` tokens and tokens also accrue at
+    `per_second`; each retry spends one. When upstream is throttling every
+    caller, retries dry up instead of multiplying the load.
+    """
+
+    def __init__(self, ratio: float = RETRY_BUDGET_RATIO, per_second: float = RETRY_BUDGET_PER_SECOND,
+                 max_tokens: float = RETRY_BUDGET_MAX_TOKENS):
+        self.ratio = ratio
+        self.per_second = per_second
+        self.max_tokens = max_tokens
+        self.tokens = max_tokens
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.max_tokens, self.tokens + (now - self._updated) * self.per_second)
+        self._updated = now
+
+    def record_call(self):
+        with self._lock:
+            self._refill()
+            self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        with self._lock:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            self._refill()
+            return {"tokens": round(self.tokens, 2), "max_tokens": self.max_tokens, "ratio": self.ratio, "per_second": self.per_second}
+
+
+DEFAULT_RETRY_POLICY = RetryPolicy()
+retry_budget = RetryBudget()
+
+
+def sleep_within_deadline(seconds: float) -> bool:
+    """Sleep unless that would overrun the current deadline; returns whether it slept."""
+    remaining = remaining_time()
+    if remaining is not None and remaining <= seconds:
+        return False
+    time.sleep(seconds)
+    return True
+
+
+####################################
+# Per-host rate limits
+####################################
+
+# Upstream host behind each akshare function, for per-host rate limits
+ENDPOINT_HOSTS = {
+    "stock_zh_a_hist": "push2his.eastmoney.com",
+    "stock_hk_hist": "push2his.eastmoney.com",
+    "stock_us_hist": "push2his.eastmoney.com",
+    "stock_zh_a_hist_min_em": "push2his.eastmoney.com",
+    "stock_hk_hist_min_em": "push2his.eastmoney.com",
+    "stock_us_hist_min_em": "push2his.eastmoney.com",
+    "stock_zh_a_spot_em": "push2.eastmoney.com",
+    "stock_hk_spot_em": "push2.eastmoney.com",
+    "stock_us_spot_em": "push2.eastmoney.com",
+}
+
+
+class RateLimiter:
+    """Token bucket allowing `per_second` calls on average and bursts of `burst`."""
+
+    def __init__(self, per_second: float, burst: Optional[float] = None):
+        self.per_second = per_second
+        self.burst = burst if burst is not None else max(1.0, per_second)
+        self.tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a call is allowed, or raise DeadlineExceeded if that would overrun the deadline."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.per_second)
+                self._updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait_time = (1 - self.tokens) / self.per_second
+            if not sleep_within_deadline(wait_time):
+                raise DeadlineExceeded("Deadline exceeded while waiting for the rate limit")
+
+
+class HostRateLimits:
+    """One RateLimiter per upstream host, created on first use."""
+
+    def __init__(self, per_second: float):
+        self.per_second = per_second
+        self._limiters: Dict[str, RateLimiter] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, func_name: str):
+        host = ENDPOINT_HOSTS.get(func_name, func_name)
+        with self._lock:
+            limiter = self._limiters.setdefault(host, RateLimiter(self.per_second))
+        limiter.acquire()
+
+
+# Rate limits of the current thread / asyncio task, or None for unlimited
+_rate_limits: ContextVar[Optional[HostRateLimits]] = ContextVar("akshare_rate_limits", default=None)
+
+
+@contextmanager
+def rate_limit(per_second: Optional[float]):
+    """
+    Cap akshare calls made inside the block at `per_second` per upstream host.
+
+    The limits are shared by every thread that runs in the block's context
+    (submit work with contextvars.copy_context().run); None or 0 lifts them.
+    """
+    limits = HostRateLimits(per_second) if per_second else None
+    token = _rate_limits.set(limits)
+    try:
+        yield limits
+    finally:
+        _rate_limits.reset(token)
+
+
+####################################
+# Single-flight coalescing
+####################################
+
+class _InFlightCall:
+    """One running fetch and the callers waiting for it."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException = None
+        self.abandoned = False  # the leader gave up; the fetch itself did not fail
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time; concurrent callers share its outcome.
+
+    The leader runs the call under its own deadline. If that deadline expires
+    or the leader is cancelled, its error is not handed to the waiters, who
+    each honour their own deadline: one of them takes over as the new leader.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _InFlightCall] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                leader = call is None
+                if leader:
+                    call = _InFlightCall()
+                    self._calls[key] = call
+                else:
+                    call.waiters += 1
+            if leader:
+                break
+
+            # Each waiter honours its own deadline, not the leader's
+            remaining = remaining_time()
+            if not call.done.wait(None if remaining is None else max(remaining, 0)):
+                raise DeadlineExceeded("Deadline exceeded waiting for an in-flight akshare call")
+            if call.abandoned:
+                check_deadline("taking over an abandoned akshare call")
+                continue
+            if call.error is not None:
+                raise call.error
+            return _share(call.result)
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            if caller_gave_up(e):
+                call.abandoned = True
+            else:
+                call.error = e
+            raise
+        finally:
+            # Later callers start a fresh fetch rather than reusing this result
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def in_flight(self) -> int:
+        """Number of keys currently being fetched."""
+        with self._lock:
+            return len(self._calls)
+
+
+def _share(result: Any) -> Any:
+    """Give each waiter its own DataFrame; callers rename and sort in place."""
+    if isinstance(result, (pd.DataFrame, pd.Series)):
+        return result.copy()
+    return result
+
+
+_flight = SingleFlight()
+
+
+####################################
+# akshare calls
+####################################
+
+def call_akshare(func_name: str, *args, retry_policy: Optional[RetryPolicy] = None, **kwargs) -> Any:
+    """
+    Call ak.<func_name>(*args, **kwargs), coalescing identical concurrent calls.
+
+    The call is bounded by the enclosing deadline(), if any, and raises
+    CircuitOpenError without touching the network while the endpoint's
+    circuit is open. Transient failures are retried per `retry_policy`.
+
+    Args:
+        func_name: Name of the akshare function, e.g. 'stock_zh_a_hist'
+        *args, **kwargs: Arguments forwarded to the function; they form the coalescing key
+        retry_policy: Overrides DEFAULT_RETRY_POLICY for this call
+
+    Returns:
+        Whatever the akshare function returns
+    """
+    check_deadline(func_name)
+    key = (func_name, args, tuple(sorted(kwargs.items())))
+    return _flight.do(key, lambda: _call_with_breaker(func_name, args, kwargs, retry_policy or DEFAULT_RETRY_POLICY))
+
+
+def _call_with_breaker(func_name: str, args: tuple, kwargs: dict, policy: RetryPolicy) -> Any:
+    """Run one logical call through the endpoint's circuit breaker, which records its single outcome."""
+    endpoint = health_registry.get(func_name)
+    if not endpoint.allow():
+        raise CircuitOpenError(f"Circuit open for {func_name}; skipping upstream call")
+
+    start = time.monotonic()
+    try:
+        result = _call_with_retries(func_name, args, kwargs, policy)
+    except Exception as e:
+        # A caller-side error, or a caller giving up (hedging cancelled it), says nothing about the endpoint
+        scope = _deadline.get()
+        if is_upstream_error(e) and not (scope is not None and scope.is_cancelled()):
+            endpoint.record(False, time.monotonic() - start, e)
+        else:
+            endpoint.abandon()
+        raise
+    endpoint.record(True, time.monotonic() - start)
+    return result
+
+
+def _call_with_retries(func_name: str, args: tuple, kwargs: dict, policy: RetryPolicy) -> Any:
+    """Run one logical call, retrying transient failures within the policy, budget and deadline."""
+    endpoint = health_registry.get(func_name)
+    retry_budget.record_call()
+    started = time.monotonic()
+
+    for attempt in range(1, policy.max_attempts + 1):
+        try:
+            return _rate_limited_call(func_name, args, kwargs)
+        except Exception as e:
+            if attempt == policy.max_attempts or not policy.is_retryable(e):
+                raise
+
+            delay = policy.backoff(attempt)
+            if time.monotonic() - started + delay > policy.max_elapsed:
+                raise
+            if not retry_budget.try_spend():
+                endpoint.record_retry_denied()
+                raise
+            if not sleep_within_deadline(delay):
+                raise
+
+            endpoint.record_retry(delay)
+            print(f"↻ Retrying {func_name} (attempt {attempt + 1}/{policy.max_attempts}) after {delay:.2f}s: {e}")
+
+
+def _rate_limited_call(func_name: str, args: tuple, kwargs: dict) -> Any:
+    """Run one upstream attempt through the per-host rate limit."""
+    limits = _rate_limits.get()
+    if limits is not None:
+        limits.acquire(func_name)
+    return getattr(ak, func_name)(*args, **kwargs)
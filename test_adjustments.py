@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Locally applied qfq/hfq adjustment on a synthetic ex-date, and the fallback
+to unadjusted bars when neither the factor table nor upstream's adjusted
+series can be fetched.
+"""
+
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import requests
+
+from baymax.tools import history
+from baymax.tools.adjustments import AdjustmentFactors, adjust_columns
+from baymax.tools.history import HistoryStore
+
+# Mon 2025-06-09 .. Fri 2025-06-13, with a 10% hfq factor step on Wednesday
+DAYS = np.array(["2025-06-09", "2025-06-10", "2025-06-11", "2025-06-12", "2025-06-13"], dtype="datetime64[D]")
+RAW_CLOSE = np.array([10.0, 10.0, 9.2, 9.3, 9.4])
+
+
+def factor_table(*steps) -> AdjustmentFactors:
+    dates = np.array([day for day, _ in steps], dtype="datetime64[D]")
+    return AdjustmentFactors(dates, np.array([factor for _, factor in steps], dtype=np.float64), 0.0)
+
+
+def raw_columns() -> dict:
+    prev_close = np.r_[9.9, RAW_CLOSE[:-1]]
+    return {
+        "date": DAYS,
+        "open": RAW_CLOSE - 0.1,
+        "high": RAW_CLOSE + 0.2,
+        "low": RAW_CLOSE - 0.2,
+        "close": RAW_CLOSE,
+        "volume": np.full(len(DAYS), 1000.0),
+        "change": RAW_CLOSE - prev_close,
+        "change_percent": (RAW_CLOSE - prev_close) / prev_close * 100,
+    }
+
+
+EX_DATE_TABLE = factor_table(("2020-01-02", 1.0), ("2025-06-11", 1.1))
+
+
+####################################
+# adjust_columns
+####################################
+
+def test_hfq_scales_bars_from_the_ex_date():
+    adjusted = adjust_columns(raw_columns(), EX_DATE_TABLE, "hfq")
+    np.testing.assert_allclose(adjusted["close"], RAW_CLOSE * [1, 1, 1.1, 1.1, 1.1])
+    np.testing.assert_allclose(adjusted["high"], (RAW_CLOSE + 0.2) * [1, 1, 1.1, 1.1, 1.1])
+    np.testing.assert_array_equal(adjusted["volume"], raw_columns()["volume"])
+
+
+def test_change_is_recomputed_across_the_ex_date():
+    adjusted = adjust_columns(raw_columns(), EX_DATE_TABLE, "hfq")
+    # The raw series drops 0.8 on the ex-date; adjusted, it is a 1.2% gain
+    np.testing.assert_allclose(adjusted["change"][2], 10.12 - 10.0)
+    np.testing.assert_allclose(adjusted["change_percent"][2], 1.2)
+    np.testing.assert_allclose(adjusted["change"][0], 0.1)
+    np.testing.assert_allclose(adjusted["change"][3:], [0.11, 0.11])
+
+
+def test_qfq_is_anchored_to_the_latest_factor():
+    adjusted = adjust_columns(raw_columns(), EX_DATE_TABLE, "qfq")
+    # The newest bar is unchanged; bars before the ex-date are scaled down
+    np.testing.assert_allclose(adjusted["close"][2:], RAW_CLOSE[2:])
+    np.testing.assert_allclose(adjusted["close"][:2], np.round(RAW_CLOSE[:2] / 1.1, 4))
+
+    # A later ex-date outside the window rescales the whole window
+    later = factor_table(("2020-01-02", 1.0), ("2025-06-11", 1.1), ("2025-09-01", 1.21))
+    adjusted = adjust_columns(raw_columns(), later, "qfq")
+    np.testing.assert_allclose(adjusted["close"], np.round(RAW_CLOSE * np.array([1, 1, 1.1, 1.1, 1.1]) / 1.21, 4))
+
+
+def test_no_adjust_returns_raw_columns():
+    columns = raw_columns()
+    assert adjust_columns(columns, EX_DATE_TABLE, "") is columns
+
+
+####################################
+# Fallback in the history store
+####################################
+
+class FailingFactorStore:
+    def get(self, ticker):
+        raise requests.ConnectionError("factor table unavailable")
+
+
+class StubFactorStore:
+    def get(self, ticker):
+        return EX_DATE_TABLE
+
+
+def raw_frame(market, symbol, period, start, end, adjust=""):
+    if adjust:
+        raise requests.ConnectionError(f"{adjust} bars unavailable")
+    frame = history.columns_to_frame(raw_columns())
+    return frame[(frame["日期"] >= start) & (frame["日期"] <= end)]
+
+
+def test_adjusted_bars_from_local_factors(tmp_path, monkeypatch):
+    monkeypatch.setattr(history, "fetch_history", raw_frame)
+    monkeypatch.setattr(history, "factor_store", StubFactorStore())
+    store = HistoryStore(root=str(tmp_path), enabled=True)
+
+    bars = store.get_bars("CN", "600519", "daily", date(2025, 6, 9), date(2025, 6, 13), adjust="hfq")
+    np.testing.assert_allclose(bars["收盘"].to_numpy(), RAW_CLOSE * [1, 1, 1.1, 1.1, 1.1])
+    assert bars.attrs.get("adjust", "hfq") == "hfq"
+
+
+def test_raw_fallback_when_factors_and_upstream_adjusted_bars_fail(tmp_path, monkeypatch):
+    monkeypatch.setattr(history, "fetch_history", raw_frame)
+    monkeypatch.setattr(history, "factor_store", FailingFactorStore())
+    store = HistoryStore(root=str(tmp_path), enabled=True)
+
+    bars = store.get_bars("CN", "600519", "daily", date(2025, 6, 9), date(2025, 6, 13), adjust="qfq")
+    np.testing.assert_allclose(bars["收盘"].to_numpy(), RAW_CLOSE)
+    assert bars.attrs["adjust"] == ""
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+gather_analysis_data runs its sub-fetches concurrently under one deadline
+and returns whatever finished, listing late or failed sources.
+"""
+
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+import time
+
+import pytest
+
+from baymax.tools import analysis
+from baymax.tools.upstream import remaining_time
+
+PRICE_DATA = [
+    {"date": "2026-10-15", "open": 1490.0, "high": 1510.0, "low": 1480.0, "close": 1500.0, "volume": 1000},
+    {"date": "2026-10-16", "open": 1500.0, "high": 1530.0, "low": 1495.0, "close": 1515.0, "volume": 1200},
+]
+
+HISTORY = {
+    "price_history": {"ticker": "600519", "price_data": PRICE_DATA},
+    "technical_analysis": {"trend": "UP"},
+    "risk_assessment": {"risk_level": "LOW"},
+    "weekly_performance": {"weekly_change_percent": 1.0},
+}
+
+FINANCIALS = {"income_statements": [{"营业收入": 100.0, "净利润": 30.0}, {"营业收入": 90.0, "净利润": 25.0}]}
+
+
+def slow(value, seconds: float, cancelled: list = None):
+    """A sub-fetch that stops early once its deadline scope is cancelled, like an akshare call would."""
+    def fetch(*args):
+        give_up_at = time.monotonic() + seconds
+        while time.monotonic() < give_up_at:
+            if remaining_time() == 0:
+                if cancelled is not None:
+                    cancelled.append(fetch)
+                return None
+            time.sleep(0.005)
+        return value
+    return fetch
+
+
+def failing(*args):
+    raise ConnectionError("history endpoint down")
+
+
+@pytest.fixture
+def sources(monkeypatch):
+    def install(history, quote, financials):
+        monkeypatch.setattr(analysis, "load_analysis_history", history)
+        monkeypatch.setattr(analysis, "get_spot_quote", quote)
+        monkeypatch.setattr(analysis, "get_stock_financial_data", financials)
+    return install
+
+
+def test_sources_run_concurrently(sources):
+    quote = {"ticker": "600519", "current_price": 1520.0, "change_percent": 0.3, "volume": 1300}
+    sources(slow(HISTORY, 0.2), slow(quote, 0.2), slow(FINANCIALS, 0.2))
+
+    started = time.monotonic()
+    result = analysis.gather_analysis_data("600519", "comprehensive", timeout=5)
+    assert time.monotonic() - started < 0.5
+    assert result["missing_data"] == {}
+    assert result["data_summary"]["current_price"] == 1520.0
+    assert result["data_summary"]["latest_revenue"] == 100.0
+
+
+def test_late_sources_are_cut_off_at_the_shared_deadline(sources):
+    cancelled = []
+    sources(slow(HISTORY, 0.01), slow(None, 5, cancelled), slow(FINANCIALS, 5, cancelled))
+
+    started = time.monotonic()
+    result = analysis.gather_analysis_data("600519", "comprehensive", timeout=0.3)
+    assert time.monotonic() - started < 1.0
+    assert result["missing_data"] == {"financial_data": "timed out"}
+    # The late quote falls back to the history's last bar
+    assert result["data_summary"]["current_price"] == 1515.0
+    assert result["raw_data"]["current_price"]["data_source"] == "historical"
+    assert result["technical_analysis"] == {"trend": "UP"}
+
+    give_up_at = time.monotonic() + 2
+    while len(cancelled) < 2 and time.monotonic() < give_up_at:
+        time.sleep(0.01)
+    assert len(cancelled) == 2
+
+
+def test_failed_history_is_reported_and_the_rest_is_kept(sources, monkeypatch):
+    monkeypatch.setattr(analysis, "get_price_from_alternative_source", failing)
+    quote = {"ticker": "600519", "current_price": 1520.0}
+    sources(failing, slow(quote, 0.01), slow(FINANCIALS, 0.01))
+
+    result = analysis.gather_analysis_data("600519", "comprehensive", timeout=2)
+    assert result["missing_data"]["price_history"].startswith("failed:")
+    assert result["data_summary"]["current_price"] == 1520.0
+    assert result["technical_analysis"] == {}
+    assert result["data_summary"]["profitability_trend"]
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Pure parts of the local history store: coverage ranges, gap planning,
+upstream symbols, segment compaction, resampling of daily bars, and
+prefetch failure on empty or partial upstream responses.
+"""
+
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from baymax.tools import api, history, prefetch
+from baymax.tools.history import BarStore, HistoryStore, merge_ranges, missing_ranges, resample_columns, upstream_symbol
+from baymax.tools.snapshot import SpotSnapshot
+
+
+def ordinals(*days: str) -> tuple:
+    return tuple(date.fromisoformat(day).toordinal() for day in days)
+
+
+def daily_frame(start: str, end: str, close_from: float = 10.0) -> pd.DataFrame:
+    days = pd.bdate_range(start, end)
+    close = close_from + np.arange(len(days), dtype=np.float64)
+    return pd.DataFrame({"日期": days.date, "开盘": close - 0.5, "收盘": close, "最高": close + 1,
+                         "最低": close - 1, "成交量": np.full(len(days), 100.0)})
+
+
+####################################
+# Coverage ranges
+####################################
+
+def test_merge_overlapping_and_adjacent_ranges():
+    assert merge_ranges([(10, 20), (15, 25)]) == [(10, 25)]
+    assert merge_ranges([(10, 20), (21, 30)]) == [(10, 30)]
+    assert merge_ranges([(21, 30), (1, 5), (10, 20)]) == [(1, 5), (10, 30)]
+    assert merge_ranges([(10, 20), (12, 15)]) == [(10, 20)]
+
+
+def test_missing_ranges_finds_gap_in_the_middle():
+    covered = [(1, 10), (21, 30)]
+    assert missing_ranges(1, 30, covered) == [(11, 20)]
+    assert missing_ranges(5, 35, covered) == [(11, 20), (31, 35)]
+    assert missing_ranges(1, 10, covered) == []
+
+
+def test_plan_fetches_middle_gap_and_skips_weekend():
+    store = HistoryStore(enabled=False)
+    coverage = {"ranges": [ordinals("2025-09-01", "2025-09-10"), ordinals("2025-09-22", "2025-09-30")], "tail": None}
+    assert store.plan("CN", "daily", date(2025, 9, 1), date(2025, 9, 30), coverage) == [
+        (date(2025, 9, 11), date(2025, 9, 21), True)
+    ]
+
+    # Saturday and Sunday between two covered weeks hold no session: recorded, not fetched
+    coverage = {"ranges": [ordinals("2025-09-01", "2025-09-12"), ordinals("2025-09-15", "2025-09-30")], "tail": None}
+    assert store.plan("CN", "daily", date(2025, 9, 1), date(2025, 9, 30), coverage) == [
+        (date(2025, 9, 13), date(2025, 9, 14), False)
+    ]
+
+
+####################################
+# Upstream symbols
+####################################
+
+class FakeSpotCache:
+    def __init__(self, error: Exception = None):
+        self.error = error
+
+    def get_snapshot(self, market):
+        if self.error:
+            raise self.error
+        return SpotSnapshot("US", np.array(["105.AAPL", "106.TTE"]), {})
+
+
+def test_us_history_symbol_carries_the_exchange_prefix(monkeypatch):
+    monkeypatch.setattr(api, "spot_cache", FakeSpotCache())
+    assert upstream_symbol("TTE", "US") == "106.TTE"
+    assert upstream_symbol("AAPL", "US") == "105.AAPL"
+    assert upstream_symbol("ZZZZ", "US") == "105.ZZZZ"
+    assert upstream_symbol("600519", "CN") == "600519"
+
+
+def test_us_history_symbol_assumes_nasdaq_without_a_spot_table(monkeypatch):
+    monkeypatch.setattr(api, "spot_cache", FakeSpotCache(ConnectionError("spot endpoint down")))
+    assert upstream_symbol("TTE", "US") == "105.TTE"
+
+
+####################################
+# Bar store
+####################################
+
+def test_compact_merges_segments_and_keeps_latest_bars(tmp_path):
+    store = BarStore(str(tmp_path), "CN", "600519", "daily")
+    store.append(daily_frame("2025-09-01", "2025-09-12", close_from=10))
+    store.append(daily_frame("2025-09-08", "2025-09-19", close_from=100))
+    before = store.read_columns()
+
+    store.compact()
+    after = store.read_columns()
+
+    assert len(store.segments()) == 1
+    assert len(after["date"]) == len(pd.bdate_range("2025-09-01", "2025-09-19"))
+    for field, values in before.items():
+        np.testing.assert_array_equal(after[field], values)
+    # The later segment wins for the overlapping week
+    assert after["close"][after["date"] == np.datetime64("2025-09-08")][0] == 100
+
+
+####################################
+# Resampling
+####################################
+
+def columns_of(frame: pd.DataFrame) -> dict:
+    return {
+        "date": pd.to_datetime(frame["日期"]).to_numpy(dtype="datetime64[D]"),
+        "open": frame["开盘"].to_numpy(), "close": frame["收盘"].to_numpy(),
+        "high": frame["最高"].to_numpy(), "low": frame["最低"].to_numpy(),
+        "volume": frame["成交量"].to_numpy(),
+    }
+
+
+def test_resample_weekly():
+    # Wed 2025-09-03 .. Fri 2025-09-19: a partial first week and two full weeks
+    bars = resample_columns(columns_of(daily_frame("2025-09-03", "2025-09-19")), "weekly")
+    np.testing.assert_array_equal(bars["date"], np.array(["2025-09-05", "2025-09-12", "2025-09-19"], dtype="datetime64[D]"))
+    np.testing.assert_array_equal(bars["open"], [9.5, 12.5, 17.5])
+    np.testing.assert_array_equal(bars["close"], [12, 17, 22])
+    np.testing.assert_array_equal(bars["high"], [13, 18, 23])
+    np.testing.assert_array_equal(bars["low"], [9, 12, 17])
+    np.testing.assert_array_equal(bars["volume"], [300, 500, 500])
+    np.testing.assert_allclose(bars["change"][1:], [5, 5])
+
+
+def test_resample_monthly():
+    bars = resample_columns(columns_of(daily_frame("2025-09-29", "2025-10-03")), "monthly")
+    np.testing.assert_array_equal(bars["date"], np.array(["2025-09-30", "2025-10-03"], dtype="datetime64[D]"))
+    np.testing.assert_array_equal(bars["open"], [9.5, 11.5])
+    np.testing.assert_array_equal(bars["close"], [11, 14])
+    np.testing.assert_array_equal(bars["volume"], [200, 300])
+    np.testing.assert_allclose(bars["change_percent"][1], (14 - 11) / 11 * 100)
+
+
+####################################
+# Prefetch
+####################################
+
+def test_prefetch_fails_ticker_when_upstream_sends_nothing(tmp_path, monkeypatch):
+    monkeypatch.setattr(prefetch, "history_store", HistoryStore(root=str(tmp_path), enabled=True))
+    monkeypatch.setattr(history, "fetch_history", lambda *args, **kwargs: pd.DataFrame())
+    with pytest.raises(ValueError, match="no daily bars"):
+        prefetch.prefetch_ticker("600519", 20)
+
+
+def test_prefetch_fails_ticker_while_a_gap_stays_uncovered(tmp_path, monkeypatch):
+    store = HistoryStore(root=str(tmp_path), enabled=True)
+    monkeypatch.setattr(prefetch, "history_store", store)
+    start = prefetch.get_calendar("CN").window_start(20)
+    # Upstream stops after the first few sessions of the window
+    partial = daily_frame(start.isoformat(), (start + timedelta(days=6)).isoformat())
+    monkeypatch.setattr(history, "fetch_history", lambda *args, **kwargs: partial)
+    with pytest.raises(ValueError, match="still uncovered"):
+        prefetch.prefetch_ticker("600519", 20)
+    assert store.coverage("CN", "600519")
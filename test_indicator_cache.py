@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Indicator result cache: hits and misses keyed on the last bar, settled vs
+unsettled results, byte-capped LRU eviction, and isolation of the copies
+handed to callers.
+"""
+
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+import pickle
+from datetime import date
+
+from baymax.tools.indicator_cache import IndicatorCache
+
+REQUEST = ("technical_indicators", "600519", "daily", 120, "", ())
+WINDOW = (date(2026, 10, 16), date(2026, 10, 16))
+LAST_BAR = ("2026-10-16", 1500.0, 12000.0)
+
+
+def result(close: float = 1500.0, size: int = 10) -> dict:
+    return {"ticker": "600519", "close": close, "sma_20": [close] * size}
+
+
+def test_hit_requires_the_same_last_bar():
+    cache = IndicatorCache(max_bytes=1 << 20)
+    assert cache.get(REQUEST, LAST_BAR) is None
+    cache.put(REQUEST, LAST_BAR, result(), WINDOW, settled=True)
+
+    assert cache.get(REQUEST, LAST_BAR) == result()
+    # The newest bar was revised: different close, different entry
+    assert cache.get(REQUEST, ("2026-10-16", 1501.0, 12500.0)) is None
+    assert cache.get(("technical_indicators", "000001", "daily", 120, "", ()), LAST_BAR) is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 3, 1)
+
+
+def test_settled_result_is_served_without_a_fetch_until_the_window_moves():
+    cache = IndicatorCache(max_bytes=1 << 20, tail_ttl=0)
+    cache.put(REQUEST, LAST_BAR, result(), WINDOW, settled=True)
+    assert cache.recent(REQUEST, WINDOW) == result()
+    assert cache.stats()["fetches_skipped"] == 1
+
+    # A new session opened: the result may be missing a bar
+    assert cache.recent(REQUEST, (date(2026, 10, 19), date(2026, 10, 19))) is None
+
+
+def test_unsettled_result_is_served_only_within_the_tail_ttl():
+    fresh = IndicatorCache(max_bytes=1 << 20, tail_ttl=60)
+    fresh.put(REQUEST, LAST_BAR, result(), WINDOW, settled=False)
+    assert fresh.recent(REQUEST, WINDOW) == result()
+
+    expired = IndicatorCache(max_bytes=1 << 20, tail_ttl=0)
+    expired.put(REQUEST, LAST_BAR, result(), WINDOW, settled=False)
+    assert expired.recent(REQUEST, WINDOW) is None
+    # Still reusable once a fetch shows the last bar has not changed
+    assert expired.get(REQUEST, LAST_BAR) == result()
+
+
+def test_least_recently_used_entries_go_first_past_the_byte_cap():
+    entry_size = len(pickle.dumps(result(), pickle.HIGHEST_PROTOCOL))
+    cache = IndicatorCache(max_bytes=entry_size * 2)
+    bars = [("2026-10-14", 1.0, 1.0), ("2026-10-15", 2.0, 2.0), ("2026-10-16", 3.0, 3.0)]
+    cache.put(REQUEST, bars[0], result(), WINDOW, settled=True)
+    cache.put(REQUEST, bars[1], result(), WINDOW, settled=True)
+    cache.get(REQUEST, bars[0])
+    cache.put(REQUEST, bars[2], result(), WINDOW, settled=True)
+
+    assert cache.get(REQUEST, bars[1]) is None
+    assert cache.get(REQUEST, bars[0]) is not None
+    assert cache.get(REQUEST, bars[2]) is not None
+    stats = cache.stats()
+    assert stats["evictions"] == 1
+    assert stats["bytes"] <= cache.max_bytes
+
+
+def test_oversized_result_is_returned_but_not_stored():
+    cache = IndicatorCache(max_bytes=256)
+    big = result(size=1000)
+    assert cache.put(REQUEST, LAST_BAR, big, WINDOW, settled=True) is big
+    assert cache.get(REQUEST, LAST_BAR) is None
+    assert cache.stats()["bytes"] == 0
+
+
+def test_callers_cannot_change_the_cached_result():
+    cache = IndicatorCache(max_bytes=1 << 20)
+    stored = result()
+    cache.put(REQUEST, LAST_BAR, stored, WINDOW, settled=True)
+    stored["sma_20"].clear()
+
+    first = cache.recent(REQUEST, WINDOW)
+    first["note"] = "added by a caller"
+    first["sma_20"].pop()
+    assert cache.get(REQUEST, LAST_BAR) == result()
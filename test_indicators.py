@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+The NumPy indicators must reproduce straightforward pandas implementations
+(rolling windows, ewm seeded with the first window's mean) on a fixed series,
+NaN warm-up included, both for one ticker and for a dates x tickers panel.
+"""
+
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+import numpy as np
+import pandas as pd
+
+from baymax.tools.indicators import atr, bollinger, compute_indicators, ema, macd, rolling_std, rsi, sma
+
+
+def make_bars(count: int = 150, seed: int = 11) -> dict:
+    rng = np.random.default_rng(seed)
+    close = 50 * np.exp(np.cumsum(rng.normal(0, 0.015, count)))
+    spread = np.abs(rng.normal(0, 0.5, count))
+    return {"close": close, "high": close + spread, "low": close - spread,
+            "volume": rng.integers(1_000, 10_000, count).astype(np.float64)}
+
+
+####################################
+# pandas references
+####################################
+
+def pandas_seeded(series: pd.Series, window: int, alpha: float) -> pd.Series:
+    """ewm(adjust=False) started from the mean of the first `window` valid values."""
+    first = series.first_valid_index()
+    seed_at = first + window - 1
+    seeded = series.copy()
+    seeded.iloc[:seed_at] = np.nan
+    seeded.iloc[seed_at] = series.iloc[first:seed_at + 1].mean()
+    return seeded.ewm(alpha=alpha, adjust=False).mean()
+
+
+def pandas_ema(series: pd.Series, window: int) -> pd.Series:
+    return pandas_seeded(series, window, 2.0 / (window + 1))
+
+
+def pandas_rsi(close: pd.Series, window: int = 14) -> pd.Series:
+    delta = close.diff()
+    gains = pandas_seeded(delta.clip(lower=0), window, 1.0 / window)
+    losses = pandas_seeded((-delta).clip(lower=0), window, 1.0 / window)
+    return 100 - 100 / (1 + gains / losses)
+
+
+def pandas_atr(high: pd.Series, low: pd.Series, close: pd.Series, window: int = 14) -> pd.Series:
+    previous = close.shift(1)
+    true_range = pd.concat([high - low, (high - previous).abs(), (low - previous).abs()], axis=1).max(axis=1)
+    return pandas_seeded(true_range, window, 1.0 / window)
+
+
+def assert_same(actual: np.ndarray, expected: pd.Series):
+    expected = expected.to_numpy(dtype=np.float64)
+    assert np.array_equal(np.isnan(actual), np.isnan(expected)), "NaN warm-up differs"
+    np.testing.assert_allclose(actual[~np.isnan(actual)], expected[~np.isnan(expected)], rtol=1e-10, atol=1e-10)
+
+
+####################################
+# Tests
+####################################
+
+def test_moving_averages():
+    close = make_bars()["close"]
+    series = pd.Series(close)
+    for window in (5, 20, 50):
+        assert_same(sma(close, window), series.rolling(window).mean())
+        assert_same(rolling_std(close, window), series.rolling(window).std(ddof=0))
+        assert_same(ema(close, window), pandas_ema(series, window))
+
+
+def test_rsi():
+    close = make_bars()["close"]
+    for window in (6, 14):
+        assert_same(rsi(close, window), pandas_rsi(pd.Series(close), window))
+
+
+def test_macd():
+    close = make_bars()["close"]
+    series = pd.Series(close)
+    line = pandas_ema(series, 12) - pandas_ema(series, 26)
+    signal = pandas_ema(line, 9)
+    result = macd(close)
+    assert_same(result["macd"], line)
+    assert_same(result["macd_signal"], signal)
+    assert_same(result["macd_histogram"], line - signal)
+
+
+def test_bollinger():
+    close = make_bars()["close"]
+    series = pd.Series(close)
+    middle = series.rolling(20).mean()
+    spread = 2 * series.rolling(20).std(ddof=0)
+    result = bollinger(close)
+    assert_same(result["bollinger_middle"], middle)
+    assert_same(result["bollinger_upper"], middle + spread)
+    assert_same(result["bollinger_lower"], middle - spread)
+    assert_same(result["bollinger_percent_b"], (series - (middle - spread)) / (2 * spread))
+
+
+def test_atr():
+    bars = make_bars()
+    expected = pandas_atr(pd.Series(bars["high"]), pd.Series(bars["low"]), pd.Series(bars["close"]))
+    assert_same(atr(bars["high"], bars["low"], bars["close"]), expected)
+
+
+def test_panel_matches_single_ticker():
+    """Columns of a 2-D panel, one listed later (leading NaNs), match each ticker computed alone."""
+    tickers = [make_bars(seed=seed) for seed in (1, 2, 3)]
+    tickers[2] = {field: np.r_[np.full(40, np.nan), values[40:]] for field, values in tickers[2].items()}
+    panel = {field: np.column_stack([bars[field] for bars in tickers]) for field in tickers[0]}
+    specs = ("sma_20", "ema_12", "rsi_14", "macd", "bollinger", "atr_14")
+
+    batch = compute_indicators(panel, specs)
+    for column, bars in enumerate(tickers):
+        listed = ~np.isnan(bars["close"])
+        alone = compute_indicators({field: values[listed] for field, values in bars.items()}, specs)
+        for name, values in alone.items():
+            got = batch[name][listed, column]
+            assert np.array_equal(np.isnan(got), np.isnan(values)), f"{name} warm-up, column {column}"
+            np.testing.assert_allclose(got[~np.isnan(got)], values[~np.isnan(values)], rtol=1e-10, atol=1e-10)
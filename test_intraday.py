@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+MinuteRingBuffer against a plain list of minutes: wrapping past capacity,
+revising the newest minute, skipping stale ones, and windowed counts, VWAP
+and stats when the window spans the wrap-around.
+"""
+
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+import numpy as np
+
+from baymax.tools.intraday import MinuteRingBuffer
+
+START = 1_760_000_000 - 1_760_000_000 % 60
+
+
+def minutes(first: int, count: int, price_from: float = 10.0) -> tuple:
+    """`count` consecutive minutes starting at minute index `first`."""
+    index = np.arange(first, first + count)
+    close = price_from + index.astype(np.float64)
+    volume = 100.0 + index
+    columns = {"open": close - 0.5, "high": close + 1, "low": close - 1, "close": close,
+               "volume": volume, "turnover": close * volume}
+    return START + index * 60, columns
+
+
+def reference_vwap(ts: np.ndarray, columns: dict) -> float:
+    typical = (columns["high"] + columns["low"] + columns["close"]) / 3
+    return float((typical * columns["volume"]).sum() / columns["volume"].sum())
+
+
+def test_wraps_and_keeps_the_newest_minutes_in_order():
+    buffer = MinuteRingBuffer(capacity=8)
+    assert buffer.append(*minutes(0, 5)) == 5
+    assert buffer.append(*minutes(5, 6)) == 6
+
+    assert len(buffer) == 8
+    assert buffer.head == 3
+    bars = buffer.bars()
+    np.testing.assert_array_equal(bars["ts"], minutes(3, 8)[0])
+    np.testing.assert_array_equal(bars["close"], minutes(3, 8)[1]["close"])
+    assert buffer.last_ts == START + 10 * 60
+
+
+def test_batch_larger_than_capacity_keeps_its_tail():
+    buffer = MinuteRingBuffer(capacity=4)
+    assert buffer.append(*minutes(0, 10)) == 4
+    np.testing.assert_array_equal(buffer.bars()["ts"], minutes(6, 4)[0])
+
+
+def test_repeat_of_newest_minute_overwrites_it():
+    buffer = MinuteRingBuffer(capacity=8)
+    buffer.append(*minutes(0, 4))
+    ts, columns = minutes(3, 1, price_from=50.0)
+    assert buffer.append(ts, columns) == 0
+
+    assert len(buffer) == 4
+    assert buffer.bars()["close"][-1] == 53.0
+    assert buffer.vwap(1) == reference_vwap(ts, columns)
+
+
+def test_stale_minutes_are_skipped():
+    buffer = MinuteRingBuffer(capacity=8)
+    buffer.append(*minutes(0, 6))
+    # Minutes 2..7: 2..4 are older than the newest buffered, 5 revises it, 6..7 are new
+    assert buffer.append(*minutes(2, 6, price_from=50.0)) == 2
+
+    closes = buffer.bars()["close"]
+    np.testing.assert_array_equal(closes[:5], minutes(0, 5)[1]["close"])
+    np.testing.assert_array_equal(closes[5:], [55.0, 56.0, 57.0])
+
+
+def test_windowed_count_vwap_and_stats_across_the_split():
+    buffer = MinuteRingBuffer(capacity=8)
+    buffer.append(*minutes(0, 6))
+    buffer.append(*minutes(6, 5))
+    # Buffered minutes 3..10: slots 3..7 then 0..2
+    assert buffer._count_since(START + 3 * 60) == 8
+    assert buffer._count_since(START + 5 * 60) == 6
+    assert buffer._count_since(START + 9 * 60) == 2
+    assert buffer._count_since(START + 11 * 60) == 0
+
+    assert len(buffer._segments(6)) == 2
+    ts, columns = minutes(5, 6)
+    np.testing.assert_allclose(buffer.vwap(6), reference_vwap(ts, columns))
+
+    stats = buffer.stats(6)
+    assert stats["bars"] == 6
+    assert (stats["start_ts"], stats["end_ts"]) == (ts[0], ts[-1])
+    assert (stats["open"], stats["close"]) == (columns["open"][0], columns["close"][-1])
+    assert (stats["high"], stats["low"]) == (columns["high"].max(), columns["low"].min())
+    assert stats["volume"] == columns["volume"].sum()
+    np.testing.assert_allclose(stats["turnover"], columns["turnover"].sum())
+    np.testing.assert_allclose(stats["vwap"], reference_vwap(ts, columns))
@@ -12,6 +12,7 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
 # Import the MCP tools directly for testing
 from baymax.tools.prices import (
     get_current_stock_price,
+    get_current_stock_prices,
     get_stock_price_history,
     get_stock_weekly_summary
 )
@@ -40,6 +41,21 @@ def test_stock_price():
         print(f"❌ Exception: {e}")
         return False
 
+def test_batch_stock_prices():
+    """Test batch current price retrieval"""
+    print("\n🔄 Testing get_current_stock_prices...")
+    try:
+        result = get_current_stock_prices.func(["600519", "000001", "AAPL"])
+        if "error" in result:
+            print(f"❌ Error: {result['error']}")
+            return False
+        else:
+            print(f"✅ Success: Got {result.get('found', 0)}/{result.get('requested', 0)} quotes, missing: {result.get('missing', [])}")
+            return True
+    except Exception as e:
+        print(f"❌ Exception: {e}")
+        return False
+
 def test_price_history():
     """Test historical price data"""
     print("\n🔄 Testing get_stock_price_history...")
@@ -128,6 +144,7 @@ def run_all_tests():
 
     tests = [
         test_stock_price,
+        test_batch_stock_prices,
         test_price_history,
         test_weekly_summary,
         test_ai_analysis,
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Panel builds reuse the current version until their definition or the bars
+behind it change, and every module agrees on the canonical HK symbol.
+"""
+
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+import time
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from baymax.tools import panel
+from baymax.tools.api import hk_code, hk_ticker, normalize_ticker
+from baymax.tools.history import BarStore, HistoryStore, upstream_symbol
+from baymax.tools.intraday import minute_symbol
+
+
+def daily_frame(start: str, end: str, close_from: float = 10.0) -> pd.DataFrame:
+    days = pd.bdate_range(start, end)
+    close = close_from + np.arange(len(days), dtype=np.float64)
+    return pd.DataFrame({"日期": days.date, "开盘": close, "收盘": close, "最高": close,
+                         "最低": close, "成交量": np.full(len(days), 100.0)})
+
+
+def build(tmp_path, tickers):
+    return panel.build_panel("CN", tickers, date(2025, 9, 1), date(2025, 9, 12),
+                             fields=("close",), root=str(tmp_path / "panels"))
+
+
+def test_rebuild_reuses_current_version_until_bars_change(tmp_path, monkeypatch):
+    store = HistoryStore(root=str(tmp_path / "history"), enabled=True)
+    monkeypatch.setattr(panel, "history_store", store)
+    for ticker in ("600519", "000001"):
+        BarStore(store.root, "CN", ticker, "daily").append(daily_frame("2025-09-01", "2025-09-12"))
+
+    first = build(tmp_path, ["600519", "000001"])
+    assert build(tmp_path, ["600519", "000001"]).path == first.path
+
+    # Different tickers are a different panel; new bars make a new version of the same one
+    assert build(tmp_path, ["600519"]).path != first.path
+    time.sleep(0.01)
+    BarStore(store.root, "CN", "000001", "daily").append(daily_frame("2025-09-08", "2025-09-12", close_from=99))
+    rebuilt = build(tmp_path, ["600519", "000001"])
+    assert rebuilt.path != first.path
+    assert rebuilt["close"][-1, 1] == 103
+
+
+def test_hk_symbol_is_canonical_everywhere():
+    assert normalize_ticker("01211.hk") == "1211.HK"
+    assert hk_ticker("01211") == "1211.HK"
+    assert hk_ticker("00005") == "0005.HK"
+    assert hk_code("0005.HK") == "00005"
+    assert upstream_symbol("1211.HK", "HK") == minute_symbol("1211.HK", "HK") == "01211"
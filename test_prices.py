@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+The current-price fallback chain in its sequential, hedged and raced modes,
+with synthetic sources instead of akshare.
+"""
+
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+import threading
+import time
+
+from baymax.tools.prices import fetch_first_valid_price
+from baymax.tools.upstream import remaining_time
+
+
+def quote(price: float) -> dict:
+    return {"ticker": "600519", "current_price": price}
+
+
+def failing():
+    raise ConnectionError("spot endpoint down")
+
+
+def slow(price: float, seconds: float, stopped: threading.Event = None):
+    def fetch():
+        give_up_at = time.monotonic() + seconds
+        while time.monotonic() < give_up_at:
+            # A cancelled source sees its deadline scope drop to zero
+            if remaining_time() == 0:
+                if stopped is not None:
+                    stopped.set()
+                return None
+            time.sleep(0.005)
+        return quote(price)
+    return fetch
+
+
+def test_sequential_falls_through_failed_and_invalid_sources():
+    sources = [("real_time", failing), ("historical", lambda: quote(0)), ("alternative", lambda: quote(1500.0)),
+               ("unused", lambda: quote(1.0))]
+    result, timings = fetch_first_valid_price("600519", sources, mode="sequential")
+
+    assert result["current_price"] == 1500.0
+    assert result["winning_source"] == "alternative"
+    assert [timings[name]["status"] for name, _ in sources] == ["failed", "invalid", "ok", "not_started"]
+
+
+def test_hedged_starts_the_fallback_and_cancels_the_slow_source():
+    stopped = threading.Event()
+    sources = [("real_time", slow(1600.0, 2.0, stopped)), ("historical", lambda: quote(1500.0))]
+    started = time.monotonic()
+    result, timings = fetch_first_valid_price("600519", sources, mode="hedged", hedge_delay=0.05)
+
+    assert result["winning_source"] == "historical"
+    assert time.monotonic() - started < 1.0
+    assert timings["real_time"]["status"] == "cancelled"
+    assert stopped.wait(2)
+
+
+def test_race_takes_the_fastest_valid_price():
+    sources = [("real_time", slow(1600.0, 0.3)), ("historical", slow(1500.0, 0.02)), ("alternative", failing)]
+    result, timings = fetch_first_valid_price("600519", sources, mode="race")
+    assert result["winning_source"] == "historical"
+    assert result["fetch_mode"] == "race"
+
+
+def test_no_valid_price_returns_none_with_timings():
+    result, timings = fetch_first_valid_price("600519", [("real_time", failing), ("historical", lambda: None)],
+                                              mode="hedged", hedge_delay=0.05)
+    assert result is None
+    assert timings["real_time"]["status"] == "failed"
+    assert timings["historical"]["status"] == "invalid"
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Spot snapshots with akshare stubbed out: TTL reuse, the code index, the
+columnar quote store, on-disk persistence and the background refresher.
+"""
+
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from baymax.tools import upstream
+from baymax.tools.snapshot import SPOT_VERSIONS_KEPT, SpotRefresher, SpotSnapshot, SpotSnapshotCache, load_snapshot, save_snapshot
+
+WEEK = 7 * 86400
+
+
+class FakeAkshare:
+    """Spot endpoints returning a tiny table; every download bumps the price."""
+
+    def __init__(self):
+        self.calls = 0
+        self.fail = False
+
+    def _table(self, codes):
+        self.calls += 1
+        if self.fail:
+            raise KeyError("data")
+        return pd.DataFrame({
+            "代码": codes,
+            "最新价": [10.0 * self.calls + i for i in range(len(codes))],
+            "成交量": [1000 + i for i in range(len(codes))],
+            "市盈率-动态": [15.5, None, 20.0][:len(codes)],
+        })
+
+    def stock_zh_a_spot_em(self):
+        return self._table(["600519", "000001", "300750"])
+
+    def stock_hk_spot_em(self):
+        return self._table(["01211", "00700"])
+
+    def stock_us_spot_em(self):
+        return self._table(["105.AAPL", "106.TTE"])
+
+
+@pytest.fixture
+def fake_ak(monkeypatch):
+    fake = FakeAkshare()
+    monkeypatch.setattr(upstream, "ak", fake)
+    # Earlier real calls may have opened the spot endpoints' circuits
+    monkeypatch.setattr(upstream, "health_registry", upstream.HealthRegistry())
+    return fake
+
+
+def age(snapshot: SpotSnapshot, seconds: float):
+    """Backdate a snapshot; a week covers closed sessions too."""
+    snapshot.fetched_at -= seconds
+
+
+####################################
+# TTL cache and code index
+####################################
+
+def test_snapshot_is_reused_within_the_ttl(fake_ak):
+    cache = SpotSnapshotCache(ttl=30, persist=False)
+    first = cache.get_snapshot("CN")
+    assert cache.get_snapshot("CN") is first
+    assert fake_ak.calls == 1
+
+    age(first, WEEK)
+    second = cache.get_snapshot("CN")
+    assert second is not first
+    assert fake_ak.calls == 2
+    assert second.lookup("600519")["current_price"] == 20.0
+
+
+def test_invalidate_forces_a_download(fake_ak):
+    cache = SpotSnapshotCache(ttl=30, persist=False)
+    cache.get_snapshot("CN")
+    cache.invalidate("CN")
+    cache.get_snapshot("CN")
+    assert fake_ak.calls == 2
+
+
+def test_code_index_resolves_bare_us_and_unpadded_hk_symbols(fake_ak):
+    cache = SpotSnapshotCache(ttl=30, persist=False)
+    us = cache.get_snapshot("US")
+    assert us.code_for("TTE") == "106.TTE"
+    assert us.lookup("AAPL") == us.lookup("105.AAPL")
+    assert us.lookup("MSFT") is None
+
+    hk = cache.get_snapshot("HK")
+    assert hk.index["1211"] == hk.index["01211"] == 0
+    assert hk.code_for("700") == "00700"
+
+
+####################################
+# Columnar quote store
+####################################
+
+def test_from_frame_keeps_typed_quote_columns(fake_ak):
+    snapshot = SpotSnapshotCache(ttl=30, persist=False).get_snapshot("CN")
+    assert snapshot.columns["current_price"].dtype == np.float64
+    assert snapshot.columns["volume"].dtype == np.int64
+    # pe_ratio falls back to the dynamic P/E column; a blank cell is NaN
+    np.testing.assert_array_equal(np.isnan(snapshot.columns["pe_ratio"]), [False, True, False])
+    assert set(snapshot.columns) == {"current_price", "volume", "pe_ratio"}
+
+
+def test_select_gathers_several_rows_in_order(fake_ak):
+    snapshot = SpotSnapshotCache(ttl=30, persist=False).get_snapshot("CN")
+    quotes = snapshot.select([snapshot.index["300750"], snapshot.index["600519"]])
+    assert [q["current_price"] for q in quotes] == [12.0, 10.0]
+    assert quotes[1]["volume"] == 1000
+    assert quotes[1]["pe_ratio"] == 15.5
+
+
+####################################
+# On-disk persistence
+####################################
+
+def make_snapshot(fetched_at: float) -> SpotSnapshot:
+    codes = np.array(["600519", "000001"])
+    columns = {"current_price": np.array([1500.0, 11.5]), "volume": np.array([10, 20], dtype=np.int64)}
+    return SpotSnapshot("CN", codes, columns, fetched_at)
+
+
+def test_save_and_load_round_trip_through_current(tmp_path):
+    snapshot = make_snapshot(time.time())
+    version_dir = save_snapshot(snapshot, str(tmp_path))
+    with open(tmp_path / "CN" / "CURRENT", encoding="utf-8") as f:
+        assert f.read() == os.path.basename(version_dir)
+
+    loaded = load_snapshot("CN", str(tmp_path))
+    assert loaded.fetched_at == snapshot.fetched_at
+    assert isinstance(loaded.columns["current_price"], np.memmap)
+    np.testing.assert_array_equal(loaded.codes, snapshot.codes)
+    assert loaded.lookup("000001") == snapshot.lookup("000001")
+    assert load_snapshot("HK", str(tmp_path)) is None
+
+
+def test_old_versions_are_pruned(tmp_path):
+    now = time.time()
+    for seconds_ago in (30, 20, 10, 0):
+        save_snapshot(make_snapshot(now - seconds_ago), str(tmp_path))
+    versions = [name for name in os.listdir(tmp_path / "CN") if name != "CURRENT"]
+    assert len(versions) == SPOT_VERSIONS_KEPT
+    assert load_snapshot("CN", str(tmp_path)).fetched_at == now
+
+
+def test_new_process_starts_from_the_stored_copy(tmp_path, fake_ak):
+    SpotSnapshotCache(ttl=30, cache_dir=str(tmp_path)).get_snapshot("CN")
+    assert fake_ak.calls == 1
+
+    # A second cache (a new process) maps the fresh copy instead of downloading
+    warm = SpotSnapshotCache(ttl=30, cache_dir=str(tmp_path)).get_snapshot("CN")
+    assert fake_ak.calls == 1
+    assert warm.lookup("600519")["current_price"] == 10.0
+
+
+def test_stale_stored_copy_is_served_and_refreshed_behind(tmp_path, fake_ak):
+    save_snapshot(make_snapshot(time.time() - WEEK), str(tmp_path))
+    cache = SpotSnapshotCache(ttl=30, max_staleness=2 * WEEK, cache_dir=str(tmp_path))
+
+    stale = cache.get_snapshot("CN")
+    assert cache.is_stale(stale)
+    assert stale.lookup("600519")["current_price"] == 1500.0
+
+    give_up_at = time.monotonic() + 5
+    while cache._snapshots["CN"] is stale and time.monotonic() < give_up_at:
+        time.sleep(0.01)
+    assert fake_ak.calls == 1
+    assert cache.get_snapshot("CN").lookup("600519")["current_price"] == 10.0
+
+
+####################################
+# Background refresher
+####################################
+
+def test_refresher_swaps_in_a_new_snapshot(fake_ak):
+    cache = SpotSnapshotCache(ttl=30, persist=False)
+    refresher = SpotRefresher(cache, interval=60, markets=["CN"])
+    old = cache.get_snapshot("CN")
+
+    refresher.refresh("CN")
+    assert cache.get_snapshot("CN") is old  # still fresh, nothing fetched
+    assert fake_ak.calls == 1
+
+    age(old, WEEK)
+    refresher.refresh("CN")
+    new = cache.get_snapshot("CN")
+    assert new is not old
+    # Readers still holding the old snapshot see it unchanged
+    assert old.lookup("600519")["current_price"] == 10.0
+    assert new.lookup("600519")["current_price"] == 20.0
+
+
+def test_failed_refresh_keeps_serving_the_previous_snapshot(fake_ak):
+    cache = SpotSnapshotCache(ttl=30, persist=False)
+    refresher = SpotRefresher(cache, interval=60, markets=["CN"])
+    old = cache.get_snapshot("CN")
+    age(old, WEEK)
+
+    fake_ak.fail = True
+    refresher.refresh("CN")
+    assert cache._snapshots["CN"] is old
+
+
+def test_readers_leave_downloads_to_a_running_refresher(fake_ak):
+    cache = SpotSnapshotCache(ttl=30, max_staleness=2 * WEEK, persist=False)
+    refresher = SpotRefresher(cache, interval=60, markets=["CN"])
+    cache.refresher = refresher
+    refresher.start()
+    try:
+        give_up_at = time.monotonic() + 5
+        while "CN" not in cache._snapshots and time.monotonic() < give_up_at:
+            time.sleep(0.01)
+        snapshot = cache._snapshots["CN"]
+        age(snapshot, WEEK)
+        assert cache.get_snapshot("CN") is snapshot
+        assert fake_ak.calls == 1
+    finally:
+        refresher.stop()
+        refresher.join(timeout=5)
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Streaming indicators must match the batch indicators bar for bar, including
+after the newest bar has been revised, around NaN bars and at price levels
+where a naive variance cancels out.
+"""
+
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+import numpy as np
+import pytest
+
+from baymax.tools.indicators import atr, ema, rolling_std, rsi, sma
+from baymax.tools.streaming import LiveIndicators, RollingStd, StreamingEMA, StreamingIndicator
+
+
+def make_bars(count: int = 120, seed: int = 7) -> dict:
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, count)))
+    spread = np.abs(rng.normal(0, 1.0, count))
+    return {"close": close, "high": close + spread, "low": close - spread}
+
+
+def batch_series(bars: dict) -> dict:
+    close = bars["close"]
+    peaks = np.maximum.accumulate(close)
+    return {
+        "sma_20": sma(close, 20),
+        "ema_12": ema(close, 12),
+        "rsi_14": rsi(close, 14),
+        "std_20": rolling_std(close, 20),
+        "atr_14": atr(bars["high"], bars["low"], close, 14),
+        "drawdown": np.maximum.accumulate((peaks - close) / peaks * 100),
+    }
+
+
+def assert_matches(streamed: dict, expected: dict, position: int):
+    for name, values in expected.items():
+        want = values[position]
+        got = streamed[name]
+        if np.isnan(want):
+            assert got is None, f"{name} at bar {position}: expected warm-up None, got {got}"
+        else:
+            assert got == pytest.approx(want, rel=1e-9, abs=1e-9), f"{name} at bar {position}"
+
+
+def test_updates_match_batch():
+    bars = make_bars()
+    expected = batch_series(bars)
+    live = LiveIndicators(expected)
+    for position in range(len(bars["close"])):
+        values = live.push(position, {field: bars[field][position] for field in bars})
+        assert_matches(values, expected, position)
+
+
+def test_revisions_match_batch():
+    """Each bar first arrives as a provisional value and is then revised to the final one."""
+    bars = make_bars()
+    expected = batch_series(bars)
+    live = LiveIndicators(expected)
+    for position in range(len(bars["close"])):
+        provisional = {field: bars[field][position] * 1.03 for field in bars}
+        live.push(position, provisional)
+        values = live.push(position, {field: bars[field][position] for field in bars})
+        assert_matches(values, expected, position)
+    assert live.bars == len(bars["close"])
+
+
+def test_warm_up_matches_batch():
+    bars = make_bars()
+    expected = batch_series(bars)
+    live = LiveIndicators(expected)
+    values = live.warm_up(range(len(bars["close"])), bars)
+    assert_matches(values, expected, len(bars["close"]) - 1)
+
+
+def test_streaming_indicator_is_abstract():
+    with pytest.raises(TypeError):
+        StreamingIndicator()
+
+
+def test_std_keeps_precision_at_a_high_price_level():
+    """sum(x^2) - n * mean^2 loses every digit here; the centred running state does not."""
+    rng = np.random.default_rng(3)
+    close = 1e8 + rng.normal(0, 0.01, 200)
+    expected = rolling_std(close, 20)
+    std = RollingStd(20)
+    for position, x in enumerate(close):
+        got = std.update(x)
+        if position >= 19:
+            assert got == pytest.approx(expected[position], rel=1e-6), f"bar {position}"
+
+
+def test_ema_skips_nan_like_the_batch():
+    close = make_bars(60)["close"]
+    close[:3] = np.nan      # listed later
+    close[8] = np.nan       # missing inside the seed window
+    close[30:33] = np.nan   # suspended
+    expected = ema(close, 12)
+    streamed = StreamingEMA(12)
+    for position, x in enumerate(close):
+        got = streamed.update(x)
+        if np.isnan(expected[position]):
+            assert np.isnan(got), f"bar {position}"
+        else:
+            assert got == pytest.approx(expected[position], rel=1e-9), f"bar {position}"
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Trading calendar edge cases: holidays inside a window, the pre-open, and
+when a daily bar settles.
+"""
+
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from datetime import date, datetime
+
+from baymax.tools.trading_calendar import MARKET_TIMEZONES, get_calendar
+
+
+def at(market: str, *parts) -> datetime:
+    return datetime(*parts, tzinfo=MARKET_TIMEZONES[market])
+
+
+def test_sessions_back_skips_holidays():
+    cn = get_calendar("CN")
+    # SSE is closed 2026-10-01..10-07; the session before Thu 10-08 is Wed 09-30
+    assert cn.sessions_back(date(2026, 10, 8), 2) == date(2026, 9, 30)
+    # A window ending on a holiday ends on the last session before it
+    assert cn.sessions_back(date(2026, 10, 5), 1) == date(2026, 9, 30)
+
+
+def test_hk_saturday_boxing_day_has_no_substitute():
+    hk = get_calendar("HK")
+    # 2026-12-26 is a Saturday; HKEX does not move it, so Monday 12-28 trades
+    assert hk.is_session(date(2026, 12, 28))
+    assert hk.is_open(at("HK", 2026, 12, 28, 10, 0))
+    assert hk.sessions_back(date(2026, 12, 29), 2) == date(2026, 12, 28)
+
+
+def test_pre_open_window_does_not_count_today():
+    cn = get_calendar("CN")
+    pre_open = at("CN", 2026, 10, 16, 8, 0)
+    assert cn.newest_session(pre_open) == date(2026, 10, 15)
+    assert cn.window_start(2, pre_open) == date(2026, 10, 14)
+
+    trading = at("CN", 2026, 10, 16, 10, 0)
+    assert cn.newest_session(trading) == date(2026, 10, 16)
+    assert cn.window_start(2, trading) == date(2026, 10, 15)
+
+    # The first session after a long closure looks back across it
+    assert cn.window_start(2, at("CN", 2026, 10, 8, 8, 0)) == date(2026, 9, 29)
+
+
+def test_settled_through():
+    cn = get_calendar("CN")
+    assert cn.settled_through("daily", at("CN", 2026, 10, 16, 8, 0)) == date(2026, 10, 15)
+    assert cn.settled_through("daily", at("CN", 2026, 10, 16, 14, 59)) == date(2026, 10, 15)
+    assert cn.settled_through("daily", at("CN", 2026, 10, 16, 15, 0)) == date(2026, 10, 16)
+    # On a holiday nothing is pending, so everything up to today is settled
+    assert cn.settled_through("daily", at("CN", 2026, 10, 5, 12, 0)) == date(2026, 10, 5)
+    # The week of 10-12 settles only after Friday's close
+    assert cn.settled_through("weekly", at("CN", 2026, 10, 15, 16, 0)) == date(2026, 10, 11)
+    assert cn.settled_through("weekly", at("CN", 2026, 10, 16, 16, 0)) == date(2026, 10, 16)
@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+"""
+The akshare call path without the network: error classification, deadline
+scopes, the circuit breaker, retry budget accounting and SingleFlight.
+"""
+
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+import contextvars
+import json
+import threading
+import time
+
+import pandas as pd
+import pytest
+import requests
+
+from baymax.tools.upstream import (
+    CIRCUIT_MIN_CALLS, CircuitOpenError, DeadlineExceeded, EndpointHealth, RetryBudget, RetryPolicy, SingleFlight,
+    call_akshare,
+    check_deadline, deadline, health_registry, is_upstream_error, remaining_time,
+)
+from baymax.tools import upstream
+
+
+def http_error(status: int) -> requests.HTTPError:
+    response = requests.Response()
+    response.status_code = status
+    return requests.HTTPError(f"{status} error", response=response)
+
+
+####################################
+# Error classification
+####################################
+
+@pytest.mark.parametrize("error", [
+    http_error(429),
+    http_error(502),
+    requests.ConnectionError("connection reset"),
+    requests.Timeout("read timed out"),
+    json.JSONDecodeError("Expecting value", "", 0),
+    ConnectionResetError(),
+])
+def test_endpoint_failures_are_upstream_errors(error):
+    assert is_upstream_error(error)
+
+
+@pytest.mark.parametrize("error", [
+    KeyError("600429"),
+    ValueError("No data for symbol 002429"),
+    http_error(404),
+    FileNotFoundError("coverage.json"),
+    DeadlineExceeded("deadline passed"),
+    CircuitOpenError("circuit open"),
+])
+def test_caller_errors_are_not_upstream_errors(error):
+    assert not is_upstream_error(error)
+
+
+def wait_until(condition, timeout: float = 5.0):
+    give_up_at = time.monotonic() + timeout
+    while not condition() and time.monotonic() < give_up_at:
+        time.sleep(0.005)
+    assert condition()
+
+
+def run_in_thread(fn, results: list) -> threading.Thread:
+    def target():
+        try:
+            results.append(fn())
+        except BaseException as e:
+            results.append(e)
+    thread = threading.Thread(target=target)
+    thread.start()
+    return thread
+
+
+####################################
+# Single-flight coalescing
+####################################
+
+def test_concurrent_identical_calls_share_one_fetch():
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        release.wait(5)
+        return pd.DataFrame({"close": [1.0, 2.0]})
+
+    results = []
+    threads = [run_in_thread(lambda: flight.do("key", fetch), results)]
+    wait_until(lambda: flight.in_flight() == 1)
+    threads += [run_in_thread(lambda: flight.do("key", fetch), results) for _ in range(4)]
+    time.sleep(0.05)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert len(results) == 5 and all(isinstance(r, pd.DataFrame) for r in results)
+    # Every waiter gets its own copy to mutate
+    assert len({id(r) for r in results}) == 5
+    assert flight.in_flight() == 0
+
+
+def test_leader_failure_is_shared_with_waiters():
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        release.wait(5)
+        raise KeyError("600519")
+
+    results = []
+    threads = [run_in_thread(lambda: flight.do("key", fetch), results)]
+    wait_until(lambda: flight.in_flight() == 1)
+    threads.append(run_in_thread(lambda: flight.do("key", fetch), results))
+    time.sleep(0.05)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert [type(r) for r in results] == [KeyError, KeyError]
+
+
+def test_waiter_takes_over_when_the_leader_gives_up():
+    flight = SingleFlight()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        if len(calls) == 1:
+            time.sleep(0.2)
+            check_deadline("fetch")
+        return "fresh"
+
+    def impatient_leader():
+        with deadline(0.05):
+            return flight.do("key", fetch)
+
+    results = []
+    leader = run_in_thread(impatient_leader, results)
+    wait_until(lambda: flight.in_flight() == 1)
+    waiter_results = []
+    waiter = run_in_thread(lambda: flight.do("key", fetch), waiter_results)
+    leader.join(5)
+    waiter.join(5)
+
+    assert isinstance(results[0], DeadlineExceeded)
+    # The leader's deadline is not the waiter's: it fetches again instead of failing
+    assert waiter_results == ["fresh"]
+    assert len(calls) == 2
+
+
+def test_waiter_honours_its_own_deadline():
+    flight = SingleFlight()
+    release = threading.Event()
+    results = []
+    leader = run_in_thread(lambda: flight.do("key", lambda: release.wait(5) and "slow"), results)
+    wait_until(lambda: flight.in_flight() == 1)
+
+    with deadline(0.05):
+        with pytest.raises(DeadlineExceeded):
+            flight.do("key", lambda: "unused")
+    release.set()
+    leader.join(5)
+    assert results == ["slow"]
+
+
+####################################
+# Deadline scopes
+####################################
+
+def test_nested_deadline_only_tightens():
+    assert remaining_time() is None
+    with deadline(1):
+        with deadline(100):
+            assert remaining_time() <= 1
+        with deadline(0.5):
+            assert remaining_time() <= 0.5
+        assert 0.5 < remaining_time() <= 1
+    assert remaining_time() is None
+
+
+def test_cancelling_the_outer_scope_stops_the_inner_one():
+    with deadline(None) as outer:
+        with deadline(10) as inner:
+            outer.cancel()
+            assert inner.is_cancelled()
+            assert remaining_time() == 0
+            with pytest.raises(DeadlineExceeded):
+                check_deadline()
+
+
+def test_expired_deadline_fails_fast():
+    with deadline(0.01):
+        time.sleep(0.02)
+        with pytest.raises(DeadlineExceeded):
+            check_deadline()
+
+
+def test_deadline_is_per_thread_unless_the_context_is_copied():
+    seen = {}
+    with deadline(5):
+        plain = threading.Thread(target=lambda: seen.setdefault("plain", remaining_time()))
+        copied = threading.Thread(target=contextvars.copy_context().run,
+                                  args=(lambda: seen.setdefault("copied", remaining_time()),))
+        for thread in (plain, copied):
+            thread.start()
+            thread.join(5)
+    assert seen["plain"] is None
+    assert 0 < seen["copied"] <= 5
+
+
+def test_requests_get_the_remaining_time_as_timeout(monkeypatch):
+    sent = {}
+
+    def fake_request(session, method, url, **kwargs):
+        sent.update(kwargs)
+        return "response"
+
+    monkeypatch.setattr(upstream, "_original_session_request", fake_request)
+    with deadline(2):
+        assert requests.Session().request("GET", "http://example.invalid", timeout=30) == "response"
+    assert 0 < sent["timeout"] <= 2
+
+    with deadline(0.01):
+        time.sleep(0.02)
+        with pytest.raises(DeadlineExceeded):
+            requests.Session().request("GET", "http://example.invalid")
+
+
+class FlakyAkshare:
+    """An akshare stand-in whose endpoints raise the queued errors before succeeding."""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def __getattr__(self, name):
+        def endpoint(*args, **kwargs):
+            self.calls += 1
+            if self.errors:
+                raise self.errors.pop(0)
+            return pd.DataFrame({"close": [1.0]})
+        return endpoint
+
+
+NO_RETRY = RetryPolicy(max_attempts=1)
+
+
+####################################
+# Circuit breaker
+####################################
+
+def test_breaker_opens_probes_and_recovers():
+    endpoint = EndpointHealth("stock_test_breaker")
+    for _ in range(CIRCUIT_MIN_CALLS):
+        assert endpoint.allow()
+        endpoint.record(False, 0.1, ConnectionError("reset"))
+    assert endpoint.state == EndpointHealth.OPEN
+    assert not endpoint.allow()
+
+    # After the cool-down one probe goes through; a failed probe reopens the circuit
+    endpoint.opened_at -= upstream.CIRCUIT_OPEN_SECONDS
+    assert endpoint.allow()
+    assert endpoint.state == EndpointHealth.HALF_OPEN
+    assert not endpoint.allow()
+    endpoint.record(False, 0.1, ConnectionError("reset"))
+    assert endpoint.state == EndpointHealth.OPEN
+
+    endpoint.opened_at -= upstream.CIRCUIT_OPEN_SECONDS
+    assert endpoint.allow()
+    endpoint.record(True, 0.1)
+    assert endpoint.state == EndpointHealth.CLOSED
+    assert endpoint.allow()
+
+
+def test_abandoned_probe_frees_the_slot():
+    endpoint = EndpointHealth("stock_test_abandon")
+    for _ in range(CIRCUIT_MIN_CALLS):
+        endpoint.record(False, 0.1, ConnectionError("reset"))
+    endpoint.opened_at -= upstream.CIRCUIT_OPEN_SECONDS
+    assert endpoint.allow()
+    endpoint.abandon()
+    assert endpoint.allow()
+
+
+def test_only_upstream_errors_count_against_the_breaker(monkeypatch):
+    name = "stock_test_classified"
+    monkeypatch.setattr(upstream, "ak", FlakyAkshare(*[KeyError("600429")] * CIRCUIT_MIN_CALLS,
+                                                     *[requests.ConnectionError("reset")] * CIRCUIT_MIN_CALLS))
+    for _ in range(CIRCUIT_MIN_CALLS):
+        with pytest.raises(KeyError):
+            call_akshare(name, retry_policy=NO_RETRY)
+    endpoint = health_registry.get(name)
+    assert endpoint.state == EndpointHealth.CLOSED
+    assert endpoint.total_failures == 0
+
+    for _ in range(CIRCUIT_MIN_CALLS):
+        with pytest.raises(requests.ConnectionError):
+            call_akshare(name, retry_policy=NO_RETRY)
+    assert endpoint.state == EndpointHealth.OPEN
+    with pytest.raises(CircuitOpenError):
+        call_akshare(name, retry_policy=NO_RETRY)
+
+
+####################################
+# Retries and the retry budget
+####################################
+
+def test_budget_spends_tokens_and_earns_them_back_from_calls():
+    budget = RetryBudget(ratio=0.5, per_second=0, max_tokens=2)
+    assert budget.try_spend() and budget.try_spend()
+    assert not budget.try_spend()
+
+    budget.record_call()
+    assert not budget.try_spend()
+    budget.record_call()
+    assert budget.try_spend()
+
+    for _ in range(10):
+        budget.record_call()
+    assert budget.snapshot()["tokens"] == 2
+
+
+def test_transient_errors_are_retried_within_the_budget(monkeypatch):
+    name = "stock_test_retried"
+    fake = FlakyAkshare(requests.ConnectionError("reset"), requests.Timeout("slow"))
+    monkeypatch.setattr(upstream, "ak", fake)
+    monkeypatch.setattr(upstream, "retry_budget", RetryBudget(ratio=0, per_second=0, max_tokens=5))
+
+    result = call_akshare(name, retry_policy=RetryPolicy(max_attempts=3, base_delay=0.001, max_delay=0.001))
+    assert len(result) == 1
+    assert fake.calls == 3
+    endpoint = health_registry.get(name)
+    assert endpoint.total_retries == 2
+    # One logical call, one successful outcome for the breaker
+    assert (endpoint.total_calls, endpoint.total_failures) == (1, 0)
+    assert upstream.retry_budget.snapshot()["tokens"] == 3
+
+
+def test_empty_budget_denies_the_retry(monkeypatch):
+    name = "stock_test_denied"
+    fake = FlakyAkshare(requests.ConnectionError("reset"))
+    monkeypatch.setattr(upstream, "ak", fake)
+    monkeypatch.setattr(upstream, "retry_budget", RetryBudget(ratio=0, per_second=0, max_tokens=0))
+
+    with pytest.raises(requests.ConnectionError):
+        call_akshare(name, retry_policy=RetryPolicy(max_attempts=3, base_delay=0.001, max_delay=0.001))
+    assert fake.calls == 1
+    assert health_registry.get(name).retries_denied == 1
+
+
+def test_caller_errors_are_not_retried(monkeypatch):
+    fake = FlakyAkshare(ValueError("No data for symbol 002429"))
+    monkeypatch.setattr(upstream, "ak", fake)
+    monkeypatch.setattr(upstream, "retry_budget", RetryBudget(ratio=0, per_second=0, max_tokens=5))
+
+    with pytest.raises(ValueError):
+        call_akshare("stock_test_not_retried", retry_policy=RetryPolicy(max_attempts=3, base_delay=0.001))
+    assert fake.calls == 1
+    assert upstream.retry_budget.snapshot()["tokens"] == 5